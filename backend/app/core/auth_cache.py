@@ -0,0 +1,111 @@
+"""
+Process-local cache for bearer token authentication.
+
+Every authenticated request used to verify the JWT signature and then load the
+user row by username. The dashboard polls several endpoints per refresh with
+the same token, so both results are kept here, keyed by the raw token, until
+the token expires or AUTH_CACHE_TTL_SECONDS passes, whichever comes first.
+
+The user management endpoints drop a user's entries when the account is
+updated, deleted or has its password reset, so role, school and active-state
+changes take effect on the next request.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from app.models.models import User, UserRole
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Read-only snapshot of the User columns the routers read from current_user."""
+    id: int
+    username: str
+    email: str
+    full_name: Optional[str]
+    role: UserRole
+    school_id: Optional[int]
+    is_active: bool
+    is_admin: bool
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_model(cls, user: User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            school_id=user.school_id,
+            is_active=user.is_active,
+            is_admin=user.is_admin,
+            created_at=user.created_at,
+        )
+
+
+@dataclass(frozen=True)
+class CachedToken:
+    """Verified claims of one token and the user it resolved to."""
+    claims: dict
+    user: UserSnapshot
+
+
+class TokenCache:
+    """Bearer token -> verified claims and user snapshot, bounded LRU with TTL."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[CachedToken]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            cached, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return cached
+
+    def put(self, token: str, cached: CachedToken):
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        exp = cached.claims.get("exp")
+        if exp is not None:
+            # Never outlive the token itself
+            expires_at = min(expires_at, time.monotonic() + (exp - time.time()))
+
+        with self._lock:
+            self._entries[token] = (cached, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        """Drop every cached token that resolved to this user."""
+        with self._lock:
+            for token in [token for token, (cached, _) in self._entries.items() if cached.user.id == user_id]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+token_cache = TokenCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
@@ -20,6 +20,10 @@ class Settings(BaseSettings):
     SMTP_PORT: Optional[int] = 587
     SMTP_USER: Optional[str] = None
     SMTP_PASSWORD: Optional[str] = None
+    SMTP_START_TLS: bool = True
+    SMTP_POOL_SIZE: int = 4
+    SMTP_POOL_MAX_MESSAGES_PER_CONNECTION: int = 100
+    SMTP_POOL_IDLE_SECONDS: int = 60
     FROM_EMAIL: Optional[str] = None
     FROM_NAME: Optional[str] = "ArrivApp"
     ADMIN_EMAIL: Optional[str] = None
@@ -32,6 +36,46 @@ class Settings(BaseSettings):
     CHECK_ABSENT_TIME: str = "09:10"
     TIMEZONE: str = "Europe/Madrid"
     FRONTEND_URL: str = "http://localhost:8080"
+    
+    # Performance
+    SCAN_CACHE_TTL_SECONDS: int = 300
+    OUTBOX_DISPATCH_INTERVAL_SECONDS: int = 10
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_CONCURRENCY: int = 8
+    OUTBOX_DOMAIN_RATE_PER_SECOND: float = 5.0
+    ROLLUP_COMPACTION_DAYS: int = 7
+    PAGE_SIZE_DEFAULT: int = 100
+    PAGE_SIZE_MAX: int = 500
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAX_ENTRIES: int = 1024
+    # Sync route handlers run in AnyIO's worker thread pool (40 threads unless
+    # WORKER_THREADS is set). Keep DB_POOL_SIZE + DB_MAX_OVERFLOW at least as
+    # large as the number of threads that may query at once.
+    WORKER_THREADS: Optional[int] = None
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: int = 10
+    SCAN_EVENTS_QUEUE_SIZE: int = 256
+    SCAN_EVENTS_HEARTBEAT_SECONDS: int = 15
+    DASHBOARD_CACHE_MAX_ENTRIES: int = 512
+    DASHBOARD_CHANGE_LOG_SIZE: int = 2000
+    SCAN_BATCH_MAX_EVENTS: int = 500
+    SCAN_BATCH_MAX_AGE_DAYS: int = 7
+    SCAN_BATCH_MAX_CLOCK_SKEW_SECONDS: int = 300
+    # Write-behind scan journal: /scan answers from memory and a local SQLite
+    # file; a background job commits journaled scans to the database
+    SCAN_JOURNAL_ENABLED: bool = False
+    SCAN_JOURNAL_PATH: str = "./scan_journal.db"
+    SCAN_JOURNAL_REPLAY_INTERVAL_SECONDS: int = 2
+    SCAN_JOURNAL_BATCH_SIZE: int = 200
+    SCAN_JOURNAL_RETENTION_DAYS: int = 7
+    # PDF exports run as background jobs; finished files are cached on disk
+    REPORT_WORKERS: int = 2
+    REPORT_CACHE_DIR: str = "./report_cache"
+    REPORT_CACHE_MAX_MB: int = 200
+    REPORT_JOB_TTL_SECONDS: int = 3600
+    REPORT_EXPORT_TIMEOUT_SECONDS: int = 120
 
 
 @lru_cache()
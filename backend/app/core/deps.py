@@ -4,17 +4,22 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from app.core.database import get_db
 from app.core.security import decode_access_token
+from app.core.auth_cache import token_cache, CachedToken, UserSnapshot
 from app.models.models import User, UserRole
 
 security = HTTPBearer()
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get the current authenticated user."""
-    token = credentials.credentials
+def authenticate_token(token: str, db: Session) -> UserSnapshot:
+    """Resolve a bearer token to a user snapshot.
+
+    Served from the token cache when the same token was seen recently;
+    otherwise the token is verified and the user loaded.
+    """
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached.user
+
     payload = decode_access_token(token)
     
     if payload is None:
@@ -43,7 +48,17 @@ async def get_current_user(
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     
-    return user
+    snapshot = UserSnapshot.from_model(user)
+    token_cache.put(token, CachedToken(claims=payload, user=snapshot))
+    return snapshot
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get the current authenticated user (a UserSnapshot, see authenticate_token)."""
+    return authenticate_token(credentials.credentials, db)
 
 
 async def get_current_active_user(
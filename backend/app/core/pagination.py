@@ -0,0 +1,60 @@
+"""
+Keyset (cursor) pagination over (timestamp, id), newest first.
+
+Instead of OFFSET, each page continues strictly after the last row of the
+previous one: (time < t) OR (time = t AND id < i). The database can walk the
+(…, checkin_time) indexes straight to the next page, so page 1,000 costs the
+same as page 1. Cursors are opaque to clients (URL-safe base64 of the last
+row's key) and stay valid while new rows are inserted at the head.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Requested page size, defaulted and capped at PAGE_SIZE_MAX"""
+    if not limit or limit < 1:
+        return settings.PAGE_SIZE_DEFAULT
+    return min(limit, settings.PAGE_SIZE_MAX)
+
+
+def paginate(query, time_column, id_column, cursor: Optional[str], limit: Optional[int]) -> Tuple[List, Optional[str]]:
+    """Fetch one newest-first page of `query`. Returns (rows, next_cursor or None)."""
+    size = page_size(limit)
+    
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            time_column < timestamp,
+            and_(time_column == timestamp, id_column < row_id)
+        ))
+    
+    rows = query.order_by(None).order_by(time_column.desc(), id_column.desc()).limit(size + 1).all()
+    
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
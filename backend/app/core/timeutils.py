@@ -0,0 +1,115 @@
+"""
+School-local calendar fields for attendance rows.
+
+Attendance timestamps (CheckIn.checkin_time, AbsenceNotification.notification_date)
+are naive UTC, which is what the server clock gives in production. Reports,
+however, count school days, and where a school's day starts depends on
+School.timezone: 23:30 UTC in November is already the next day in Madrid.
+
+CheckIn and AbsenceNotification therefore store the school-local date, ISO week
+and weekday of their timestamp, filled in by column defaults when the row is
+written (see models.py). Reports filter and group on those plain indexed
+columns instead of func.date()/strftime()/to_char()/extract(), which cannot use
+an index and differ between SQLite and PostgreSQL.
+"""
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = "Europe/Madrid"  # Same as the School.timezone column default
+
+
+@dataclass(frozen=True)
+class LocalCalendar:
+    local_date: date
+    iso_week: str  # "2025-W07"
+    weekday: int  # ISO: 1 = Monday ... 7 = Sunday
+
+
+def utc_now() -> datetime:
+    """Current time as naive UTC, the convention for stored attendance timestamps."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@lru_cache(maxsize=64)
+def zone(name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo for a School.timezone value; unknown or empty names fall back to the default."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown school timezone {name!r}, using {DEFAULT_TIMEZONE}")
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def iso_week(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year:04d}-W{week:02d}"
+
+
+def local_time(moment: datetime, tz: ZoneInfo) -> datetime:
+    """Wall-clock time of a naive UTC timestamp in the given timezone, as a naive datetime."""
+    local = moment.replace(tzinfo=timezone.utc).astimezone(tz) if moment.tzinfo is None else moment.astimezone(tz)
+    return local.replace(tzinfo=None)
+
+
+def local_calendar(moment: datetime, tz: ZoneInfo) -> LocalCalendar:
+    """Calendar fields of a naive UTC timestamp in the given timezone."""
+    local = moment.replace(tzinfo=timezone.utc).astimezone(tz) if moment.tzinfo is None else moment.astimezone(tz)
+    day = local.date()
+    return LocalCalendar(local_date=day, iso_week=iso_week(day), weekday=day.isoweekday())
+
+
+# student id -> timezone of their school, for the column defaults
+_student_zones: Dict[int, ZoneInfo] = {}
+_school_zones: Dict[int, ZoneInfo] = {}
+_lock = threading.Lock()
+
+
+def student_zone(connection, student_pk: int) -> ZoneInfo:
+    """Timezone of a student's school, looked up on `connection` (a Connection or Session) once."""
+    with _lock:
+        cached = _student_zones.get(student_pk)
+    if cached is not None:
+        return cached
+    name = connection.execute(
+        text("SELECT schools.timezone FROM students JOIN schools ON schools.id = students.school_id "
+             "WHERE students.id = :student_pk"),
+        {"student_pk": student_pk}
+    ).scalar()
+    with _lock:
+        _student_zones[student_pk] = zone(name)
+        return _student_zones[student_pk]
+
+
+def school_zone(connection, school_id: Optional[int]) -> ZoneInfo:
+    """Timezone of a school, looked up on `connection` (a Connection or Session) once."""
+    if school_id is None:
+        return zone(None)
+    with _lock:
+        cached = _school_zones.get(school_id)
+    if cached is not None:
+        return cached
+    name = connection.execute(
+        text("SELECT timezone FROM schools WHERE id = :school_id"), {"school_id": school_id}
+    ).scalar()
+    with _lock:
+        _school_zones[school_id] = zone(name)
+        return _school_zones[school_id]
+
+
+def forget_zones():
+    """Drop cached timezones. update_school() calls it when School.timezone changes.
+
+    Students keep the school they were created with (StudentUpdate.school_id is
+    not applied), so that is the only change the caches can miss.
+    """
+    with _lock:
+        _student_zones.clear()
+        _school_zones.clear()
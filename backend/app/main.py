@@ -5,6 +5,7 @@ from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
 from contextlib import asynccontextmanager
 import os
 import traceback
+import anyio.to_thread
 from pathlib import Path
 from app.core.config import get_settings
 from app.core.database import engine, Base, SessionLocal
@@ -12,6 +13,8 @@ from app.core.database import engine, Base, SessionLocal
 # Version: 2.0.2 - Added admin populate endpoint
 from app.routers import auth, students, checkin, schools, users, reports, justifications, comedor, admin_tools
 from app.services.scheduler import start_scheduler, stop_scheduler
+from app.services.smtp_pool import smtp_pool
+from app.services.report_jobs import report_jobs
 
 settings = get_settings()
 
@@ -62,13 +65,21 @@ def init_admin_user():
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown events."""
     # Startup
+    # DB-bound routes are sync and run in the AnyIO worker pool (default 40 threads)
+    worker_limiter = anyio.to_thread.current_default_thread_limiter()
+    if settings.WORKER_THREADS:
+        worker_limiter.total_tokens = settings.WORKER_THREADS
+    if "sqlite" not in settings.DATABASE_URL and worker_limiter.total_tokens > settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW:
+        print(f"⚠️ {worker_limiter.total_tokens} worker threads but only "
+              f"{settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW} database connections")
     init_admin_user()
     # Start scheduler for automated email notifications
     start_scheduler()
     yield
     # Shutdown
     stop_scheduler()
-    pass
+    report_jobs.shutdown()
+    await smtp_pool.close()
 
 
 # API Metadata
@@ -211,7 +222,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "HEAD", "PATCH", "TRACE"],
     allow_headers=["Content-Type", "Authorization", "*"],
-    expose_headers=["Content-Type", "Authorization", "*"],
+    expose_headers=["Content-Type", "Authorization", "X-Next-Cursor", "X-Total-Count", "ETag", "*"],
     max_age=3600,
 )
 
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, ForeignKey, Enum, Text, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
+from app.core import timeutils
 import enum
 
 
@@ -74,6 +75,9 @@ class TeacherClassAssignment(Base):
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (
+        Index("ix_students_school_class_active", "school_id", "class_name", "is_active"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(String, unique=True, index=True, nullable=False)
@@ -93,8 +97,27 @@ class Student(Base):
         return f"<Student {self.name} ({self.student_id})>"
 
 
+def _local_calendar_default(timestamp_column: str, field: str):
+    """Column default: a LocalCalendar field of `timestamp_column` in the student's school timezone."""
+    def default(context):
+        params = context.get_current_parameters()
+        moment = params.get(timestamp_column) or datetime.utcnow()
+        tz = timeutils.student_zone(context.connection, params["student_id"])
+        return getattr(timeutils.local_calendar(moment, tz), field)
+    return default
+
+
 class CheckIn(Base):
     __tablename__ = "checkins"
+    __table_args__ = (
+        Index("ix_checkins_student_id_checkin_time", "student_id", "checkin_time"),
+        Index("ix_checkins_checkin_time", "checkin_time"),
+        # One check-in per student per school-local day, enforced by the database
+        Index("uq_checkins_student_id_local_date", "student_id", "local_date", unique=True),
+        # Reports filter and group on the school-local calendar fields
+        Index("ix_checkins_local_date_weekday", "local_date", "weekday"),
+        Index("ix_checkins_iso_week", "iso_week"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -103,6 +126,10 @@ class CheckIn(Base):
     is_late = Column(Boolean, default=False)
     email_sent = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # checkin_time in the school's timezone (see app.core.timeutils)
+    local_date = Column(Date, default=_local_calendar_default("checkin_time", "local_date"), nullable=False)
+    iso_week = Column(String(8), default=_local_calendar_default("checkin_time", "iso_week"), nullable=False)
+    weekday = Column(Integer, default=_local_calendar_default("checkin_time", "weekday"), nullable=False)  # ISO, 1 = Monday
     
     student = relationship("Student", back_populates="checkins")
     
@@ -112,6 +139,11 @@ class CheckIn(Base):
 
 class AbsenceNotification(Base):
     __tablename__ = "absence_notifications"
+    __table_args__ = (
+        Index("ix_absence_notifications_student_id_date", "student_id", "notification_date"),
+        Index("ix_absence_notifications_local_date_weekday", "local_date", "weekday"),
+        Index("ix_absence_notifications_iso_week", "iso_week"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -119,6 +151,10 @@ class AbsenceNotification(Base):
     email_sent = Column(Boolean, default=False)
     email_sent_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # notification_date in the school's timezone (see app.core.timeutils)
+    local_date = Column(Date, default=_local_calendar_default("notification_date", "local_date"), nullable=False)
+    iso_week = Column(String(8), default=_local_calendar_default("notification_date", "iso_week"), nullable=False)
+    weekday = Column(Integer, default=_local_calendar_default("notification_date", "weekday"), nullable=False)  # ISO, 1 = Monday
     
     # Relationships
     student = relationship("Student")
@@ -127,6 +163,90 @@ class AbsenceNotification(Base):
         return f"<AbsenceNotification for student {self.student_id} on {self.notification_date}>"
 
 
+class OutboxStatus(enum.Enum):
+    pending = "pending"
+    sent = "sent"
+    failed = "failed"  # Gave up after OUTBOX_MAX_ATTEMPTS
+
+
+class EmailOutbox(Base):
+    """Outgoing emails queued by request handlers and delivered by the outbox dispatcher"""
+    __tablename__ = "email_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    checkin_id = Column(Integer, ForeignKey("checkins.id"), nullable=True)  # Marks CheckIn.email_sent once delivered
+    dedup_key = Column(String, unique=True, nullable=True)  # E.g. "absence:2025-11-20:parent:42:mum@example.com"
+    status = Column(Enum(OutboxStatus), default=OutboxStatus.pending, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String, nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<EmailOutbox {self.id} to {self.to_email} ({self.status.value})>"
+
+
+class KioskScan(Base):
+    """One scan event received from a kiosk batch sync, keyed by the kiosk's idempotency key"""
+    __tablename__ = "kiosk_scans"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    idempotency_key = Column(String, unique=True, nullable=False)
+    device_id = Column(String, nullable=False, index=True)
+    student_code = Column(String, nullable=False)  # QR code as scanned (Student.student_id)
+    scanned_at = Column(DateTime, nullable=False)  # Kiosk clock at scan time
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    result = Column(String, nullable=False)  # checkin, checkout, duplicate_scan, ..., not_found, rejected
+    checkin_id = Column(Integer, ForeignKey("checkins.id"), nullable=True)
+    response = Column(Text, nullable=False)  # JSON result returned to the kiosk, replayed on retries
+    
+    def __repr__(self):
+        return f"<KioskScan {self.idempotency_key} from {self.device_id} ({self.result})>"
+
+
+class KioskDevice(Base):
+    """A kiosk that syncs buffered scans, and the offline window its last batch was judged against"""
+    __tablename__ = "kiosk_devices"
+    
+    device_id = Column(String, primary_key=True)
+    school_id = Column(Integer, ForeignKey("schools.id"), nullable=True)  # School of the first non-admin user to sync it
+    offline_since = Column(DateTime, nullable=False)  # Outage start claimed by the last batch
+    window_start = Column(DateTime, nullable=False)  # Earliest scan time accepted for that outage
+    last_sync_at = Column(DateTime, nullable=False)  # Server time of the last batch
+    
+    def __repr__(self):
+        return f"<KioskDevice {self.device_id} (last sync {self.last_sync_at})>"
+
+
+class NotificationRun(Base):
+    """Summary of one run of a scheduled notification job (e.g. the 9:10 absence check)"""
+    __tablename__ = "notification_runs"
+    __table_args__ = (UniqueConstraint("job_name", "run_date", name="uq_notification_runs_job_date"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String, nullable=False)
+    run_date = Column(Date, nullable=False)
+    status = Column(String, default="running", nullable=False)  # running, completed, failed
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    
+    # Counts
+    absent_students = Column(Integer, default=0)
+    messages_planned = Column(Integer, default=0)
+    messages_enqueued = Column(Integer, default=0)  # New outbox rows created by this run
+    duplicates_skipped = Column(Integer, default=0)  # Already queued by an earlier (interrupted) run
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    pending = Column(Integer, default=0)  # Still waiting for a retry when the run finished
+    
+    def __repr__(self):
+        return f"<NotificationRun {self.job_name} {self.run_date} ({self.status})>"
+
+
 class JustificationType(enum.Enum):
     absence = "absence"  # Full day absence
     tardiness = "tardiness"  # Late arrival
@@ -141,6 +261,9 @@ class JustificationStatus(enum.Enum):
 
 class Justification(Base):
     __tablename__ = "justifications"
+    __table_args__ = (
+        Index("ix_justifications_student_id_date", "student_id", "date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -222,3 +345,67 @@ class KitchenAttendance(Base):
     
     def __repr__(self):
         return f"<KitchenAttendance {self.class_name} on {self.snapshot_date}>"
+
+
+class DailyAttendanceRollup(Base):
+    """Per-class daily attendance counts, updated on scan and rebuilt by the nightly compaction job"""
+    __tablename__ = "daily_attendance_rollup"
+    __table_args__ = (UniqueConstraint("school_id", "class_name", "date", name="uq_daily_attendance_rollup_key"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
+    class_name = Column(String, nullable=False)
+    date = Column(Date, nullable=False, index=True)  # School-local day, as in CheckIn.local_date
+    
+    # Counts
+    present = Column(Integer, default=0, nullable=False)  # Check-ins
+    late = Column(Integer, default=0, nullable=False)  # Check-ins with is_late
+    checked_out = Column(Integer, default=0, nullable=False)  # Check-ins with a checkout_time
+    justified = Column(Integer, default=0, nullable=False)  # Approved absence justifications
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<DailyAttendanceRollup {self.school_id}/{self.class_name} on {self.date}>"
+
+
+class CalendarDayType(enum.Enum):
+    school_day = "school_day"  # E.g. a make-up day on a Saturday
+    half_day = "half_day"  # Attendance expected, school ends early
+    holiday = "holiday"
+
+
+class SchoolCalendarDay(Base):
+    """A day that differs from a school's Monday-Friday default week (see services.school_calendar)"""
+    __tablename__ = "school_calendar"
+    __table_args__ = (UniqueConstraint("school_id", "date", name="uq_school_calendar_school_date"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    day_type = Column(Enum(CalendarDayType), nullable=False)
+    description = Column(String, nullable=True)  # E.g. "Día de la Hispanidad"
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<SchoolCalendarDay {self.school_id} {self.date} {self.day_type.value}>"
+
+
+class AttendanceBitmap(Base):
+    """One student's school year as packed day bitsets (see services.attendance_bitmaps)"""
+    __tablename__ = "attendance_bitmaps"
+    __table_args__ = (UniqueConstraint("student_id", "school_year", name="uq_attendance_bitmaps_student_year"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    school_year = Column(Integer, nullable=False)  # Calendar year the school year starts in
+    
+    # One bit per school-local day from the start of the school year
+    present = Column(LargeBinary, nullable=False)  # Checked in
+    late = Column(LargeBinary, nullable=False)  # Checked in late
+    justified = Column(LargeBinary, nullable=False)  # Approved absence justification
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<AttendanceBitmap student {self.student_id} {self.school_year}>"
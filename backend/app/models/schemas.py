@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field
+from datetime import datetime, date
 from typing import Optional
 from enum import Enum
 
@@ -41,6 +41,40 @@ class School(SchoolBase):
         from_attributes = True
 
 
+# School calendar Schemas
+class CalendarDayType(str, Enum):
+    school_day = "school_day"
+    half_day = "half_day"
+    holiday = "holiday"
+
+
+class SchoolCalendarDayBase(BaseModel):
+    date: date
+    day_type: CalendarDayType
+    description: Optional[str] = None
+
+
+class SchoolCalendarDay(SchoolCalendarDayBase):
+    id: int
+    school_id: int
+    
+    class Config:
+        from_attributes = True
+
+
+class SchoolCalendarUpdate(BaseModel):
+    """Calendar entries to create or replace (one per date)"""
+    days: list[SchoolCalendarDayBase] = Field(..., max_length=366)
+
+
+class SchoolCalendarRange(BaseModel):
+    school_id: int
+    start_date: date
+    end_date: date
+    expected_days: int  # School days in the range, half days included
+    days: list[SchoolCalendarDay]  # Entries that differ from the Monday-Friday default
+
+
 # User Schemas
 class UserBase(BaseModel):
     email: EmailStr
@@ -167,9 +201,11 @@ class CheckInLog(BaseModel):
     student_name: str
     school_name: str
     checkout_time: Optional[str] = None
+    student_id: Optional[int] = None
 
 
 class LateStudent(BaseModel):
+    student_id: Optional[int] = None
     name: str
     time: str
     school_name: str
@@ -191,6 +227,60 @@ class DashboardData(BaseModel):
     absent_students: list[AbsentStudent]
 
 
+class DashboardChange(BaseModel):
+    """One replayable dashboard change; times use the CheckInLog format."""
+    version: int
+    type: str  # "checkin", "checkout" or "email_sent"
+    student_id: int
+    student_name: Optional[str] = None
+    class_name: Optional[str] = None
+    checkin_time: Optional[str] = None
+    checkout_time: Optional[str] = None
+    is_late: Optional[bool] = None
+    email_sent: Optional[bool] = None
+
+
+class DashboardChanges(BaseModel):
+    """Changes after the client's version, or a full snapshot when they cannot be replayed."""
+    version: int
+    full: bool
+    absent_email_sent: bool
+    changes: list[DashboardChange] = []
+    snapshot: Optional[DashboardData] = None
+
+
+class ScanBatchEvent(BaseModel):
+    idempotency_key: str = Field(..., min_length=1, max_length=128)
+    student_id: str  # QR code, as sent to POST /api/checkin/scan
+    scanned_at: datetime  # Kiosk clock when the code was scanned; naive values are taken as UTC
+    device_id: Optional[str] = None  # Defaults to the batch device_id
+
+
+class ScanBatch(BaseModel):
+    device_id: str = Field(..., min_length=1)
+    offline_since: datetime  # Kiosk clock when it lost the connection; earlier scans are rejected
+    events: list[ScanBatchEvent]
+
+
+class ScanBatchResult(BaseModel):
+    idempotency_key: str
+    result: str  # checkin, checkout, duplicate_scan, too_early_checkout, already_completed, not_found, rejected
+    replayed: bool = False  # Already ingested by an earlier request; stored result returned
+    student_name: Optional[str] = None
+    class_name: Optional[str] = None
+    checkin_time: Optional[datetime] = None
+    checkout_time: Optional[datetime] = None
+    is_late: Optional[bool] = None
+    detail: Optional[str] = None
+
+
+class ScanBatchResponse(BaseModel):
+    device_id: str
+    accepted: int  # Events applied by this request
+    replayed: int
+    results: list[ScanBatchResult]  # In request order
+
+
 # Justification Schemas
 class JustificationBase(BaseModel):
     student_id: int
@@ -220,3 +310,36 @@ class Justification(JustificationBase):
     
     class Config:
         from_attributes = True
+
+
+# Report job Schemas
+class ReportType(str, Enum):
+    history = "history"
+    statistics = "statistics"
+    tardiness = "tardiness"
+
+
+class ReportJobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class ReportJobCreate(BaseModel):
+    report_type: ReportType
+    start_date: Optional[date] = None  # Required for statistics and tardiness
+    end_date: Optional[date] = None
+    school_id: Optional[int] = None  # Admins only; others get their own school
+    class_name: Optional[str] = None
+
+
+class ReportJob(BaseModel):
+    job_id: str
+    report_type: ReportType
+    status: ReportJobStatus
+    cached: bool  # Served from an earlier identical export
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    download_url: Optional[str] = None  # Set once status is done
@@ -5,7 +5,14 @@ Only accessible to admins (safety feature).
 from fastapi import APIRouter, Depends, HTTPException
 from app.core.deps import get_current_admin_user
 from app.core.database import SessionLocal
-from app.models.models import Student, CheckIn, Justification, JustificationType, JustificationStatus, School, AbsenceNotification
+from app.models.models import Student, CheckIn, Justification, JustificationType, JustificationStatus, School, AbsenceNotification, NotificationRun
+from app.services.scan_cache import student_cache
+from app.services.attendance_state import attendance_state
+from app.services.email_outbox import get_outbox_stats
+from app.services.scan_journal import scan_journal
+from app.services.attendance_rollup import rebuild_rollup
+from app.services.attendance_bitmaps import rebuild_bitmaps
+from app.services.dashboard_cache import mark_roster_changed
 from datetime import datetime, timedelta
 import random
 from faker import Faker
@@ -145,6 +152,16 @@ def populate_db(db):
     
     db.commit()
     
+    # Test students and today's check-ins were replaced underneath the scan cache
+    student_cache.clear()
+    attendance_state.clear()
+    mark_roster_changed()
+    
+    # Recount the attendance rollup and bitmaps for the replaced data
+    rebuild_rollup(db)
+    rebuild_bitmaps(db)
+    db.commit()
+    
     # Get summary
     total_students = db.query(Student).filter(Student.is_active == True).count()
     total_checkins = db.query(CheckIn).count()
@@ -258,3 +275,59 @@ async def health_check():
         }
     finally:
         db.close()
+
+
+@router.get("/email-outbox")
+async def email_outbox_status(current_user = Depends(get_current_admin_user)):
+    """
+    Email outbox queue depth and delivery lag.
+    Admin only endpoint.
+    """
+    db = SessionLocal()
+    try:
+        return get_outbox_stats(db)
+    finally:
+        db.close()
+
+
+@router.get("/scan-journal")
+def scan_journal_status(current_user = Depends(get_current_admin_user)):
+    """
+    Write-behind scan journal: scans waiting to reach the database and replay lag.
+    Admin only endpoint.
+    """
+    return scan_journal.stats()
+
+
+@router.get("/notification-runs")
+async def notification_runs(limit: int = 14, current_user = Depends(get_current_admin_user)):
+    """
+    Summaries of the most recent scheduled notification runs (9:10 absence check).
+    Admin only endpoint.
+    """
+    db = SessionLocal()
+    try:
+        runs = db.query(NotificationRun).order_by(
+            NotificationRun.run_date.desc(), NotificationRun.id.desc()
+        ).limit(min(limit, 100)).all()
+        return [
+            {
+                "job_name": run.job_name,
+                "run_date": run.run_date.isoformat(),
+                "status": run.status,
+                "started_at": run.started_at.isoformat() if run.started_at else None,
+                "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+                "duration_seconds": round((run.finished_at - run.started_at).total_seconds(), 1)
+                    if run.started_at and run.finished_at else None,
+                "absent_students": run.absent_students,
+                "messages_planned": run.messages_planned,
+                "messages_enqueued": run.messages_enqueued,
+                "duplicates_skipped": run.duplicates_skipped,
+                "sent": run.sent,
+                "failed": run.failed,
+                "pending": run.pending,
+            }
+            for run in runs
+        ]
+    finally:
+        db.close()
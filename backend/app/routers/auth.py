@@ -7,6 +7,7 @@ from app.models.models import User, UserRole
 from app.models.schemas import Token, LoginRequest, UserCreate, User as UserSchema
 from app.core.config import get_settings
 from app.core.deps import get_current_user, get_current_admin_user
+from app.core.auth_cache import token_cache
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 settings = get_settings()
@@ -152,6 +153,7 @@ async def reset_admin_password(new_password: str, db: Session = Depends(get_db))
     # Hash the new password
     admin.hashed_password = get_password_hash(new_password)
     db.commit()
+    token_cache.invalidate_user(admin.id)
     
     return {
         "message": "Admin password reset successfully",
@@ -174,6 +176,7 @@ async def set_admin_flag(db: Session = Depends(get_db)):
     # Set admin flag
     admin.is_admin = True
     db.commit()
+    token_cache.invalidate_user(admin.id)
     
     return {
         "message": "Admin flag set successfully",
@@ -1,192 +1,346 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
 from sqlalchemy import func
-from datetime import datetime, date, time
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, date
 from typing import List, Optional
+from zoneinfo import ZoneInfo
+import asyncio
+import json
 from app.core.database import get_db
-from app.core.deps import get_current_user, get_current_school_user
-from app.models.models import Student, CheckIn, User, UserRole
+from app.core.deps import get_current_user, get_current_school_user, authenticate_token
+from app.core.pagination import paginate
+from app.models.models import Student, CheckIn, User, UserRole, School
 from app.models.schemas import (
     CheckInCreate, CheckIn as CheckInSchema, 
-    DashboardData, DashboardStats, CheckInLog, LateStudent, AbsentStudent
+    DashboardData, DashboardStats, CheckInLog, LateStudent, AbsentStudent,
+    DashboardChange, DashboardChanges, ScanBatch, ScanBatchResponse
+)
+from app.services.email_service import build_checkin_notification, build_checkout_notification
+from app.services.email_outbox import enqueue_email
+from app.services.scan_cache import lookup_student
+from app.services.attendance_state import attendance_state
+from app.services.attendance_rollup import record_checkin, record_checkout, local_day
+from app.services import scan_rules, attendance_bitmaps
+from app.services.checkin_store import insert_checkin, close_checkin, find_checkin, CheckInConflict
+from app.services.scan_ingest import IncomingScan, ingest_scans, offline_window, to_utc, KioskDeviceConflict
+from app.services.scan_journal import scan_journal, replay_journal
+from app.services.scan_events import scan_events, ScanEvent
+from app.services.dashboard_cache import (
+    dashboard_cache, dashboard_versions, validity_tag, etag_for, mark_changed, mark_roster_changed
 )
-from app.services.email_service import send_checkin_notification, send_email
 from app.core.config import get_settings
+from app.core import timeutils
 
 router = APIRouter(prefix="/api/checkin", tags=["Check-in"])
 settings = get_settings()
 
+DASHBOARD_TIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+
+def _announce_scan(event: ScanEvent):
+    """Make a committed scan visible: new dashboard version, replayable change, live push."""
+    mark_changed(event.school_id, event.class_name, {
+        "type": event.type,
+        "student_id": event.student_id,
+        "student_name": event.student_name,
+        "class_name": event.class_name,
+        "checkin_time": event.checkin_time.strftime(DASHBOARD_TIME_FORMAT),
+        "checkout_time": event.checkout_time.strftime(DASHBOARD_TIME_FORMAT) if event.checkout_time else None,
+        "is_late": event.is_late,
+    })
+    scan_events.publish(event)
+
+
+def _refused_scan(decision: str, student, checkin_time: datetime, checkout_time: Optional[datetime], time_diff: float,
+                  tz: ZoneInfo) -> dict:
+    """Response for a scan that changes nothing (duplicate, too early, already completed).
+
+    Messages show times on the school's clock (`tz`); stored times are naive UTC.
+    """
+    # SECURITY: Prevent duplicate check-in within 10 minutes (likely accidental double scan)
+    if decision == scan_rules.DUPLICATE_SCAN:
+        return {
+            "error": "duplicate_scan",
+            "message": f"⚠️ {student.name} ya ha registrado entrada hace {int(time_diff)} minutos",
+            "student_name": student.name,
+            "checkin_time": checkin_time,
+            "minutes_ago": int(time_diff)
+        }
+    
+    # SECURITY: Minimum stay time of 30 minutes before checkout
+    # (prevents accidental checkout right after check-in)
+    if decision == scan_rules.TOO_EARLY_CHECKOUT:
+        return {
+            "error": "too_early_checkout",
+            "message": f"⏱️ Debe esperar al menos {scan_rules.MIN_STAY_MINUTES} minutos antes de registrar salida\nEntrada: {timeutils.local_time(checkin_time, tz).strftime('%H:%M')}h",
+            "student_name": student.name,
+            "checkin_time": checkin_time,
+            "minutes_since_checkin": int(time_diff),
+            "minutes_remaining": scan_rules.MIN_STAY_MINUTES - int(time_diff)
+        }
+    
+    # Student already completed both check-in and check-out today
+    return {
+        "error": "already_completed",
+        "message": f"✅ {student.name} ya completó entrada y salida hoy\nEntrada: {timeutils.local_time(checkin_time, tz).strftime('%H:%M')}h\nSalida: {timeutils.local_time(checkout_time, tz).strftime('%H:%M')}h",
+        "already_completed": True,
+        "student_name": student.name,
+        "checkin_time": checkin_time,
+        "checkout_time": checkout_time
+    }
+
+
+def _checkout_response(student, checkin_time: datetime, now: datetime, time_diff: float, tz: ZoneInfo) -> dict:
+    early_dismissal = scan_rules.is_early_dismissal(now, tz)
+    return {
+        "message": f"¡Hasta luego, {student.name}!" + (" ⚠️ Salida temprana" if early_dismissal else ""),
+        "action": "checkout",
+        "student_name": student.name,
+        "class": student.class_name,
+        "checkin_time": checkin_time,
+        "checkout_time": now,
+        "duration_minutes": int(time_diff),
+        "early_dismissal": early_dismissal
+    }
+
+
+def _checkin_response(student, now: datetime, is_late: bool, email_queued: bool) -> dict:
+    return {
+        "message": f"¡Bienvenido/a, {student.name}!",
+        "action": "checkin",
+        "student_name": student.name,
+        "class": student.class_name,
+        "checkin_time": now,
+        "is_late": is_late,
+        "email_sent": False,
+        "email_queued": email_queued
+    }
+
+
+def _journaled_scan(code: str, db: Session) -> dict:
+    """Scan path with SCAN_JOURNAL_ENABLED: judged in memory, committed by the journal replayer."""
+    now = timeutils.utc_now()
+    with scan_journal.scan_lock:
+        student = attendance_state.find_student(db, local_day(db, None, now), code)
+        if not student:
+            raise HTTPException(status_code=404, detail="Student not found")
+        
+        # The student's day is their school's calendar day, like CheckIn.local_date
+        tz = timeutils.school_zone(db, student.school_id)
+        today = timeutils.local_calendar(now, tz).local_date
+        existing_checkin = attendance_state.get(db, today, student.school_id, student.id)
+        checkin_time = existing_checkin.checkin_time if existing_checkin else None
+        checkout_time = existing_checkin.checkout_time if existing_checkin else None
+        decision, time_diff = scan_rules.decide_scan(checkin_time, checkout_time, now)
+        if decision not in (scan_rules.CHECKIN, scan_rules.CHECKOUT):
+            return _refused_scan(decision, student, checkin_time, checkout_time, time_diff, tz)
+        
+        is_late = scan_rules.is_late(now, tz) if decision == scan_rules.CHECKIN else False
+        scan_journal.append(decision, student, now, is_late)
+        if decision == scan_rules.CHECKIN:
+            attendance_state.record_checkin(today, student, None, now, is_late)
+        else:
+            attendance_state.record_checkout(today, student.school_id, student.id, now)
+    
+    _announce_scan(ScanEvent(
+        type=decision,
+        student_id=student.id,
+        student_name=student.name,
+        class_name=student.class_name,
+        school_id=student.school_id,
+        checkin_time=now if decision == scan_rules.CHECKIN else checkin_time,
+        checkout_time=now if decision == scan_rules.CHECKOUT else None,
+        is_late=is_late if decision == scan_rules.CHECKIN else None
+    ))
+    
+    # The notification email is queued when the replayer commits the scan
+    if decision == scan_rules.CHECKOUT:
+        return dict(_checkout_response(student, checkin_time, now, time_diff, tz), journaled=True)
+    return dict(_checkin_response(student, now, is_late, email_queued=False), journaled=True)
+
 
 @router.post("/scan", status_code=status.HTTP_201_CREATED)
-async def checkin_scan(
+def checkin_scan(
     student_id: str = Query(..., description="Student ID from QR code"),
     db: Session = Depends(get_db)
 ):
     """Handle QR code scan for both check-in and check-out with security validations."""
-    # Find student by student_id
-    student = db.query(Student).filter(
-        Student.student_id == student_id,
-        Student.is_active == True
-    ).first()
+    if settings.SCAN_JOURNAL_ENABLED:
+        return _journaled_scan(student_id, db)
+    
+    # Find student by student_id (served from the scan cache when possible)
+    student = lookup_student(db, student_id)
     
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Check if already checked in today
-    today_start = datetime.combine(date.today(), time.min)
-    today_end = datetime.combine(date.today(), time.max)
+    # Check if already checked in today (the school's calendar day, like CheckIn.local_date)
+    now = timeutils.utc_now()
+    tz = timeutils.school_zone(db, student.school_id)
+    today = timeutils.local_calendar(now, tz).local_date
+    existing_checkin = attendance_state.get(db, today, student.school_id, student.id)
     
-    existing_checkin = db.query(CheckIn).filter(
-        CheckIn.student_id == student.id,
-        CheckIn.checkin_time >= today_start,
-        CheckIn.checkin_time <= today_end
-    ).first()
+    decision, time_diff = scan_rules.decide_scan(
+        existing_checkin.checkin_time if existing_checkin else None,
+        existing_checkin.checkout_time if existing_checkin else None,
+        now
+    )
     
-    now = datetime.now()
+    if decision not in (scan_rules.CHECKIN, scan_rules.CHECKOUT):
+        return _refused_scan(
+            decision, student, existing_checkin.checkin_time, existing_checkin.checkout_time, time_diff, tz
+        )
     
-    # CASE 1: Student already checked in today (no checkout yet)
-    if existing_checkin and not existing_checkin.checkout_time:
-        # Calculate time difference since check-in
-        time_diff = (now - existing_checkin.checkin_time).total_seconds() / 60  # in minutes
-        
-        # SECURITY: Prevent duplicate check-in within 10 minutes (likely accidental double scan)
-        if time_diff < 10:
-            return {
-                "error": "duplicate_scan",
-                "message": f"⚠️ {student.name} ya ha registrado entrada hace {int(time_diff)} minutos",
-                "student_name": student.name,
-                "checkin_time": existing_checkin.checkin_time,
-                "minutes_ago": int(time_diff)
-            }
-        
-        # SECURITY: Minimum stay time of 30 minutes before checkout
-        # (prevents accidental checkout right after check-in)
-        if time_diff < 30:
-            return {
-                "error": "too_early_checkout",
-                "message": f"⏱️ Debe esperar al menos 30 minutos antes de registrar salida\nEntrada: {existing_checkin.checkin_time.strftime('%H:%M')}h",
-                "student_name": student.name,
-                "checkin_time": existing_checkin.checkin_time,
-                "minutes_since_checkin": int(time_diff),
-                "minutes_remaining": 30 - int(time_diff)
-            }
-        
-        # VALID CHECK-OUT: Process check-out
-        existing_checkin.checkout_time = now
-        db.commit()
-        
-        # Detect early dismissal (before 14:00 / 2:00 PM)
-        is_early_dismissal = now.hour < 14
+    # VALID CHECK-OUT: Process check-out
+    if decision == scan_rules.CHECKOUT:
+        if not close_checkin(db, existing_checkin.checkin_id, now):
+            # Another scan checked the student out first
+            db.rollback()
+            current = find_checkin(db, student.id, today)
+            return _refused_scan(
+                scan_rules.ALREADY_COMPLETED, student, current.checkin_time, current.checkout_time, time_diff, tz
+            )
+        record_checkout(db, student.school_id, student.class_name, existing_checkin.checkin_time)
         
-        # Send check-out email notification
+        # Queue check-out email notification (committed together with the check-out)
         try:
-            checkout_time_str = now.strftime("%H:%M")
-            checkin_time_str = existing_checkin.checkin_time.strftime("%H:%M")
-            duration_hours = int(time_diff // 60)
-            duration_mins = int(time_diff % 60)
-            
-            if is_early_dismissal:
-                subject = f"⚠️ ArrivApp: {student.name} ha salido TEMPRANO del colegio"
-                body = f"""¡Hola!
-
-⚠️ ALERTA DE SALIDA TEMPRANA
-
-Te informamos que {student.name} ({student.class_name}) ha registrado su salida del colegio antes del horario habitual.
-
-📍 Resumen de hoy:
-• Hora de entrada: {checkin_time_str}h
-• Hora de salida: {checkout_time_str}h ⚠️ (Salida temprana)
-• Tiempo en el colegio: {duration_hours}h {duration_mins}min
-
-Si esta salida temprana no estaba prevista, por favor contacta con el colegio inmediatamente.
-
-Gracias por participar en el programa piloto de ArrivApp.
-
----
-Este es un mensaje automático. Por favor no responder.
-"""
-            else:
-                subject = f"✅ ArrivApp: {student.name} ha salido del colegio"
-                body = f"""¡Hola!
-
-Te informamos que {student.name} ({student.class_name}) ha registrado su salida del colegio.
-
-📍 Resumen de hoy:
-• Hora de entrada: {checkin_time_str}h
-• Hora de salida: {checkout_time_str}h
-• Tiempo en el colegio: {duration_hours}h {duration_mins}min
-
-Gracias por participar en el programa piloto de ArrivApp.
-
----
-Este es un mensaje automático. Por favor no responder.
-"""
-            await send_email(student.parent_email, subject, body)
+            subject, body = build_checkout_notification(
+                student.name, student.class_name,
+                timeutils.local_time(existing_checkin.checkin_time, tz), timeutils.local_time(now, tz),
+                early_dismissal=scan_rules.is_early_dismissal(now, tz)
+            )
+            enqueue_email(db, student.parent_email, subject, body)
         except Exception as e:
-            print(f"Error sending checkout email: {e}")
+            print(f"Error queueing checkout email: {e}")
         
-        return {
-            "message": f"¡Hasta luego, {student.name}!" + (" ⚠️ Salida temprana" if is_early_dismissal else ""),
-            "action": "checkout",
-            "student_name": student.name,
-            "class": student.class_name,
-            "checkin_time": existing_checkin.checkin_time,
-            "checkout_time": now,
-            "duration_minutes": int(time_diff),
-            "early_dismissal": is_early_dismissal
-        }
+        db.commit()
+        attendance_state.record_checkout(today, student.school_id, student.id, now)
+        _announce_scan(ScanEvent(
+            type="checkout",
+            student_id=student.id,
+            student_name=student.name,
+            class_name=student.class_name,
+            school_id=student.school_id,
+            checkin_time=existing_checkin.checkin_time,
+            checkout_time=now
+        ))
+        
+        return _checkout_response(student, existing_checkin.checkin_time, now, time_diff, tz)
     
-    # CASE 2: Student already completed both check-in and check-out today
-    if existing_checkin and existing_checkin.checkout_time:
-        return {
-            "error": "already_completed",
-            "message": f"✅ {student.name} ya completó entrada y salida hoy\nEntrada: {existing_checkin.checkin_time.strftime('%H:%M')}h\nSalida: {existing_checkin.checkout_time.strftime('%H:%M')}h",
-            "already_completed": True,
-            "student_name": student.name,
-            "checkin_time": existing_checkin.checkin_time,
-            "checkout_time": existing_checkin.checkout_time
-        }
+    # First scan of the day - Process CHECK-IN
+    is_late = scan_rules.is_late(now, tz)
     
-    # CASE 3: First scan of the day - Process CHECK-IN
-    is_late = (now.hour > settings.LATE_THRESHOLD_HOUR or 
-               (now.hour == settings.LATE_THRESHOLD_HOUR and now.minute > settings.LATE_THRESHOLD_MINUTE))
+    # Single INSERT ... ON CONFLICT DO NOTHING against the one-per-day unique index
+    checkin_id = insert_checkin(db, student.id, now, is_late)
+    if checkin_id is None:
+        # Another scan of this student created today's check-in first
+        db.rollback()
+        current = find_checkin(db, student.id, today)
+        minutes = max((now - current.checkin_time).total_seconds() / 60, 0)
+        return _refused_scan(
+            scan_rules.DUPLICATE_SCAN, student, current.checkin_time, current.checkout_time, minutes, tz
+        )
+    record_checkin(db, student.school_id, student.class_name, now, is_late)
+    attendance_bitmaps.record_checkin(db, student.id, today, is_late)
     
-    db_checkin = CheckIn(
-        student_id=student.id,
-        checkin_time=now,
-        is_late=is_late,
+    # Queue check-in email notification in the same transaction; the outbox
+    # dispatcher delivers it and sets email_sent afterwards
+    subject, body = build_checkin_notification(
+        student.name, student.class_name, timeutils.local_time(now, tz), is_late=is_late
     )
-    db.add(db_checkin)
+    email_queued = enqueue_email(db, student.parent_email, subject, body, checkin_id=checkin_id) is not None
     db.commit()
-    db.refresh(db_checkin)
+    attendance_state.record_checkin(today, student, checkin_id, now, is_late)
+    _announce_scan(ScanEvent(
+        type="checkin",
+        student_id=student.id,
+        student_name=student.name,
+        class_name=student.class_name,
+        school_id=student.school_id,
+        checkin_time=now,
+        is_late=is_late
+    ))
+    
+    return _checkin_response(student, now, is_late, email_queued)
+
+
+@router.post("/scan/batch", response_model=ScanBatchResponse)
+def checkin_scan_batch(
+    batch: ScanBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_school_user)
+):
+    """Ingest scans a kiosk buffered while offline (school users; admins for any school).
+    
+    Same rules as /scan, judged at each event's scanned_at, in one transaction.
+    Events are idempotent by idempotency_key: retrying a batch returns the stored
+    results (replayed=true) instead of recording the scans twice. Scans outside
+    the kiosk's offline window or of another school's students are refused.
+    """
+    if len(batch.events) > settings.SCAN_BATCH_MAX_EVENTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch can hold at most {settings.SCAN_BATCH_MAX_EVENTS} events"
+        )
     
-    # Send check-in email notification
+    school_id = None if current_user.role == UserRole.admin else current_user.school_id
+    now = timeutils.utc_now()
     try:
-        email_sent = await send_checkin_notification(
-            student.parent_email,
-            student.name,
-            student.class_name,
-            now,
-            is_late=is_late
+        earliest = offline_window(db, batch.device_id, school_id, to_utc(batch.offline_since), now)
+    except KioskDeviceConflict as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    
+    scans = [
+        IncomingScan(
+            idempotency_key=event.idempotency_key,
+            student_code=event.student_id,
+            scanned_at=to_utc(event.scanned_at),
+            device_id=event.device_id or batch.device_id
+        )
+        for event in batch.events
+    ]
+    try:
+        if settings.SCAN_JOURNAL_ENABLED:
+            # Journaled scans must reach the database before a batch is judged against it
+            with scan_journal.scan_lock:
+                replay_journal()
+                if scan_journal.pending(1):
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="Scan journal could not be replayed; retry the batch later"
+                    )
+                outcome = ingest_scans(db, scans, now=now, earliest=earliest, school_id=school_id)
+        else:
+            outcome = ingest_scans(db, scans, now=now, earliest=earliest, school_id=school_id)
+    except (IntegrityError, CheckInConflict):
+        # Another request ingested the same keys or scanned the same students
+        # concurrently; a retry sees their results
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Some of these events conflict with a concurrent scan; retry the batch"
         )
-        db_checkin.email_sent = email_sent
-        db.commit()
-    except Exception as e:
-        print(f"Error sending email: {e}")
     
-    return {
-        "message": f"¡Bienvenido/a, {student.name}!",
-        "action": "checkin",
-        "student_name": student.name,
-        "class": student.class_name,
-        "checkin_time": now,
-        "is_late": is_late,
-        "email_sent": db_checkin.email_sent
-    }
+    for event in outcome.events:
+        _announce_scan(event)
+    # Scans for previous days change dashboards that are otherwise only
+    # invalidated by roster edits
+    for school_id in outcome.past_schools:
+        mark_roster_changed(school_id)
+    
+    return ScanBatchResponse(
+        device_id=batch.device_id,
+        accepted=outcome.accepted,
+        replayed=outcome.replayed,
+        results=outcome.results
+    )
 
 
 @router.get("/classes", response_model=List[str])
-async def get_classes(
+def get_classes(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_school_user)
 ):
@@ -205,79 +359,49 @@ async def get_classes(
     return [class_name[0] for class_name in classes]
 
 
-@router.get("/dashboard", response_model=DashboardData)
-async def get_dashboard_data(
-    date_filter: Optional[str] = Query(None, description="Date in YYYY-MM-DD format"),
-    class_filter: Optional[str] = Query(None, description="Filter by class name"),
-    school_id: Optional[int] = Query(None, description="Filter by school ID (admin only)"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_school_user)
-):
-    """Get dashboard data for a specific date (filtered by school and optionally by class)."""
-    # Parse date
-    if date_filter:
-        try:
-            target_date = datetime.strptime(date_filter, "%Y-%m-%d").date()
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-    else:
-        target_date = date.today()
-    
-    date_start = datetime.combine(target_date, time.min)
-    date_end = datetime.combine(target_date, time.max)
+def _absent_email_sent(now: datetime, tz: ZoneInfo) -> bool:
+    """Whether today's CHECK_ABSENT_TIME (9:10, school clock) absence emails have gone out at naive UTC `now`."""
+    absent_check_hour, absent_check_minute = (int(part) for part in settings.CHECK_ABSENT_TIME.split(':'))
+    local = timeutils.local_time(now, tz)
+    return (local.hour > absent_check_hour or
+            (local.hour == absent_check_hour and local.minute >= absent_check_minute))
+
+
+def _build_dashboard(
+    db: Session,
+    target_date: date,
+    scope_school_id: Optional[int],
+    class_filter: Optional[str],
+    email_has_been_sent: bool
+) -> DashboardData:
+    """Assemble DashboardData from plain column rows (no ORM objects)."""
+    # Active students (roster) with their school name
+    students_query = db.query(
+        Student.id, Student.name, Student.class_name, School.name.label("school_name")
+    ).outerjoin(School, Student.school_id == School.id).filter(Student.is_active == True)
     
-    # Get all active students (filtered by school for non-admins)
-    students_query = db.query(Student).options(joinedload(Student.school)).filter(Student.is_active == True)
-    if current_user.role != UserRole.admin:
-        if not current_user.school_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="User must be associated with a school"
-            )
-        students_query = students_query.filter(Student.school_id == current_user.school_id)
-    else:
-        # Admin can filter by specific school if provided
-        if school_id:
-            students_query = students_query.filter(Student.school_id == school_id)
+    # Check-ins for the date (school-local, like the in-memory state)
+    checkins_query = db.query(
+        CheckIn.student_id, CheckIn.checkin_time, CheckIn.checkout_time, CheckIn.is_late, CheckIn.email_sent,
+        Student.name.label("student_name"), School.name.label("school_name")
+    ).join(Student, CheckIn.student_id == Student.id).outerjoin(School, Student.school_id == School.id).filter(
+        CheckIn.local_date == target_date
+    )
     
-    # Apply class filter if provided
+    if scope_school_id:
+        students_query = students_query.filter(Student.school_id == scope_school_id)
+        checkins_query = checkins_query.filter(Student.school_id == scope_school_id)
     if class_filter:
         students_query = students_query.filter(Student.class_name == class_filter)
-    
-    all_students = students_query.all()
-    
-    # Get check-ins for the date (filtered by school)
-    checkins_query = db.query(CheckIn).options(joinedload(CheckIn.student).joinedload(Student.school)).filter(
-        CheckIn.checkin_time >= date_start,
-        CheckIn.checkin_time <= date_end
-    ).join(Student)
-    
-    if current_user.role != UserRole.admin:
-        checkins_query = checkins_query.filter(Student.school_id == current_user.school_id)
-    else:
-        # Admin can filter by specific school if provided
-        if school_id:
-            checkins_query = checkins_query.filter(Student.school_id == school_id)
-    
-    # Apply class filter to check-ins if provided
-    if class_filter:
         checkins_query = checkins_query.filter(Student.class_name == class_filter)
     
-    checkins = checkins_query.all()
+    all_students = students_query.order_by(Student.id).all()
+    checkins = checkins_query.order_by(CheckIn.id).all()
     
     # Calculate stats
     present_student_ids = {checkin.student_id for checkin in checkins}
     late_checkins = [checkin for checkin in checkins if checkin.is_late]
     
-    # DEBUG: Log the stats calculation
-    print(f"[DEBUG] Dashboard endpoint:")
-    print(f"  Date: {target_date}")
-    print(f"  User role: {current_user.role}")
-    print(f"  Total students: {len(all_students)}")
-    print(f"  Present students: {len(present_student_ids)}")
-    print(f"  Late checkins: {len(late_checkins)}")
-    print(f"  Absent students: {len(all_students) - len(present_student_ids)}")
-    
     stats = DashboardStats(
         total_present=len(present_student_ids),
         total_absent=len(all_students) - len(present_student_ids),
@@ -288,10 +412,11 @@ async def get_dashboard_data(
     # Format check-in logs
     checkin_logs = [
         CheckInLog(
-            checkin_time=checkin.checkin_time.strftime("%d/%m/%Y %H:%M:%S"),
-            student_name=checkin.student.name,
-            school_name=checkin.student.school.name,
-            checkout_time=checkin.checkout_time.strftime("%d/%m/%Y %H:%M:%S") if checkin.checkout_time else None
+            student_id=checkin.student_id,
+            checkin_time=checkin.checkin_time.strftime(DASHBOARD_TIME_FORMAT),
+            student_name=checkin.student_name,
+            school_name=checkin.school_name,
+            checkout_time=checkin.checkout_time.strftime(DASHBOARD_TIME_FORMAT) if checkin.checkout_time else None
         )
         for checkin in checkins
     ]
@@ -299,30 +424,21 @@ async def get_dashboard_data(
     # Late students
     late_students = [
         LateStudent(
-            name=checkin.student.name,
-            time=checkin.checkin_time.strftime("%d/%m/%Y %H:%M:%S"),
-            school_name=checkin.student.school.name,
+            student_id=checkin.student_id,
+            name=checkin.student_name,
+            time=checkin.checkin_time.strftime(DASHBOARD_TIME_FORMAT),
+            school_name=checkin.school_name,
             email_sent=checkin.email_sent
         )
         for checkin in late_checkins
     ]
     
-    # Absent students - check if 9:10 AM email has been sent
-    current_time = datetime.now().time()
-    absent_email_time = settings.CHECK_ABSENT_TIME.split(':')
-    absent_check_hour = int(absent_email_time[0])
-    absent_check_minute = int(absent_email_time[1])
-    
-    # Email is sent after 9:10 AM
-    email_has_been_sent = (current_time.hour > absent_check_hour or 
-                          (current_time.hour == absent_check_hour and current_time.minute >= absent_check_minute))
-    
     absent_students = [
         AbsentStudent(
             id=student.id,
             name=student.name,
             class_name=student.class_name,
-            school_name=student.school.name,
+            school_name=student.school_name,
             email_sent=email_has_been_sent  # True if current time >= 9:10 AM
         )
         for student in all_students
@@ -337,28 +453,263 @@ async def get_dashboard_data(
     )
 
 
+def _build_today_dashboard(
+    db: Session,
+    today: date,
+    scope_school_id: Optional[int],
+    class_filter: Optional[str],
+    email_has_been_sent: bool
+) -> DashboardData:
+    """Assemble today's DashboardData from the in-memory attendance state."""
+    (active, present, late), entries = attendance_state.view(db, today, scope_school_id, class_filter)
+    
+    # Journaled check-ins have no id until replayed; they sort after the rest
+    checked_in = sorted(
+        (pair for pair in entries if pair[1].present),
+        key=lambda pair: (pair[1].checkin_id is None, pair[1].checkin_id or 0, pair[1].checkin_time)
+    )
+    
+    stats = DashboardStats(
+        total_present=present,
+        total_absent=active - present,
+        total_late=late,
+        date=today.strftime("%d/%m/%Y")
+    )
+    
+    checkin_logs = [
+        CheckInLog(
+            student_id=entry.id,
+            checkin_time=entry.checkin_time.strftime(DASHBOARD_TIME_FORMAT),
+            student_name=entry.name,
+            school_name=school.name,
+            checkout_time=entry.checkout_time.strftime(DASHBOARD_TIME_FORMAT) if entry.checkout_time else None
+        )
+        for school, entry in checked_in
+    ]
+    
+    late_students = [
+        LateStudent(
+            student_id=entry.id,
+            name=entry.name,
+            time=entry.checkin_time.strftime(DASHBOARD_TIME_FORMAT),
+            school_name=school.name,
+            email_sent=entry.email_sent
+        )
+        for school, entry in checked_in
+        if entry.is_late
+    ]
+    
+    absent_students = [
+        AbsentStudent(
+            id=entry.id,
+            name=entry.name,
+            class_name=entry.class_name,
+            school_name=school.name,
+            email_sent=email_has_been_sent  # True if current time >= 9:10 AM
+        )
+        for school, entry in sorted(entries, key=lambda pair: pair[1].id)
+        if entry.is_active and not entry.present
+    ]
+    
+    return DashboardData(
+        stats=stats,
+        checkins=checkin_logs,
+        late_students=late_students,
+        absent_students=absent_students
+    )
+
+
+def _dashboard_scope(current_user: User, school_id: Optional[int]) -> Optional[int]:
+    """Non-admins only ever see their own school; admins may pick one (None: all)."""
+    if current_user.role != UserRole.admin:
+        if not current_user.school_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="User must be associated with a school"
+            )
+        return current_user.school_id
+    return school_id or None
+
+
+def _cached_dashboard(db: Session, key: tuple, tag: str, email_has_been_sent: bool) -> bytes:
+    """Serialized DashboardData for a (school scope, class, date) key, built on a cache miss."""
+    body = dashboard_cache.get(key, tag)
+    if body is None:
+        scope_school_id, class_filter, target_date = key
+        if target_date == local_day(db, scope_school_id, timeutils.utc_now()):
+            data = _build_today_dashboard(db, target_date, scope_school_id, class_filter, email_has_been_sent)
+        else:
+            data = _build_dashboard(db, target_date, scope_school_id, class_filter, email_has_been_sent)
+        body = data.model_dump_json().encode("utf-8")
+        dashboard_cache.put(key, tag, body)
+    return body
+
+
+@router.get("/dashboard", response_model=DashboardData)
+def get_dashboard_data(
+    request: Request,
+    date_filter: Optional[str] = Query(None, description="Date in YYYY-MM-DD format"),
+    class_filter: Optional[str] = Query(None, description="Filter by class name"),
+    school_id: Optional[int] = Query(None, description="Filter by school ID (admin only)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_school_user)
+):
+    """Get dashboard data for a specific date (filtered by school and optionally by class).
+
+    Responses are cached per (school, class, date) and carry an ETag; a request
+    whose If-None-Match still matches gets 304 without touching the database.
+    """
+    scope_school_id = _dashboard_scope(current_user, school_id)
+    now = timeutils.utc_now()
+    tz = timeutils.school_zone(db, scope_school_id)
+    # The school's calendar day, like CheckIn.local_date
+    today = timeutils.local_calendar(now, tz).local_date
+    
+    # Parse date
+    if date_filter:
+        try:
+            target_date = datetime.strptime(date_filter, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    else:
+        target_date = today
+    
+    # Absent students - check if 9:10 AM email has been sent
+    email_has_been_sent = _absent_email_sent(now, tz)
+    
+    key = (scope_school_id, class_filter or None, target_date)
+    tag = validity_tag(scope_school_id, target_date, today, email_has_been_sent)
+    etag = etag_for(key, tag)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if etag in [value.strip() for value in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    body = _cached_dashboard(db, key, tag, email_has_been_sent)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/dashboard/changes", response_model=DashboardChanges)
+def get_dashboard_changes(
+    since: int = Query(..., description="Last version the client has applied (0 for a first snapshot)"),
+    class_filter: Optional[str] = Query(None, description="Filter by class name"),
+    school_id: Optional[int] = Query(None, description="Filter by school ID (admin only)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_school_user)
+):
+    """Today's dashboard changes (check-ins, check-outs, late email status) after `since`.
+
+    Falls back to a full snapshot (`full: true`) when the changes can no longer
+    be replayed: the client is too far behind, a student or school changed, or
+    the day rolled over. Applying a change twice is harmless.
+    """
+    scope_school_id = _dashboard_scope(current_user, school_id)
+    now = timeutils.utc_now()
+    tz = timeutils.school_zone(db, scope_school_id)
+    today = timeutils.local_calendar(now, tz).local_date
+    email_has_been_sent = _absent_email_sent(now, tz)
+    
+    # Read the version before building any snapshot so nothing committed in
+    # between is skipped; at worst it is replayed on the next poll
+    version, entries = dashboard_versions.changes_since(scope_school_id, since, today)
+    
+    if entries is None:
+        key = (scope_school_id, class_filter or None, today)
+        tag = validity_tag(scope_school_id, today, today, email_has_been_sent)
+        body = _cached_dashboard(db, key, tag, email_has_been_sent)
+        return DashboardChanges(
+            version=version,
+            full=True,
+            absent_email_sent=email_has_been_sent,
+            snapshot=DashboardData.model_validate_json(body)
+        )
+    
+    return DashboardChanges(
+        version=version,
+        full=False,
+        absent_email_sent=email_has_been_sent,
+        changes=[
+            DashboardChange(version=entry_version, **change)
+            for entry_version, _, entry_class, change in entries
+            if not class_filter or entry_class == class_filter
+        ]
+    )
+
+
+@router.get("/stream")
+def stream_scan_events(
+    request: Request,
+    token: str = Query(..., description="Access token (EventSource cannot send an Authorization header)"),
+    class_filter: Optional[str] = Query(None, description="Filter by class name"),
+    school_id: Optional[int] = Query(None, description="Filter by school ID (admin only)"),
+    db: Session = Depends(get_db)
+):
+    """Server-Sent Events stream of check-ins and check-outs as they are committed.
+
+    The first event is `ready`; clients fetch /dashboard after it and apply
+    `checkin` / `checkout` events on top. `resync` means events were dropped
+    and the snapshot must be fetched again.
+    """
+    current_user = authenticate_token(token, db)
+    if current_user.role != UserRole.admin:
+        if not current_user.school_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="User must be associated with a school"
+            )
+        school_id = current_user.school_id
+
+    async def event_stream():
+        subscriber = scan_events.subscribe(school_id=school_id, class_name=class_filter)
+        try:
+            yield "event: ready\ndata: {}\n\n"
+            while not await request.is_disconnected():
+                if subscriber.stale and subscriber.queue.empty():
+                    subscriber.stale = False
+                    yield "event: resync\ndata: {}\n\n"
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=settings.SCAN_EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"event: {event.type}\ndata: {json.dumps(event.to_dict())}\n\n"
+        finally:
+            scan_events.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/", response_model=List[CheckInSchema])
-async def get_checkins(
-    skip: int = 0,
-    limit: int = 100,
+def get_checkins(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Page size (capped at PAGE_SIZE_MAX)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    include_total: bool = Query(False, description="Return the match count in X-Total-Count"),
     date_filter: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get check-in records."""
+    """Get check-in records, newest first. Follow X-Next-Cursor for the next page."""
     query = db.query(CheckIn)
     
     if date_filter:
         try:
             target_date = datetime.strptime(date_filter, "%Y-%m-%d").date()
-            date_start = datetime.combine(target_date, time.min)
-            date_end = datetime.combine(target_date, time.max)
-            query = query.filter(
-                CheckIn.checkin_time >= date_start,
-                CheckIn.checkin_time <= date_end
-            )
+            query = query.filter(CheckIn.local_date == target_date)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format")
     
-    checkins = query.order_by(CheckIn.checkin_time.desc()).offset(skip).limit(limit).all()
+    checkins, next_cursor = paginate(query, CheckIn.checkin_time, CheckIn.id, cursor, limit)
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if include_total:
+        response.headers["X-Total-Count"] = str(query.count())
     return checkins
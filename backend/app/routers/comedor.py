@@ -14,7 +14,7 @@ router = APIRouter(prefix="/api/comedor", tags=["Kitchen/Comedor"])
 
 
 @router.get("/today")
-async def get_kitchen_data_today(
+def get_kitchen_data_today(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -84,7 +84,7 @@ async def get_kitchen_data_today(
 
 
 @router.get("/history")
-async def get_kitchen_data_history(
+def get_kitchen_data_history(
     days: int = Query(7, ge=1, le=90),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -133,7 +133,7 @@ async def get_kitchen_data_history(
 
 
 @router.get("/dietary-summary")
-async def get_dietary_summary(
+def get_dietary_summary(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -225,7 +225,7 @@ def _generate_kitchen_snapshot_for_today(db: Session, school_id: Optional[int])
         checkins_today = db.query(CheckIn).filter(
             and_(
                 CheckIn.student_id.in_([s.id for s in students]),
-                func.date(CheckIn.checkin_time) == today
+                CheckIn.local_date == today
             )
         ).all()
         
@@ -235,7 +235,7 @@ def _generate_kitchen_snapshot_for_today(db: Session, school_id: Optional[int])
         absences_today = db.query(AbsenceNotification).filter(
             and_(
                 AbsenceNotification.student_id.in_([s.id for s in students]),
-                func.date(AbsenceNotification.notification_date) == today
+                AbsenceNotification.local_date == today
             )
         ).all()
         
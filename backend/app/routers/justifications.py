@@ -16,6 +16,8 @@ from app.services.email_service import (
     send_justification_submitted_notification,
     send_justification_reviewed_notification
 )
+from app.services.attendance_rollup import refresh_days
+from app.services import attendance_bitmaps
 
 router = APIRouter(prefix="/api/justifications", tags=["Justifications"])
 
@@ -339,6 +341,10 @@ async def update_justification(
     if justification_update.notes is not None:
         justification.notes = justification_update.notes
     
+    if justification_update.status:
+        db.flush()
+        refresh_days(db, student.school_id, [justification.date])
+        attendance_bitmaps.refresh(db, student.id, [justification.date])
     db.commit()
     db.refresh(justification)
     
@@ -387,7 +393,11 @@ async def delete_justification(
                 detail="Access denied"
             )
     
+    justified_day = justification.date
     db.delete(justification)
+    db.flush()
+    refresh_days(db, student.school_id, [justified_day])
+    attendance_bitmaps.refresh(db, student.id, [justified_day])
     db.commit()
     
     return None
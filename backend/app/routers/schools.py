@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List
+from datetime import date
 
 from app.core.database import get_db
 from app.core.deps import get_current_active_user
+from app.core import timeutils
 from app.models import models, schemas
+from app.services.dashboard_cache import mark_roster_changed
+from app.services.attendance_state import attendance_state
+from app.services.school_calendar import get_calendar, invalidate_calendar
 
 router = APIRouter(prefix="/api/schools", tags=["Schools"])
 
@@ -112,6 +117,11 @@ def update_school(
     
     db.commit()
     db.refresh(db_school)
+    # School names are shown on the dashboard
+    mark_roster_changed(db_school.id)
+    attendance_state.invalidate_school(db_school.id)
+    if "timezone" in update_data:
+        timeutils.forget_zones()
     return db_school
 
 
@@ -146,6 +156,116 @@ def delete_school(
             detail=f"Cannot delete school with {student_count} active students"
         )
     
+    db.query(models.SchoolCalendarDay).filter(models.SchoolCalendarDay.school_id == school_id).delete()
     db.delete(db_school)
     db.commit()
+    invalidate_calendar(school_id)
+    return None
+
+
+def _school_or_404(db: Session, school_id: int) -> models.School:
+    school = db.query(models.School).filter(models.School.id == school_id).first()
+    if not school:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="School not found"
+        )
+    return school
+
+
+@router.get("/{school_id}/calendar", response_model=schemas.SchoolCalendarRange)
+def get_school_calendar(
+    school_id: int,
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Calendar entries of a school in a date range, and its number of school days"""
+    if not current_user.is_admin and current_user.school_id != school_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this school"
+        )
+    _school_or_404(db, school_id)
+    
+    days = db.query(models.SchoolCalendarDay).filter(
+        models.SchoolCalendarDay.school_id == school_id,
+        models.SchoolCalendarDay.date >= start_date,
+        models.SchoolCalendarDay.date <= end_date
+    ).order_by(models.SchoolCalendarDay.date).all()
+    
+    return {
+        "school_id": school_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "expected_days": get_calendar(db, school_id).expected_days(start_date, end_date),
+        "days": days
+    }
+
+
+@router.put("/{school_id}/calendar", response_model=List[schemas.SchoolCalendarDay])
+def update_school_calendar(
+    school_id: int,
+    calendar_update: schemas.SchoolCalendarUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Create or replace calendar entries of a school (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can update school calendars"
+        )
+    _school_or_404(db, school_id)
+    
+    entries = {day.date: day for day in calendar_update.days}
+    existing = {
+        row.date: row for row in db.query(models.SchoolCalendarDay).filter(
+            models.SchoolCalendarDay.school_id == school_id,
+            models.SchoolCalendarDay.date.in_(entries)
+        )
+    }
+    saved = []
+    for day, entry in sorted(entries.items()):
+        row = existing.get(day)
+        if row is None:
+            row = models.SchoolCalendarDay(school_id=school_id, date=day)
+            db.add(row)
+        row.day_type = models.CalendarDayType(entry.day_type.value)
+        row.description = entry.description
+        saved.append(row)
+    
+    db.commit()
+    invalidate_calendar(school_id)
+    for row in saved:
+        db.refresh(row)
+    return saved
+
+
+@router.delete("/{school_id}/calendar/{day}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_school_calendar_day(
+    school_id: int,
+    day: date,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Remove a calendar entry, so the day follows the Monday-Friday default again (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can update school calendars"
+        )
+    
+    deleted = db.query(models.SchoolCalendarDay).filter(
+        models.SchoolCalendarDay.school_id == school_id,
+        models.SchoolCalendarDay.date == day
+    ).delete()
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Calendar entry not found"
+        )
+    db.commit()
+    invalidate_calendar(school_id)
     return None
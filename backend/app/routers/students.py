@@ -8,6 +8,10 @@ from app.core.deps import get_current_user, get_current_admin_user, get_current_
 from app.models.models import Student, User, UserRole, School, TeacherClassAssignment
 from app.models.schemas import StudentCreate, StudentUpdate, Student as StudentSchema, StudentWithSchool
 from app.services.qr_service import generate_qr_code, delete_qr_code
+from app.services.scan_cache import invalidate_student
+from app.services.dashboard_cache import mark_roster_changed
+from app.services.attendance_state import attendance_state
+from app.services.attendance_rollup import move_student
 
 router = APIRouter(prefix="/api/students", tags=["Students"])
 
@@ -113,6 +117,9 @@ async def create_student(
     db.add(db_student)
     db.commit()
     db.refresh(db_student)
+    invalidate_student(db_student.student_id)
+    mark_roster_changed(db_student.school_id)
+    attendance_state.invalidate_school(db_student.school_id)
     
     # Generate QR code
     qr_path = generate_qr_code(db_student)
@@ -138,7 +145,9 @@ async def update_student(
     # Update fields
     if student_data.name is not None:
         db_student.name = student_data.name
-    if student_data.class_name is not None:
+    if student_data.class_name is not None and student_data.class_name != db_student.class_name:
+        # Reports group by the student's current class, so move their history in the rollup too
+        move_student(db, db_student.id, db_student.school_id, db_student.class_name, student_data.class_name)
         db_student.class_name = student_data.class_name
     if student_data.parent_email is not None:
         db_student.parent_email = student_data.parent_email
@@ -147,6 +156,9 @@ async def update_student(
     
     db.commit()
     db.refresh(db_student)
+    invalidate_student(db_student.student_id)
+    mark_roster_changed(db_student.school_id)
+    attendance_state.invalidate_school(db_student.school_id)
     return db_student
 
 
@@ -164,6 +176,9 @@ async def delete_student(
     # Soft delete
     db_student.is_active = False
     db.commit()
+    invalidate_student(db_student.student_id)
+    mark_roster_changed(db_student.school_id)
+    attendance_state.invalidate_school(db_student.school_id)
     
     return None
 
@@ -329,6 +344,9 @@ async def upload_students_excel(
                 db.add(db_student)
                 db.commit()
                 db.refresh(db_student)
+                invalidate_student(db_student.student_id)
+                mark_roster_changed(db_student.school_id)
+                attendance_state.invalidate_school(db_student.school_id)
                 
                 # Generate QR code
                 qr_path = generate_qr_code(db_student)
@@ -11,6 +11,7 @@ from app.models.schemas import (
     UserWithSchool
 )
 from app.core.security import get_password_hash
+from app.core.auth_cache import token_cache
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
@@ -184,6 +185,7 @@ async def update_user(
     
     db.commit()
     db.refresh(db_user)
+    token_cache.invalidate_user(db_user.id)
     
     return serialize_user(db_user)
 
@@ -232,6 +234,7 @@ async def reset_user_password(
     # Update password
     db_user.hashed_password = get_password_hash(new_password)
     db.commit()
+    token_cache.invalidate_user(db_user.id)
     
     return {"message": "Password reset successfully"}
 
@@ -315,6 +318,7 @@ async def delete_user(
     
     db.delete(db_user)
     db.commit()
+    token_cache.invalidate_user(user_id)
     
     return None
 
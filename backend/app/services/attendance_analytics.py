@@ -0,0 +1,448 @@
+"""
+Vectorized attendance analytics for the report endpoints.
+
+The reports used to loop in Python over students, months and weekdays. Here a
+scope's attendance is loaded once into a (students x days) matrix and every
+metric is a sum or mask over its rows and columns:
+
+- present / late / on_time: check-ins per student and calendar day (is_late
+  NULL counts as neither late nor on time, like the SQL it replaces)
+- expected: whether the day is a school day for the student's school
+  (services.school_calendar)
+
+Columns cover every calendar day of the span, so a check-in on a day that is
+not a school day still counts as attendance, as it always has in reports.
+Rows are the students of the school scope; a class filter is a row mask, so
+school-wide figures (the monthly comparison) come from the same matrix.
+
+The tardiness and period statistics need per-student or per-day totals only,
+so they skip the matrix and each run a single grouped query with conditional
+sums (SUM(CASE ...)) instead.
+
+/historical-analytics, /statistics and /tardiness-analysis are thin wrappers
+over historical_analytics(), period_statistics() and tardiness_analysis().
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, case, select
+from sqlalchemy.orm import Session
+from app.models.models import CheckIn, Student, School
+from app.services.attendance_rollup import period_rows
+from app.services.school_calendar import get_calendars
+
+CHRONIC_ABSENTEEISM_RATE = 80  # Percent of school days attended
+IMPROVEMENT_THRESHOLD = 5  # Percentage points between first and last month
+# Bucket edges (late percentage) for the tardiness distribution
+LATE_PERCENTAGE_BINS = (0, 10, 25, 50, 100)
+
+
+@dataclass
+class AttendanceMatrix:
+    first_day: date
+    student_ids: np.ndarray  # (students,), in query order
+    names: List[str]
+    school_ids: np.ndarray  # (students,)
+    class_mask: np.ndarray  # (students,) bool, rows in the class filter (all when no filter)
+    present: np.ndarray  # (students, days) check-ins
+    late: np.ndarray  # (students, days) check-ins with is_late
+    on_time: np.ndarray  # (students, days) check-ins with is_late == False
+    expected: np.ndarray  # (students, days) bool, school day for the student's school
+
+    @property
+    def day_count(self) -> int:
+        return self.present.shape[1]
+
+    def columns(self, first: date, last: date) -> slice:
+        """Columns of the days in [first, last], clipped to the matrix."""
+        lower = min(max((first - self.first_day).days, 0), self.day_count)
+        upper = min(max((last - self.first_day).days + 1, lower), self.day_count)
+        return slice(lower, upper)
+
+    def weekdays(self) -> np.ndarray:
+        """Weekday of every column (0 = Monday)."""
+        return (np.arange(self.day_count) + self.first_day.weekday()) % 7
+
+    def days(self) -> pd.DatetimeIndex:
+        return pd.date_range(self.first_day, periods=self.day_count, freq="D")
+
+
+def load_matrix(
+    db: Session,
+    first_day: date,
+    last_day: date,
+    school_id: Optional[int] = None,
+    class_name: Optional[str] = None
+) -> AttendanceMatrix:
+    """Attendance of the students of a school scope over [first_day, last_day].
+
+    One query for the students, one for the check-ins (only for students in
+    the class filter), plus the school calendars when not cached.
+    """
+    day_count = max((last_day - first_day).days + 1, 0)
+
+    student_query = db.query(Student.id, Student.name, Student.school_id, Student.class_name)
+    if school_id:
+        student_query = student_query.filter(Student.school_id == school_id)
+    # Rows keep the query's order, which ties in the rankings below fall back to
+    students = student_query.all()
+
+    student_ids = np.array([student.id for student in students], dtype=np.int64)
+    school_ids = np.array([student.school_id for student in students], dtype=np.int64)
+    if class_name:
+        class_mask = np.array([student.class_name == class_name for student in students], dtype=bool)
+    else:
+        class_mask = np.ones(len(students), dtype=bool)
+
+    shape = (len(students), day_count)
+    present = np.zeros(shape, dtype=np.int32)
+    late = np.zeros(shape, dtype=np.int32)
+    on_time = np.zeros(shape, dtype=np.int32)
+
+    if day_count and len(students):
+        checkin_query = db.query(CheckIn.student_id, CheckIn.local_date, CheckIn.is_late).join(
+            Student, CheckIn.student_id == Student.id
+        ).filter(CheckIn.local_date >= first_day, CheckIn.local_date <= last_day)
+        if school_id:
+            checkin_query = checkin_query.filter(Student.school_id == school_id)
+        if class_name:
+            checkin_query = checkin_query.filter(Student.class_name == class_name)
+        checkins = pd.DataFrame(checkin_query.all(), columns=["student_id", "local_date", "is_late"])
+        if len(checkins):
+            by_id = np.argsort(student_ids)
+            rows = by_id[np.searchsorted(student_ids, checkins["student_id"].to_numpy(dtype=np.int64), sorter=by_id)]
+            columns = (pd.to_datetime(checkins["local_date"]) - pd.Timestamp(first_day)).dt.days.to_numpy()
+            is_late = checkins["is_late"]
+            np.add.at(present, (rows, columns), 1)
+            np.add.at(late, (rows, columns), (is_late == True).to_numpy(dtype=np.int32))
+            np.add.at(on_time, (rows, columns), (is_late == False).to_numpy(dtype=np.int32))
+
+    # One school-day mask per school, broadcast to its students
+    schools, school_rows = np.unique(school_ids, return_inverse=True)
+    calendars = get_calendars(db, schools.tolist())
+    masks = np.zeros((len(schools), day_count), dtype=bool)
+    for index, school in enumerate(schools.tolist()):
+        for day in calendars[school].school_days(first_day, last_day):
+            masks[index, (day - first_day).days] = True
+    expected = masks[school_rows] if len(students) else np.zeros(shape, dtype=bool)
+
+    return AttendanceMatrix(
+        first_day=first_day,
+        student_ids=student_ids,
+        names=[student.name for student in students],
+        school_ids=school_ids,
+        class_mask=class_mask,
+        present=present,
+        late=late,
+        on_time=on_time,
+        expected=expected,
+    )
+
+
+def longest_runs(flags: np.ndarray) -> np.ndarray:
+    """Longest run of consecutive True values in each row of a 2-D bool array."""
+    if flags.shape[1] == 0:
+        return np.zeros(flags.shape[0], dtype=np.int64)
+    positions = np.arange(1, flags.shape[1] + 1)
+    last_false = np.maximum.accumulate(np.where(flags, 0, positions), axis=1)
+    return (positions - last_false).max(axis=1)
+
+
+def absence_streaks(matrix: AttendanceMatrix, columns: slice) -> np.ndarray:
+    """Longest run of consecutive school days without a check-in, per student.
+
+    Days that are not school days (weekends, holidays) neither count nor break
+    a streak. Students of the same school share their school days, so each
+    school is one vectorized pass over its rows.
+    """
+    streaks = np.zeros(len(matrix.student_ids), dtype=np.int64)
+    expected = matrix.expected[:, columns]
+    absent = expected & (matrix.present[:, columns] == 0)
+    for school in np.unique(matrix.school_ids):
+        rows = matrix.school_ids == school
+        school_days = expected[rows][0] if rows.any() else None
+        if school_days is None or not school_days.any():
+            continue
+        streaks[rows] = longest_runs(absent[rows][:, school_days])
+    return streaks
+
+
+def _months(start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+    """Calendar months touched by [start, end] (each month in full)."""
+    months = []
+    current_date = start
+    while current_date <= end:
+        month_start = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(seconds=1)
+        months.append((month_start, month_end))
+        if current_date.month == 12:
+            current_date = current_date.replace(year=current_date.year + 1, month=1, day=1)
+        else:
+            current_date = current_date.replace(month=current_date.month + 1, day=1)
+    return months
+
+
+def historical_analytics(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    school_id: Optional[int] = None,
+    class_name: Optional[str] = None
+) -> dict:
+    """Monthly trends, chronic absenteeism, weekday patterns and improvement over [start, end]."""
+    months = _months(start, end)
+    first_day = months[0][0].date() if months else start.date()
+    last_day = months[-1][1].date() if months else end.date()
+    matrix = load_matrix(db, first_day, last_day, school_id, class_name)
+
+    in_class = matrix.class_mask
+    present = matrix.present[in_class]
+    late = matrix.late[in_class]
+    expected = matrix.expected[in_class]
+    month_columns = [matrix.columns(month_start.date(), month_end.date()) for month_start, month_end in months]
+
+    # ===== MONTHLY TRENDS =====
+    monthly_trends = []
+    for (month_start, _), columns in zip(months, month_columns):
+        month_present = present[:, columns]
+        total = int(month_present.sum())
+        late_count = int(late[:, columns].sum())
+        # School days owed by the students who attended at least once that month
+        attending = month_present.sum(axis=1) > 0
+        expected_days = int(expected[attending][:, columns].sum())
+        attendance_rate = (total / expected_days) * 100 if expected_days > 0 else 0
+        monthly_trends.append({
+            "month": month_start.strftime("%Y-%m"),
+            "total_attendance": total,
+            "late_count": late_count,
+            "attendance_rate": min(attendance_rate, 100)  # Cap at 100%
+        })
+
+    # ===== MONTHLY COMPARISON =====
+    # Every student of the school scope (regardless of class), for each school day of the month
+    monthly_comparison = []
+    for trend, columns in zip(monthly_trends, month_columns):
+        expected_attendance = int(matrix.expected[:, columns].sum())
+        monthly_comparison.append({
+            "month": trend["month"],
+            "present": trend["total_attendance"],
+            "late": trend["late_count"],
+            "absent": max(0, expected_attendance - trend["total_attendance"])
+        })
+
+    # ===== CHRONIC ABSENTEEISM =====
+    in_range = matrix.columns(start.date(), end.date())
+    attended = present[:, in_range].sum(axis=1)
+    expected_days = expected[:, in_range].sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(expected_days > 0, attended / expected_days * 100, 0.0)
+    streaks = absence_streaks(matrix, in_range)[in_class]
+    names = [name for name, keep in zip(matrix.names, in_class) if keep]
+    school_ids = matrix.school_ids[in_class]
+    school_names = dict(db.query(School.id, School.name).all())
+
+    chronic = np.flatnonzero(rates < CHRONIC_ABSENTEEISM_RATE)
+    chronic = chronic[np.argsort(rates[chronic], kind="stable")]  # Lowest rate first
+    chronic_absentees = [
+        {
+            "student_name": names[row],
+            "school_name": school_names.get(int(school_ids[row])),
+            "expected_days": int(expected_days[row]),
+            "attended_days": int(attended[row]),
+            "attendance_rate": float(rates[row]),
+            "longest_absence_streak": int(streaks[row])
+        }
+        for row in chronic
+    ]
+
+    # ===== WEEKDAY PATTERNS =====
+    weekdays = matrix.weekdays()[in_range]
+    range_present = present[:, in_range]
+    range_on_time = matrix.on_time[in_class][:, in_range]
+    range_expected = expected[:, in_range]
+    weekday_patterns = []
+    for weekday in range(5):  # Monday=0 to Friday=4
+        columns = weekdays == weekday
+        total = int(range_present[:, columns].sum())
+        on_time = int(range_on_time[:, columns].sum())
+        expected_checkins = int(range_expected[:, columns].sum())
+        weekday_patterns.append({
+            "weekday": weekday,
+            "attendance_rate": min(100, total / expected_checkins * 100) if expected_checkins > 0 else 0,
+            "punctuality_rate": (on_time / total * 100) if total > 0 else 0
+        })
+
+    # ===== STUDENT IMPROVEMENT TRACKING =====
+    # Compare first month vs last month
+    top_improved = []
+    if len(monthly_trends) >= 2:
+        first, last = month_columns[0], month_columns[-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            first_days, last_days = expected[:, first].sum(axis=1), expected[:, last].sum(axis=1)
+            first_rates = np.where(first_days > 0, present[:, first].sum(axis=1) / first_days * 100, 0.0)
+            last_rates = np.where(last_days > 0, present[:, last].sum(axis=1) / last_days * 100, 0.0)
+        improvements = last_rates - first_rates
+        improved = np.flatnonzero(improvements > IMPROVEMENT_THRESHOLD)
+        improved = improved[np.argsort(-improvements[improved], kind="stable")][:10]  # Top 10
+        top_improved = [
+            {
+                "student_name": names[row],
+                "first_month_rate": float(first_rates[row]),
+                "last_month_rate": float(last_rates[row]),
+                "improvement": float(improvements[row])
+            }
+            for row in improved
+        ]
+
+    # ===== SUMMARY METRICS =====
+    avg_monthly_attendance = sum(t["total_attendance"] for t in monthly_trends) / len(monthly_trends) if monthly_trends else 0
+
+    # Overall trend (compare first vs last month attendance rate)
+    overall_trend = 0
+    punctuality_improvement = 0
+    if len(monthly_trends) >= 2:
+        overall_trend = monthly_trends[-1]["attendance_rate"] - monthly_trends[0]["attendance_rate"]
+        first_late_rate = (monthly_trends[0]["late_count"] / monthly_trends[0]["total_attendance"] * 100) if monthly_trends[0]["total_attendance"] > 0 else 0
+        last_late_rate = (monthly_trends[-1]["late_count"] / monthly_trends[-1]["total_attendance"] * 100) if monthly_trends[-1]["total_attendance"] > 0 else 0
+        punctuality_improvement = first_late_rate - last_late_rate  # Positive = improvement (less late)
+
+    return {
+        "monthly_trends": monthly_trends,
+        "monthly_comparison": monthly_comparison,
+        "chronic_absentees": chronic_absentees[:20],  # Limit to top 20
+        "chronic_absentee_count": len(chronic_absentees),
+        "weekday_patterns": weekday_patterns,
+        "top_improved_students": top_improved,
+        "avg_monthly_attendance": avg_monthly_attendance,
+        "overall_trend": overall_trend,
+        "punctuality_improvement": punctuality_improvement
+    }
+
+
+def tardiness_analysis(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    school_id: Optional[int] = None,
+    class_name: Optional[str] = None
+) -> dict:
+    """Per-student late rates, the distribution of those rates and weekly trends over [start, end].
+
+    One grouped query returns check-ins and late check-ins per student and ISO
+    week; the per-student and per-week figures are both sums over its rows.
+    """
+    query = db.query(
+        Student.id,
+        Student.name,
+        CheckIn.iso_week,
+        func.count(CheckIn.id),
+        func.sum(case((CheckIn.is_late == True, 1), else_=0))
+    ).join(Student, CheckIn.student_id == Student.id).filter(
+        CheckIn.local_date >= start.date(),
+        CheckIn.local_date <= end.date()
+    )
+    if school_id:
+        query = query.filter(Student.school_id == school_id)
+    if class_name:
+        query = query.filter(Student.class_name == class_name)
+    rows = query.group_by(Student.id, Student.name, CheckIn.iso_week).all()
+    names = {row_student: name for row_student, name, _, _, _ in rows}
+    row_students = np.array([row[0] for row in rows], dtype=np.int64)
+    row_weeks = np.array([row[2] for row in rows], dtype=object)
+    row_totals = np.array([row[3] for row in rows], dtype=np.int64)
+    row_lates = np.array([int(row[4] or 0) for row in rows], dtype=np.int64)
+
+    # Students with at least one check-in, most often late first
+    student_ids, student_rows = np.unique(row_students, return_inverse=True)
+    totals = np.bincount(student_rows, weights=row_totals, minlength=len(student_ids)).astype(np.int64)
+    late_counts = np.bincount(student_rows, weights=row_lates, minlength=len(student_ids)).astype(np.int64)
+    late_percentages = np.round(late_counts / totals * 100, 2) if len(totals) else np.zeros(0)
+    order = np.lexsort((student_ids, -late_percentages))  # Ties by student id
+    students_analysis = [
+        {
+            "student_id": int(student_ids[index]),
+            "student_name": names[student_ids[index]],
+            "total_attendance": int(totals[index]),
+            "late_count": int(late_counts[index]),
+            "late_percentage": float(late_percentages[index])
+        }
+        for index in order
+    ]
+
+    counts, _ = np.histogram(late_percentages, bins=LATE_PERCENTAGE_BINS)
+    late_distribution = [
+        {"range": f"{low}-{high}%", "students": int(count)}
+        for low, high, count in zip(LATE_PERCENTAGE_BINS, LATE_PERCENTAGE_BINS[1:], counts)
+    ]
+
+    # Weekly trends, labelled like CheckIn.iso_week
+    weeks, week_rows = np.unique(row_weeks.astype(str), return_inverse=True)
+    week_totals = np.bincount(week_rows, weights=row_totals, minlength=len(weeks)).astype(np.int64)
+    week_lates = np.bincount(week_rows, weights=row_lates, minlength=len(weeks)).astype(np.int64)
+    trends = [
+        {
+            "week": week,
+            "total": total,
+            "late": late_total,
+            "late_percentage": round((late_total / total * 100) if total > 0 and late_total else 0, 2)
+        }
+        for week, total, late_total in zip(weeks.tolist(), week_totals.tolist(), week_lates.tolist())
+        if total > 0
+    ]
+
+    return {
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": end.strftime("%Y-%m-%d"),
+        "top_tardy_students": students_analysis[:20],  # Top 20
+        "late_distribution": late_distribution,
+        "weekly_trends": trends
+    }
+
+
+def period_statistics(
+    db: Session,
+    period: str,
+    start: datetime,
+    end: datetime,
+    school_id: Optional[int] = None,
+    class_name: Optional[str] = None
+) -> dict:
+    """Attendance totals and daily breakdown for a period, in one round trip over the daily rollup."""
+    rows = period_rows(start, end, school_id, class_name)
+    present = late = checked_out = justified = total_students = 0
+    daily_breakdown = []
+    for day, day_present, day_late, day_checked_out, day_justified, students in db.execute(
+        select(
+            rows.c.day,
+            func.sum(rows.c.present),
+            func.sum(rows.c.late),
+            func.sum(rows.c.checked_out),
+            func.sum(rows.c.justified),
+            func.sum(rows.c.students)
+        ).group_by(rows.c.day).order_by(rows.c.day)
+    ):
+        present += int(day_present)
+        late += int(day_late)
+        checked_out += int(day_checked_out)
+        # Approved absence justifications dated within the period, in the same school/class scope
+        justified += int(day_justified)
+        total_students += int(students)
+        if day is not None and day_present > 0:
+            daily_breakdown.append({"date": str(day), "total": int(day_present), "late": int(day_late)})
+
+    return {
+        "period": period,
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": end.strftime("%Y-%m-%d"),
+        "total_students": total_students,
+        "total_attendance": present,
+        "present": present,
+        "late": late,
+        "checked_out": checked_out,
+        "justified": justified,
+        "attendance_rate": round((present / total_students * 100) if total_students > 0 else 0, 2),
+        "late_rate": round((late / present * 100) if present > 0 else 0, 2),
+        "daily_breakdown": daily_breakdown
+    }
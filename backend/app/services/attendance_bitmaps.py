@@ -0,0 +1,287 @@
+"""
+Per-student attendance bitmaps.
+
+Questions about one student's history ("days present this term", "longest
+absence streak") used to range-scan checkins on every request.
+attendance_bitmaps keeps one row per student and school year with three
+bitsets of one bit per school-local day, counted from 1 September: present,
+late and justified (an approved absence justification). A bitset is 46 bytes,
+so a student's whole year is a ~140-byte row and any count over a date range
+is a popcount.
+
+- Bit i is day year_start(year) + i, least significant bit of the first byte first.
+- The scan paths set a check-in's bits in the transaction that inserts it.
+- Justification reviews refresh the day they touch.
+- close_days() runs nightly once the school day is over and rebuilds the last
+  ROLLUP_COMPACTION_DAYS days from raw data, so missed updates (manual SQL,
+  deleted check-ins) are repaired; on an empty table it backfills everything.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.models.models import AttendanceBitmap, CheckIn, Justification, JustificationStatus, JustificationType
+from app.services.school_calendar import SchoolCalendar
+from app.services.attendance_rollup import latest_local_day
+from app.core.config import get_settings
+import logging
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SCHOOL_YEAR_START_MONTH = 9  # September
+YEAR_BYTES = 46  # 366 bits
+FIELDS = ("present", "late", "justified")
+
+# (student id, school year) -> field -> (bits to set, bits to clear)
+Changes = Dict[Tuple[int, int], Dict[str, Tuple[int, int]]]
+
+
+def school_year(day: date) -> int:
+    """The calendar year a day's school year starts in (2024 for 2025-03-10)."""
+    return day.year if day.month >= SCHOOL_YEAR_START_MONTH else day.year - 1
+
+
+def year_start(year: int) -> date:
+    return date(year, SCHOOL_YEAR_START_MONTH, 1)
+
+
+def year_end(year: int) -> date:
+    return year_start(year + 1) - timedelta(days=1)
+
+
+def day_bit(day: date) -> int:
+    return 1 << (day - year_start(school_year(day))).days
+
+
+def range_bits(first_day: date, last_day: date) -> int:
+    """Bits of the days in [first_day, last_day], which must be within one school year."""
+    if last_day < first_day:
+        return 0
+    return day_bit(first_day) * ((1 << ((last_day - first_day).days + 1)) - 1)
+
+
+def _to_bytes(bits: int) -> bytes:
+    return bits.to_bytes(YEAR_BYTES, "little")
+
+
+@dataclass
+class StudentYear:
+    """One student's bitsets for a school year, as Python ints."""
+    school_year: int
+    present: int = 0
+    late: int = 0
+    justified: int = 0
+
+    @classmethod
+    def from_row(cls, row: AttendanceBitmap) -> "StudentYear":
+        return cls(row.school_year, *(int.from_bytes(getattr(row, name), "little") for name in FIELDS))
+
+
+def _add_change(changes: Changes, student_pk: int, day: date, field: str, on: bool):
+    key = (student_pk, school_year(day))
+    set_bits, clear_bits = changes.setdefault(key, {}).get(field, (0, 0))
+    if on:
+        changes[key][field] = (set_bits | day_bit(day), clear_bits)
+    else:
+        changes[key][field] = (set_bits, clear_bits | day_bit(day))
+
+
+def _apply(db: Session, changes: Changes):
+    """Set and clear bits in place, creating missing rows. The caller commits."""
+    if not changes:
+        return
+    rows = {
+        (row.student_id, row.school_year): row
+        for row in db.query(AttendanceBitmap).filter(
+            AttendanceBitmap.student_id.in_({student_pk for student_pk, _ in changes}),
+            AttendanceBitmap.school_year.in_({year for _, year in changes})
+        ).with_for_update()
+    }
+    for (student_pk, year), fields in changes.items():
+        row = rows.get((student_pk, year))
+        if row is None:
+            try:
+                with db.begin_nested():
+                    db.add(AttendanceBitmap(
+                        student_id=student_pk,
+                        school_year=year,
+                        **{name: _to_bytes(fields.get(name, (0, 0))[0]) for name in FIELDS}
+                    ))
+                continue
+            except IntegrityError:
+                # Another request created the row first; change it instead
+                row = db.query(AttendanceBitmap).filter(
+                    AttendanceBitmap.student_id == student_pk,
+                    AttendanceBitmap.school_year == year
+                ).with_for_update().one()
+        for name, (set_bits, clear_bits) in fields.items():
+            old = int.from_bytes(getattr(row, name), "little")
+            new = (old & ~clear_bits) | set_bits
+            if new != old:
+                setattr(row, name, _to_bytes(new))
+
+
+def record_checkins(db: Session, checkins: Iterable[Tuple[int, date, bool]]):
+    """Set the bits of new check-ins, given as (student id, local day, is_late). Call inside the inserting transaction."""
+    changes: Changes = {}
+    for student_pk, day, is_late in checkins:
+        _add_change(changes, student_pk, day, "present", True)
+        _add_change(changes, student_pk, day, "late", bool(is_late))
+    _apply(db, changes)
+
+
+def record_checkin(db: Session, student_pk: int, day: date, is_late: bool):
+    record_checkins(db, [(student_pk, day, is_late)])
+
+
+def rebuild_bitmaps(
+    db: Session,
+    first_day: Optional[date] = None,
+    last_day: Optional[date] = None,
+    student_pk: Optional[int] = None
+) -> int:
+    """Recompute bits from raw data for a day range (everything when no range). The caller commits.
+
+    Returns the number of student-years written.
+    """
+    checkin_query = db.query(CheckIn.student_id, CheckIn.local_date, CheckIn.is_late)
+    justified_query = db.query(Justification.student_id, Justification.date).filter(
+        Justification.status == JustificationStatus.approved,
+        Justification.justification_type == JustificationType.absence
+    )
+    if first_day is not None and last_day is not None:
+        checkin_query = checkin_query.filter(CheckIn.local_date >= first_day, CheckIn.local_date <= last_day)
+        justified_query = justified_query.filter(
+            Justification.date >= datetime.combine(first_day, time.min),
+            Justification.date < datetime.combine(last_day + timedelta(days=1), time.min)
+        )
+    if student_pk is not None:
+        checkin_query = checkin_query.filter(CheckIn.student_id == student_pk)
+        justified_query = justified_query.filter(Justification.student_id == student_pk)
+
+    fresh: Dict[Tuple[int, int], StudentYear] = {}
+
+    def bits_of(row_student: int, day: date) -> StudentYear:
+        year = school_year(day)
+        return fresh.setdefault((row_student, year), StudentYear(year))
+
+    for row_student, day, is_late in checkin_query.yield_per(5000):
+        bits = bits_of(row_student, day)
+        bits.present |= day_bit(day)
+        if is_late:
+            bits.late |= day_bit(day)
+    for row_student, moment in justified_query.yield_per(5000):
+        day = moment.date() if isinstance(moment, datetime) else moment
+        bits_of(row_student, day).justified |= day_bit(day)
+
+    if first_day is None or last_day is None:
+        delete_query = db.query(AttendanceBitmap)
+        if student_pk is not None:
+            delete_query = delete_query.filter(AttendanceBitmap.student_id == student_pk)
+        delete_query.delete(synchronize_session=False)
+        now = datetime.utcnow()
+        db.bulk_insert_mappings(AttendanceBitmap, [
+            {
+                "student_id": row_student, "school_year": year, "updated_at": now,
+                **{name: _to_bytes(getattr(bits, name)) for name in FIELDS}
+            }
+            for (row_student, year), bits in fresh.items()
+        ])
+        return len(fresh)
+
+    # Replace the range's bits in every row of the school years it touches
+    window: Dict[int, int] = {}
+    day = first_day
+    while day <= last_day:
+        year = school_year(day)
+        window[year] = range_bits(day, min(last_day, year_end(year)))
+        day = year_end(year) + timedelta(days=1)
+
+    keys: Set[Tuple[int, int]] = set(fresh)
+    existing_query = db.query(AttendanceBitmap.student_id, AttendanceBitmap.school_year).filter(
+        AttendanceBitmap.school_year.in_(window)
+    )
+    if student_pk is not None:
+        existing_query = existing_query.filter(AttendanceBitmap.student_id == student_pk)
+    keys.update((row_student, year) for row_student, year in existing_query)
+
+    changes: Changes = {}
+    for row_student, year in keys:
+        bits = fresh.get((row_student, year), StudentYear(year))
+        changes[(row_student, year)] = {name: (getattr(bits, name), window[year]) for name in FIELDS}
+    _apply(db, changes)
+    return len(changes)
+
+
+def refresh(db: Session, student_pk: int, days: Iterable):
+    """Rebuild specific days of one student (e.g. after a justification is reviewed). The caller commits."""
+    for day in {day.date() if isinstance(day, datetime) else day for day in days}:
+        rebuild_bitmaps(db, day, day, student_pk=student_pk)
+
+
+def load_year(db: Session, student_pk: int, year: int) -> StudentYear:
+    row = db.query(AttendanceBitmap).filter(
+        AttendanceBitmap.student_id == student_pk,
+        AttendanceBitmap.school_year == year
+    ).first()
+    return StudentYear.from_row(row) if row else StudentYear(year)
+
+
+def summarize(bits: StudentYear, calendar: SchoolCalendar, first_day: date, last_day: date) -> dict:
+    """Counts over [first_day, last_day] (within bits' school year) for a student of the calendar's school."""
+    window = range_bits(first_day, last_day)
+    school_days = calendar.school_days(first_day, last_day)
+    expected = 0
+    for day in school_days:
+        expected |= day_bit(day)
+
+    present = bits.present & window
+    late = bits.late & window
+    absent = expected & ~present & ~bits.justified
+
+    # Runs of consecutive school days with an unexcused absence
+    streak = longest_streak = 0
+    for day in school_days:
+        streak = streak + 1 if absent & day_bit(day) else 0
+        longest_streak = max(longest_streak, streak)
+
+    present_days = present.bit_count()
+    late_days = late.bit_count()
+    return {
+        "expected_days": len(school_days),
+        "present_days": present_days,
+        "late_days": late_days,
+        "justified_days": (bits.justified & window).bit_count(),
+        "absent_days": absent.bit_count(),
+        "attendance_rate": round(present_days / len(school_days) * 100, 2) if school_days else 0,
+        "late_percentage": round(late_days / present_days * 100, 2) if present_days else 0,
+        "longest_absence_streak": longest_streak,
+        "current_absence_streak": streak
+    }
+
+
+def close_days():
+    """Nightly job: rebuild the last ROLLUP_COMPACTION_DAYS days, or everything if the table is empty.
+
+    A plain function, so the scheduler runs it in its thread pool instead of on the event loop.
+    """
+    db = SessionLocal()
+    try:
+        if db.query(AttendanceBitmap.id).first() is None:
+            rows = rebuild_bitmaps(db)
+            logger.info(f"🧮 Attendance bitmaps backfilled: {rows} student-years")
+        else:
+            # Bits are set on school-local days; no school is past the latest one
+            end_day = latest_local_day(db)
+            start_day = end_day - timedelta(days=settings.ROLLUP_COMPACTION_DAYS)
+            rows = rebuild_bitmaps(db, start_day, end_day)
+            logger.info(f"🧮 Attendance bitmaps rebuilt {start_day} → {end_day}: {rows} student-years")
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error rebuilding attendance bitmaps: {e}")
+        db.rollback()
+    finally:
+        db.close()
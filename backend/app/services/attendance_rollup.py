@@ -0,0 +1,436 @@
+"""
+Daily attendance rollup.
+
+Reports used to rescan raw check-ins joined to students on every request.
+daily_attendance_rollup keeps one row per (school, class, day) with the counts
+those reports need, so a year of statistics for a class is ~200 rows.
+
+- Days are school-local (CheckIn.local_date, see app.core.timeutils).
+- The scan path bumps today's row on check-in and check-out.
+- Justification reviews and class changes correct the days they touch.
+- compact_rollup() runs nightly and rebuilds the recent window from raw data,
+  so any drift (manual SQL, a crashed request) is repaired.
+
+Readers use daily_counts(), which takes whole days from the rollup and only
+reads raw check-ins for a partial first or last day of the requested range.
+period_rows() is the same split as a single SELECT, for callers that fold
+everything a report needs into one round trip.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, case, select, union_all, literal, null, cast, or_, Date, Integer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core import timeutils
+from app.models.models import (
+    DailyAttendanceRollup, CheckIn, Student, School, Justification, JustificationStatus, JustificationType
+)
+from app.core.config import get_settings
+import logging
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+COUNTS = ("present", "late", "checked_out", "justified")
+
+
+def _as_date(value) -> date:
+    # func.date() returns a string on SQLite and a date on PostgreSQL
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _bump(db: Session, school_id: int, class_name: str, day: date, **deltas):
+    """Add deltas to one rollup row, creating it if needed. The caller commits."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    key = (
+        DailyAttendanceRollup.school_id == school_id,
+        DailyAttendanceRollup.class_name == class_name,
+        DailyAttendanceRollup.date == day,
+    )
+    values = {
+        getattr(DailyAttendanceRollup, name): getattr(DailyAttendanceRollup, name) + delta
+        for name, delta in deltas.items()
+    }
+    values[DailyAttendanceRollup.updated_at] = datetime.utcnow()
+
+    if db.query(DailyAttendanceRollup).filter(*key).update(values, synchronize_session=False):
+        return
+    if all(delta < 0 for delta in deltas.values()):
+        # Nothing to subtract from; the next compaction rebuilds the day
+        return
+
+    try:
+        with db.begin_nested():
+            db.add(DailyAttendanceRollup(
+                school_id=school_id,
+                class_name=class_name,
+                date=day,
+                **{name: deltas.get(name, 0) for name in COUNTS}
+            ))
+    except IntegrityError:
+        # Another request created the row first; add to it instead
+        db.query(DailyAttendanceRollup).filter(*key).update(values, synchronize_session=False)
+
+
+def local_day(db: Session, school_id: Optional[int], moment: datetime) -> date:
+    """The school-local day of a timestamp, as stored in CheckIn.local_date (None: the default TIMEZONE)."""
+    return timeutils.local_calendar(moment, timeutils.school_zone(db, school_id)).local_date
+
+
+def latest_local_day(db: Session) -> date:
+    """Today in the school timezone furthest ahead, so a day range ending there covers every school."""
+    zones = {timeutils.zone(name) for (name,) in db.query(School.timezone).distinct()} or {timeutils.zone(None)}
+    now = timeutils.utc_now()
+    return max(timeutils.local_calendar(now, tz).local_date for tz in zones)
+
+
+def record_checkin(db: Session, school_id: int, class_name: str, checkin_time: datetime, is_late: bool):
+    """Count a new check-in. Call inside the transaction that inserts it."""
+    _bump(db, school_id, class_name, local_day(db, school_id, checkin_time), present=1, late=1 if is_late else 0)
+
+
+def record_checkout(db: Session, school_id: int, class_name: str, checkin_time: datetime):
+    """Count a check-out against the day of its check-in."""
+    _bump(db, school_id, class_name, local_day(db, school_id, checkin_time), checked_out=1)
+
+
+def record_counts(db: Session, deltas: Dict[Tuple[int, str, date], Dict[str, int]]):
+    """Apply summed deltas per (school, class, day), e.g. for a batch of scans."""
+    for (school_id, class_name, day), counts in deltas.items():
+        _bump(db, school_id, class_name, day, **counts)
+
+
+def _day_bounds(start_day: date, end_day: date) -> Tuple[datetime, datetime]:
+    return datetime.combine(start_day, time.min), datetime.combine(end_day + timedelta(days=1), time.min)
+
+
+def rebuild_rollup(
+    db: Session,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    school_id: Optional[int] = None
+) -> int:
+    """Recompute rollup rows from raw data for a day range (everything when no range). The caller commits."""
+    delete_query = db.query(DailyAttendanceRollup)
+    checkin_query = db.query(
+        Student.school_id,
+        Student.class_name,
+        CheckIn.local_date,
+        func.count(CheckIn.id),
+        func.sum(case((CheckIn.is_late == True, 1), else_=0)),
+        func.sum(case((CheckIn.checkout_time.isnot(None), 1), else_=0))
+    ).join(Student, CheckIn.student_id == Student.id)
+    justified_query = db.query(
+        Student.school_id,
+        Student.class_name,
+        func.date(Justification.date),
+        func.count(Justification.id)
+    ).join(Student, Justification.student_id == Student.id).filter(
+        Justification.status == JustificationStatus.approved,
+        Justification.justification_type == JustificationType.absence
+    )
+
+    if start_day is not None and end_day is not None:
+        lower, upper = _day_bounds(start_day, end_day)
+        delete_query = delete_query.filter(
+            DailyAttendanceRollup.date >= start_day, DailyAttendanceRollup.date <= end_day
+        )
+        checkin_query = checkin_query.filter(CheckIn.local_date >= start_day, CheckIn.local_date <= end_day)
+        justified_query = justified_query.filter(Justification.date >= lower, Justification.date < upper)
+
+    if school_id is not None:
+        delete_query = delete_query.filter(DailyAttendanceRollup.school_id == school_id)
+        checkin_query = checkin_query.filter(Student.school_id == school_id)
+        justified_query = justified_query.filter(Student.school_id == school_id)
+
+    rows: Dict[tuple, dict] = {}
+    for row_school, row_class, row_day, present, late, checked_out in checkin_query.group_by(
+        Student.school_id, Student.class_name, CheckIn.local_date
+    ):
+        rows[(row_school, row_class, _as_date(row_day))] = {
+            "present": present, "late": int(late or 0), "checked_out": int(checked_out or 0), "justified": 0
+        }
+    for row_school, row_class, row_day, justified in justified_query.group_by(
+        Student.school_id, Student.class_name, func.date(Justification.date)
+    ):
+        counts = rows.setdefault(
+            (row_school, row_class, _as_date(row_day)),
+            {"present": 0, "late": 0, "checked_out": 0, "justified": 0}
+        )
+        counts["justified"] = justified
+
+    delete_query.delete(synchronize_session=False)
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(DailyAttendanceRollup, [
+        {"school_id": key[0], "class_name": key[1], "date": key[2], "updated_at": now, **counts}
+        for key, counts in rows.items()
+    ])
+    return len(rows)
+
+
+def move_student(db: Session, student_pk: int, school_id: int, old_class: str, new_class: str):
+    """Move a student's historical counts from one class to another. The caller commits."""
+    if old_class == new_class:
+        return
+
+    per_day: Dict[date, dict] = {}
+    for row_day, present, late, checked_out in db.query(
+        CheckIn.local_date,
+        func.count(CheckIn.id),
+        func.sum(case((CheckIn.is_late == True, 1), else_=0)),
+        func.sum(case((CheckIn.checkout_time.isnot(None), 1), else_=0))
+    ).filter(CheckIn.student_id == student_pk).group_by(CheckIn.local_date):
+        per_day[_as_date(row_day)] = {
+            "present": present, "late": int(late or 0), "checked_out": int(checked_out or 0)
+        }
+    for row_day, justified in db.query(
+        func.date(Justification.date), func.count(Justification.id)
+    ).filter(
+        Justification.student_id == student_pk,
+        Justification.status == JustificationStatus.approved,
+        Justification.justification_type == JustificationType.absence
+    ).group_by(func.date(Justification.date)):
+        per_day.setdefault(_as_date(row_day), {})["justified"] = justified
+
+    for day, counts in per_day.items():
+        _bump(db, school_id, old_class, day, **{name: -count for name, count in counts.items()})
+        _bump(db, school_id, new_class, day, **counts)
+
+
+def refresh_days(db: Session, school_id: int, days: Iterable):
+    """Rebuild specific days for one school (e.g. after a justification is reviewed). The caller commits."""
+    for day in {_as_date(day) for day in days}:
+        rebuild_rollup(db, day, day, school_id=school_id)
+
+
+def _raw_daily(db: Session, first_day: date, last_day: date, lower: datetime, upper: datetime,
+               upper_inclusive: bool, school_id: Optional[int], class_name: Optional[str]) -> List[tuple]:
+    """Raw counts per local day for check-ins of local days [first_day, last_day] timed within lower/upper."""
+    query = db.query(
+        CheckIn.local_date,
+        func.count(CheckIn.id),
+        func.sum(case((CheckIn.is_late == True, 1), else_=0)),
+        func.sum(case((CheckIn.checkout_time.isnot(None), 1), else_=0))
+    ).join(Student, CheckIn.student_id == Student.id).filter(
+        CheckIn.local_date >= first_day,
+        CheckIn.local_date <= last_day,
+        CheckIn.checkin_time >= lower,
+        CheckIn.checkin_time <= upper if upper_inclusive else CheckIn.checkin_time < upper
+    )
+    if school_id:
+        query = query.filter(Student.school_id == school_id)
+    if class_name:
+        query = query.filter(Student.class_name == class_name)
+    return [
+        (_as_date(day), present, int(late or 0), int(checked_out or 0))
+        for day, present, late, checked_out in query.group_by(CheckIn.local_date)
+    ]
+
+
+def _full_days(start: datetime, end: datetime) -> Tuple[date, date]:
+    """First and last day wholly inside [start, end] (first > last when there is none)."""
+    first_full = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last_full = end.date() if end.time() >= time(23, 59, 59) else end.date() - timedelta(days=1)
+    return first_full, last_full
+
+
+def period_rows(
+    start: datetime,
+    end: datetime,
+    school_id: Optional[int] = None,
+    class_name: Optional[str] = None
+):
+    """Subquery of (day, present, late, checked_out, justified, students) rows to SUM per day.
+
+    Rollup rows count for whole days only (and for justified, on every day of
+    the range, like justified_count()); raw check-ins cover a partial first or
+    last day. One extra row with a NULL day carries the number of active
+    students in the scope, so an empty period still returns it.
+    """
+    first_full, last_full = _full_days(start, end)
+    whole_day = DailyAttendanceRollup.date.between(first_full, last_full)
+    rollup = select(
+        DailyAttendanceRollup.date.label("day"),
+        case((whole_day, DailyAttendanceRollup.present), else_=0).label("present"),
+        case((whole_day, DailyAttendanceRollup.late), else_=0).label("late"),
+        case((whole_day, DailyAttendanceRollup.checked_out), else_=0).label("checked_out"),
+        DailyAttendanceRollup.justified.label("justified"),
+        literal(0).label("students")
+    ).where(DailyAttendanceRollup.date >= start.date(), DailyAttendanceRollup.date <= end.date())
+    students = select(
+        cast(null(), Date).label("day"),
+        literal(0), literal(0), literal(0), literal(0),
+        cast(func.count(Student.id), Integer)
+    ).where(Student.is_active == True)
+    if school_id:
+        rollup = rollup.where(DailyAttendanceRollup.school_id == school_id)
+        students = students.where(Student.school_id == school_id)
+    if class_name:
+        rollup = rollup.where(DailyAttendanceRollup.class_name == class_name)
+        students = students.where(Student.class_name == class_name)
+    branches = [rollup, students]
+
+    # Partial days are matched on local_date like the rollup rows, so a check-in
+    # is never counted both here and in a whole day's rollup row
+    if first_full > last_full:
+        partial = [CheckIn.local_date.between(start.date(), end.date()) & CheckIn.checkin_time.between(start, end)]
+    else:
+        partial = []
+        if start.date() < first_full:
+            partial.append(
+                (CheckIn.local_date == start.date()) & (CheckIn.checkin_time >= start)
+                & (CheckIn.checkin_time < datetime.combine(first_full, time.min))
+            )
+        if end.date() > last_full:
+            partial.append(
+                (CheckIn.local_date == end.date())
+                & (CheckIn.checkin_time >= datetime.combine(end.date(), time.min)) & (CheckIn.checkin_time <= end)
+            )
+    if partial:
+        raw = select(
+            CheckIn.local_date,
+            literal(1),
+            case((CheckIn.is_late == True, 1), else_=0),
+            case((CheckIn.checkout_time.isnot(None), 1), else_=0),
+            literal(0),
+            literal(0)
+        ).join(Student, CheckIn.student_id == Student.id).where(or_(*partial))
+        if school_id:
+            raw = raw.where(Student.school_id == school_id)
+        if class_name:
+            raw = raw.where(Student.class_name == class_name)
+        branches.append(raw)
+
+    return union_all(*branches).subquery()
+
+
+def daily_counts(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    school_id: Optional[int] = None,
+    class_name: Optional[str] = None
+) -> Dict[date, dict]:
+    """Check-in counts per day for check-ins in [start, end], for a school/class scope.
+
+    Whole days come from the rollup; a partial first or last day is read from
+    raw check-ins so totals match a direct query exactly.
+    """
+    first_full, last_full = _full_days(start, end)
+
+    result: Dict[date, dict] = {}
+
+    def add(day, present, late, checked_out):
+        counts = result.setdefault(day, {"present": 0, "late": 0, "checked_out": 0})
+        counts["present"] += present
+        counts["late"] += late
+        counts["checked_out"] += checked_out
+
+    if first_full > last_full:
+        for row in _raw_daily(db, start.date(), end.date(), start, end, True, school_id, class_name):
+            add(*row)
+        return result
+
+    if start.date() < first_full:
+        for row in _raw_daily(
+            db, start.date(), start.date(), start, datetime.combine(first_full, time.min), False, school_id, class_name
+        ):
+            add(*row)
+    if end.date() > last_full:
+        for row in _raw_daily(
+            db, end.date(), end.date(), datetime.combine(end.date(), time.min), end, True, school_id, class_name
+        ):
+            add(*row)
+
+    query = db.query(
+        DailyAttendanceRollup.date,
+        func.sum(DailyAttendanceRollup.present),
+        func.sum(DailyAttendanceRollup.late),
+        func.sum(DailyAttendanceRollup.checked_out)
+    ).filter(
+        DailyAttendanceRollup.date >= first_full,
+        DailyAttendanceRollup.date <= last_full,
+        DailyAttendanceRollup.present > 0
+    )
+    if school_id:
+        query = query.filter(DailyAttendanceRollup.school_id == school_id)
+    if class_name:
+        query = query.filter(DailyAttendanceRollup.class_name == class_name)
+    for day, present, late, checked_out in query.group_by(DailyAttendanceRollup.date):
+        add(_as_date(day), int(present), int(late), int(checked_out))
+
+    return dict(sorted(result.items()))
+
+
+def justified_count(
+    db: Session,
+    start_day: date,
+    end_day: date,
+    school_id: Optional[int] = None,
+    class_name: Optional[str] = None
+) -> int:
+    """Approved absence justifications dated within [start_day, end_day]."""
+    query = db.query(func.sum(DailyAttendanceRollup.justified)).filter(
+        DailyAttendanceRollup.date >= start_day,
+        DailyAttendanceRollup.date <= end_day
+    )
+    if school_id:
+        query = query.filter(DailyAttendanceRollup.school_id == school_id)
+    if class_name:
+        query = query.filter(DailyAttendanceRollup.class_name == class_name)
+    return int(query.scalar() or 0)
+
+
+def fingerprint(
+    db: Session,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    school_id: Optional[int] = None,
+    class_name: Optional[str] = None
+) -> Tuple:
+    """(rows, count sums, latest update) of the rollup over a day range; changes whenever any of its days do."""
+    query = db.query(
+        func.count(DailyAttendanceRollup.id),
+        *(func.sum(getattr(DailyAttendanceRollup, name)) for name in COUNTS),
+        func.max(DailyAttendanceRollup.updated_at)
+    )
+    if start_day is not None:
+        query = query.filter(DailyAttendanceRollup.date >= start_day)
+    if end_day is not None:
+        query = query.filter(DailyAttendanceRollup.date <= end_day)
+    if school_id:
+        query = query.filter(DailyAttendanceRollup.school_id == school_id)
+    if class_name:
+        query = query.filter(DailyAttendanceRollup.class_name == class_name)
+    return tuple(query.one())
+
+
+def compact_rollup():
+    """Nightly job: rebuild the last ROLLUP_COMPACTION_DAYS days, or everything if the table is empty.
+
+    A plain function, so the scheduler runs it in its thread pool instead of on the event loop.
+    """
+    db = SessionLocal()
+    try:
+        if db.query(DailyAttendanceRollup.id).first() is None:
+            rows = rebuild_rollup(db)
+            logger.info(f"📊 Attendance rollup backfilled: {rows} rows")
+        else:
+            end_day = latest_local_day(db)
+            start_day = end_day - timedelta(days=settings.ROLLUP_COMPACTION_DAYS)
+            rows = rebuild_rollup(db, start_day, end_day)
+            logger.info(f"📊 Attendance rollup compacted {start_day} → {end_day}: {rows} rows")
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error compacting attendance rollup: {e}")
+        db.rollback()
+    finally:
+        db.close()
@@ -0,0 +1,378 @@
+"""
+Process-resident attendance state for the current day.
+
+The dashboard, the scan path and the 9:10 absence job all need the same fact:
+who in each school is here today. Instead of loading every active student and
+every check-in and diffing them per request, one compact roster per school is
+kept in memory:
+
+- RosterEntry (__slots__) per student with today's check-in, late, checked-out
+  and email flags; attribute names match Student so entries can stand in for
+  ORM rows in existing code.
+- ClassCounts per class with active/present/late totals, so counts for a
+  school or class are sums over a handful of classes.
+
+The state is rebuilt from the database at startup, after midnight (the first
+reader on a new day also triggers it) and for a single school when its roster
+changes. The scan path records check-ins and check-outs after committing them.
+Scans recorded while a rebuild is reading the database are replayed onto the
+rebuilt state, so none are lost, and so are scans still waiting in the scan
+journal (services.scan_journal) when it is enabled.
+
+Days are school-local (CheckIn.local_date). The state holds one day at a
+time, so it assumes its schools share a calendar day, as they do with the
+single TIMEZONE of our deploy; a reader asking for another day rebuilds it.
+
+Like the other caches this is per process, matching our single-worker deploy.
+"""
+import threading
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core import timeutils
+from app.models.models import Student, CheckIn, School
+from app.services.scan_cache import CachedStudent
+from app.services.attendance_rollup import local_day
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RosterEntry:
+    """One student's attendance today."""
+    __slots__ = (
+        "id", "student_id", "name", "class_name", "parent_email", "is_active",
+        "checkin_id", "checkin_time", "checkout_time", "is_late", "email_sent"
+    )
+
+    def __init__(self, id: int, student_id: str, name: str, class_name: str,
+                 parent_email: str, is_active: bool = True):
+        self.id = id
+        self.student_id = student_id
+        self.name = name
+        self.class_name = class_name
+        self.parent_email = parent_email
+        self.is_active = is_active
+        self.checkin_id: Optional[int] = None
+        self.checkin_time: Optional[datetime] = None
+        self.checkout_time: Optional[datetime] = None
+        self.is_late = False
+        self.email_sent = False
+
+    @property
+    def present(self) -> bool:
+        # checkin_id stays None for a check-in still waiting in the scan journal
+        return self.checkin_time is not None
+
+
+class ClassCounts:
+    __slots__ = ("active", "present", "late")
+
+    def __init__(self):
+        self.active = 0
+        self.present = 0
+        self.late = 0
+
+
+class SchoolAttendance:
+    """Roster and counters for one school (id None holds students without a school)."""
+
+    def __init__(self, id: Optional[int], name: Optional[str], contact_email: Optional[str]):
+        self.id = id
+        self.name = name
+        self.contact_email = contact_email
+        self.students: Dict[int, RosterEntry] = {}
+        self.codes: Dict[str, int] = {}  # QR code -> student id
+        self.classes: Dict[str, ClassCounts] = {}
+
+    def _count(self, entry: RosterEntry, sign: int):
+        counts = self.classes.setdefault(entry.class_name, ClassCounts())
+        if entry.is_active:
+            counts.active += sign
+        if entry.present:
+            counts.present += sign
+            if entry.is_late:
+                counts.late += sign
+
+    def add(self, entry: RosterEntry):
+        self.students[entry.id] = entry
+        self.codes[entry.student_id] = entry.id
+        self._count(entry, 1)
+
+    def checkin(self, entry: RosterEntry, checkin_id: Optional[int], checkin_time: datetime, is_late: bool,
+                checkout_time: Optional[datetime] = None, email_sent: bool = False):
+        # Keep the first check-in of the day if one is already recorded; a
+        # journaled check-in gets its id once it reaches the database
+        if entry.present:
+            if entry.checkin_id is None:
+                entry.checkin_id = checkin_id
+            return
+        self._count(entry, -1)
+        entry.checkin_id = checkin_id
+        entry.checkin_time = checkin_time
+        entry.checkout_time = checkout_time
+        entry.is_late = is_late
+        entry.email_sent = email_sent
+        self._count(entry, 1)
+
+    def counts(self, class_name: Optional[str] = None) -> Tuple[int, int, int]:
+        """(active, present, late) for the school or one class."""
+        if class_name:
+            counts = self.classes.get(class_name)
+            return (counts.active, counts.present, counts.late) if counts else (0, 0, 0)
+        return (
+            sum(counts.active for counts in self.classes.values()),
+            sum(counts.present for counts in self.classes.values()),
+            sum(counts.late for counts in self.classes.values()),
+        )
+
+
+def _load_schools(db: Session, day: date, school_ids: Optional[Iterable[Optional[int]]]) -> Dict[Optional[int], SchoolAttendance]:
+    """Build SchoolAttendance objects from the database (all schools when school_ids is None)."""
+    school_ids = None if school_ids is None else set(school_ids)
+
+    def scoped(query, column):
+        if school_ids is None:
+            return query
+        known = [school_id for school_id in school_ids if school_id is not None]
+        condition = column.in_(known) if known else None
+        if None in school_ids:
+            condition = column.is_(None) if condition is None else (condition | column.is_(None))
+        return query.filter(condition)
+
+    schools: Dict[Optional[int], SchoolAttendance] = {}
+    if school_ids is not None:
+        for school_id in school_ids:
+            schools[school_id] = SchoolAttendance(school_id, None, None)
+    for school_id, name, contact_email in scoped(
+        db.query(School.id, School.name, School.contact_email), School.id
+    ):
+        schools[school_id] = SchoolAttendance(school_id, name, contact_email)
+
+    def school_for(school_id):
+        if school_id not in schools:
+            schools[school_id] = SchoolAttendance(school_id, None, None)
+        return schools[school_id]
+
+    for row in scoped(db.query(
+        Student.id, Student.student_id, Student.name, Student.class_name, Student.parent_email, Student.school_id
+    ).filter(Student.is_active == True), Student.school_id).order_by(Student.id):
+        school_for(row.school_id).add(
+            RosterEntry(row.id, row.student_id, row.name, row.class_name, row.parent_email)
+        )
+
+    checkins = scoped(db.query(
+        CheckIn.id, CheckIn.student_id, CheckIn.checkin_time, CheckIn.checkout_time, CheckIn.is_late,
+        CheckIn.email_sent, Student.student_id.label("code"), Student.name, Student.class_name,
+        Student.parent_email, Student.school_id
+    ).join(Student, CheckIn.student_id == Student.id).filter(
+        CheckIn.local_date == day
+    ), Student.school_id).order_by(CheckIn.id)
+    for row in checkins:
+        school = school_for(row.school_id)
+        entry = school.students.get(row.student_id)
+        if entry is None:
+            # Checked in today but no longer active: shown as present, never as absent
+            entry = RosterEntry(row.student_id, row.code, row.name, row.class_name, row.parent_email, is_active=False)
+            school.add(entry)
+        school.checkin(entry, row.id, row.checkin_time, row.is_late, row.checkout_time, row.email_sent)
+
+    return schools
+
+
+class AttendanceState:
+    def __init__(self):
+        self._day: Optional[date] = None
+        self._schools: Dict[Optional[int], SchoolAttendance] = {}
+        self._dirty: set = set()
+        self._lock = threading.RLock()
+        # Scans recorded while a rebuild reads the database, replayed onto its result
+        self._rebuilds = 0
+        self._replay: List[Tuple[str, tuple]] = []
+        # Scans not yet in the database (the scan journal), re-applied after every reload
+        self._pending_source: Optional[Callable[[Session], Iterable[Tuple[str, tuple]]]] = None
+
+    # -- maintenance --------------------------------------------------------
+
+    def rebuild(self, db: Session, day: date, school_ids: Optional[Iterable[Optional[int]]] = None):
+        """Reload every school (or just `school_ids`) for `day` from the database."""
+        school_ids = None if school_ids is None else list(school_ids)
+        with self._lock:
+            self._rebuilds += 1
+        try:
+            loaded = _load_schools(db, day, school_ids)
+        except Exception:
+            with self._lock:
+                self._finish_rebuild()
+            raise
+
+        with self._lock:
+            if school_ids is None or self._day != day:
+                if school_ids is not None:
+                    # A partial reload cannot stand in for a new day
+                    self._finish_rebuild()
+                    return
+                self._schools = loaded
+                self._dirty.clear()
+                self._day = day
+            else:
+                self._schools.update(loaded)
+                self._dirty.difference_update(school_ids)
+            operations = list(self._replay)
+            if self._pending_source is not None:
+                operations.extend(self._pending_source(db))
+            for operation, args in operations:
+                getattr(self, operation)(*args, replaying=True)
+            self._finish_rebuild()
+
+    def _finish_rebuild(self):
+        self._rebuilds -= 1
+        if self._rebuilds == 0:
+            self._replay = []
+
+    def ensure(self, db: Session, day: date):
+        """Make the state current for `day`: a full rebuild on a new day, else reload dirty schools."""
+        with self._lock:
+            stale_day = self._day != day
+            dirty = list(self._dirty)
+        if stale_day:
+            self.rebuild(db, day)
+        elif dirty:
+            self.rebuild(db, day, dirty)
+
+    def set_pending_source(self, source: Optional[Callable[[Session], Iterable[Tuple[str, tuple]]]]):
+        """Register a callable(db) returning (operation, args) for scans committed elsewhere first."""
+        with self._lock:
+            self._pending_source = source
+
+    def invalidate_school(self, school_id: Optional[int]):
+        """The roster of a school changed; it is reloaded on next use."""
+        with self._lock:
+            self._dirty.add(school_id)
+
+    def clear(self):
+        with self._lock:
+            self._day = None
+            self._schools = {}
+            self._dirty.clear()
+
+    # -- scan path ----------------------------------------------------------
+
+    def get(self, db: Session, day: date, school_id: Optional[int], student_pk: int) -> Optional[RosterEntry]:
+        """Today's entry for a student if they have checked in, else None."""
+        self.ensure(db, day)
+        with self._lock:
+            school = self._schools.get(school_id)
+            entry = school.students.get(student_pk) if school else None
+            return entry if entry is not None and entry.present else None
+
+    def find_student(self, db: Session, day: date, code: str) -> Optional[CachedStudent]:
+        """Active student with this QR code, from the roster in memory."""
+        self.ensure(db, day)
+        with self._lock:
+            for school_id, school in self._schools.items():
+                student_pk = school.codes.get(code)
+                entry = school.students.get(student_pk) if student_pk is not None else None
+                if entry is not None and entry.is_active:
+                    return CachedStudent(
+                        entry.id, entry.student_id, entry.name, entry.class_name, entry.parent_email, school_id
+                    )
+            return None
+
+    def _remember(self, operation: str, args: tuple, replaying: bool):
+        if self._rebuilds and not replaying:
+            self._replay.append((operation, args))
+
+    def record_checkin(self, day: date, student, checkin_id: Optional[int], checkin_time: datetime, is_late: bool,
+                       replaying: bool = False):
+        """A committed check-in. `student` is any object with Student's attributes (e.g. CachedStudent)."""
+        with self._lock:
+            self._remember("record_checkin", (day, student, checkin_id, checkin_time, is_late), replaying)
+            if self._day != day:
+                return
+            school = self._schools.get(student.school_id)
+            if school is None:
+                school = self._schools[student.school_id] = SchoolAttendance(student.school_id, None, None)
+                self._dirty.add(student.school_id)
+            entry = school.students.get(student.id)
+            if entry is None:
+                entry = RosterEntry(student.id, student.student_id, student.name, student.class_name, student.parent_email)
+                school.add(entry)
+            school.checkin(entry, checkin_id, checkin_time, is_late)
+
+    def record_checkout(self, day: date, school_id: Optional[int], student_pk: int, checkout_time: datetime,
+                        replaying: bool = False):
+        with self._lock:
+            self._remember("record_checkout", (day, school_id, student_pk, checkout_time), replaying)
+            school = self._schools.get(school_id) if self._day == day else None
+            entry = school.students.get(student_pk) if school else None
+            if entry is not None and entry.present:
+                entry.checkout_time = checkout_time
+
+    def mark_email_sent(self, school_id: Optional[int], student_pk: int, replaying: bool = False):
+        with self._lock:
+            self._remember("mark_email_sent", (school_id, student_pk), replaying)
+            school = self._schools.get(school_id)
+            entry = school.students.get(student_pk) if school else None
+            if entry is not None and entry.present:
+                entry.email_sent = True
+
+    # -- readers ------------------------------------------------------------
+
+    def view(self, db: Session, day: date, school_id: Optional[int] = None,
+             class_name: Optional[str] = None) -> Tuple[Tuple[int, int, int], List[Tuple[SchoolAttendance, RosterEntry]]]:
+        """(active, present, late) counts and the (school, entry) pairs for a scope.
+
+        school_id None covers every school. Entries are shared with the state;
+        callers read them and must not modify them.
+        """
+        self.ensure(db, day)
+        with self._lock:
+            if school_id is None:
+                schools = list(self._schools.values())
+            else:
+                schools = [self._schools[school_id]] if school_id in self._schools else []
+
+            active = present = late = 0
+            entries = []
+            for school in schools:
+                school_active, school_present, school_late = school.counts(class_name)
+                active += school_active
+                present += school_present
+                late += school_late
+                entries.extend(
+                    (school, entry) for entry in school.students.values()
+                    if not class_name or entry.class_name == class_name
+                )
+            return (active, present, late), entries
+
+    def absent_by_school(self, db: Session, day: date) -> Dict[Optional[int], Tuple[SchoolAttendance, List[RosterEntry]]]:
+        """Active students without a check-in, grouped by school (schools with none are left out)."""
+        self.ensure(db, day)
+        with self._lock:
+            result = {}
+            for school_id, school in self._schools.items():
+                absent = [
+                    entry for entry in sorted(school.students.values(), key=lambda entry: entry.id)
+                    if entry.is_active and not entry.present
+                ]
+                if absent:
+                    result[school_id] = (school, absent)
+            return result
+
+
+attendance_state = AttendanceState()
+
+
+def rebuild_attendance_state():
+    """Startup / just-after-midnight job: load today's attendance state (runs in the scheduler's thread pool)."""
+    db = SessionLocal()
+    try:
+        today = local_day(db, None, timeutils.utc_now())
+        attendance_state.rebuild(db, today)
+        logger.info(f"🧮 Attendance state loaded for {today}")
+    except Exception as e:
+        logger.error(f"Error loading attendance state: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,97 @@
+"""
+Check-in writes that stay correct when scans race each other.
+
+checkins has a unique index on (student_id, local_date), so the database
+allows one check-in per student per school-local day, the day reports count
+(see app.core.timeutils). insert_checkin() is a single
+INSERT ... ON CONFLICT DO NOTHING RETURNING id: of two scanners (or a double
+tap) racing on the same student, exactly one gets an id back and the other
+learns it lost without an extra read. close_checkin() only sets checkout_time
+on a row that has none, so two check-out scans cannot both count.
+"""
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core import timeutils
+from app.models.models import CheckIn
+
+
+class CheckInConflict(Exception):
+    """A concurrent scan changed a check-in this transaction was about to change."""
+
+
+def _insert_construct(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def insert_checkin(db: Session, student_pk: int, checkin_time: datetime, is_late: bool) -> Optional[int]:
+    """Insert today's check-in for a student. Returns its id, or None if the day already has one.
+
+    The caller owns the transaction and must commit.
+    """
+    calendar = timeutils.local_calendar(checkin_time, timeutils.student_zone(db, student_pk))
+    values = {
+        "student_id": student_pk,
+        "checkin_time": checkin_time,
+        "local_date": calendar.local_date,
+        "iso_week": calendar.iso_week,
+        "weekday": calendar.weekday,
+        "is_late": is_late,
+    }
+    insert = _insert_construct(db)
+    if insert is not None:
+        statement = insert(CheckIn).values(**values).on_conflict_do_nothing(
+            index_elements=["student_id", "local_date"]
+        ).returning(CheckIn.id)
+        return db.execute(statement).scalar()
+
+    # Other databases: let the unique index reject the duplicate
+    checkin = CheckIn(**values)
+    try:
+        with db.begin_nested():
+            db.add(checkin)
+    except IntegrityError:
+        return None
+    return checkin.id
+
+
+def close_checkin(db: Session, checkin_pk: int, checkout_time: datetime) -> bool:
+    """Set checkout_time if the check-in has none yet. Returns False if it was already closed."""
+    result = db.execute(
+        update(CheckIn)
+        .where(CheckIn.id == checkin_pk, CheckIn.checkout_time.is_(None))
+        .values(checkout_time=checkout_time)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def close_checkins(db: Session, checkouts: List[Tuple[int, datetime]]):
+    """close_checkin() for many rows in one statement; raises CheckInConflict if any was already closed."""
+    if not checkouts:
+        return
+    statement = update(CheckIn.__table__).where(
+        CheckIn.__table__.c.id == bindparam("checkin_pk"),
+        CheckIn.__table__.c.checkout_time.is_(None)
+    ).values(checkout_time=bindparam("closed_at"))
+    result = db.execute(statement, [
+        {"checkin_pk": checkin_pk, "closed_at": checkout_time} for checkin_pk, checkout_time in checkouts
+    ])
+    if db.get_bind().dialect.supports_sane_multi_rowcount and result.rowcount != len(checkouts):
+        raise CheckInConflict("A check-out in this batch was recorded concurrently")
+
+
+def find_checkin(db: Session, student_pk: int, day: date):
+    """The student's check-in row (id, checkin_time, checkout_time, is_late) for a school-local day, if any."""
+    return db.query(
+        CheckIn.id, CheckIn.checkin_time, CheckIn.checkout_time, CheckIn.is_late
+    ).filter(CheckIn.student_id == student_pk, CheckIn.local_date == day).first()
@@ -0,0 +1,158 @@
+"""
+Versioned response cache for GET /api/checkin/dashboard.
+
+Every viewer of a school's dashboard used to rebuild the same DashboardData.
+Responses are now cached as serialized JSON, keyed by (school scope, class,
+date), and validated against two per-school counters kept here:
+
+- version: bumped by anything that changes a dashboard (scans, check-in email
+  status, roster and school edits).
+- roster:  bumped only by roster and school edits.
+
+Today's (and future) entries are valid while `version` is unchanged; past dates
+can only change through the roster, so they stay cached until `roster` moves.
+The ETag is derived from the same counters, so a poll carrying a matching
+If-None-Match is answered with 304 before any database work.
+
+Counters live in memory, so the ETag also carries a per-process id: entries and
+client ETags from a previous process never match after a restart.
+
+Each version bump also appends to a bounded per-scope change log, which
+GET /api/checkin/dashboard/changes replays for clients that send the version
+they last saw. Versions start from the process start time in milliseconds, so
+they keep increasing across restarts; a client that is too far behind, crosses
+a roster change or a day boundary gets a full snapshot instead.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from datetime import date
+from typing import Deque, Dict, List, Optional, Tuple
+from app.core.config import get_settings
+from app.core import timeutils
+
+settings = get_settings()
+
+BOOT_ID = uuid.uuid4().hex[:8]
+
+DashboardKey = Tuple[Optional[int], Optional[str], date]
+# (version, day, class_name, change); change None means "refetch the snapshot"
+ChangeEntry = Tuple[int, date, Optional[str], Optional[dict]]
+
+
+class DashboardVersions:
+    """Per-school change counters and change logs; the None key covers every school."""
+
+    def __init__(self, log_size: int):
+        self._base = int(time.time() * 1000)
+        self._version: Dict[Optional[int], int] = defaultdict(lambda: self._base)
+        self._roster: Dict[Optional[int], int] = defaultdict(int)
+        self._log: Dict[Optional[int], Deque[ChangeEntry]] = defaultdict(lambda: deque(maxlen=log_size))
+        self._lock = threading.Lock()
+
+    def bump(
+        self,
+        school_id: Optional[int],
+        roster: bool = False,
+        class_name: Optional[str] = None,
+        change: Optional[dict] = None
+    ) -> int:
+        """Record a change in one school (None: unknown school, bumps everything). Returns the new version.
+
+        Without a `change` payload the change cannot be replayed, so clients
+        behind it are sent a full snapshot.
+        """
+        # Logged under the default TIMEZONE's day, the day scans and readers use
+        today = timeutils.local_calendar(timeutils.utc_now(), timeutils.zone(None)).local_date
+        with self._lock:
+            if school_id is None:
+                scopes = set(self._version) | set(self._roster) | {None}
+            else:
+                scopes = {school_id, None}
+            for scope in scopes:
+                self._version[scope] += 1
+                if roster:
+                    self._roster[scope] += 1
+                self._log[scope].append((self._version[scope], today, class_name, change))
+            return self._version[school_id]
+
+    def current(self, school_id: Optional[int]) -> Tuple[int, int]:
+        # Reading registers the scope, so a bump for every school reaches it
+        with self._lock:
+            return self._version[school_id], self._roster[school_id]
+
+    def changes_since(self, school_id: Optional[int], since: int, day: date) -> Tuple[int, Optional[List[ChangeEntry]]]:
+        """Current version and the logged changes after `since`, or None if they cannot be replayed."""
+        with self._lock:
+            current = self._version[school_id]
+            if since == current:
+                return current, []
+            if since > current:
+                return current, None
+            log = self._log.get(school_id)
+            # The entry right after `since` must still be in the log
+            if not log or log[0][0] > since + 1:
+                return current, None
+            entries = [entry for entry in log if entry[0] > since]
+        if any(change is None or entry_day != day for _, entry_day, _, change in entries):
+            return current, None
+        return current, entries
+
+
+class DashboardCache:
+    """(school scope, class, date) -> (tag, JSON body), bounded LRU."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[DashboardKey, Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: DashboardKey, tag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != tag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: DashboardKey, tag: str, body: bytes):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (tag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+dashboard_versions = DashboardVersions(settings.DASHBOARD_CHANGE_LOG_SIZE)
+dashboard_cache = DashboardCache(settings.DASHBOARD_CACHE_MAX_ENTRIES)
+
+
+def validity_tag(school_id: Optional[int], target_date: date, today: date, absent_email_sent: bool) -> str:
+    """The counter values a cached dashboard for this scope and date must match."""
+    version, roster = dashboard_versions.current(school_id)
+    if target_date < today:
+        return f"r{roster}"
+    return f"v{version}.r{roster}.{'m' if absent_email_sent else 'p'}"
+
+
+def etag_for(key: DashboardKey, tag: str) -> str:
+    digest = hashlib.sha1(repr((BOOT_ID, key, tag)).encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def mark_changed(school_id: Optional[int], class_name: Optional[str] = None, change: Optional[dict] = None):
+    """A scan or check-in email status changed today's dashboard for this school."""
+    dashboard_versions.bump(school_id, class_name=class_name, change=change)
+
+
+def mark_roster_changed(school_id: Optional[int] = None):
+    """Students or school details changed; invalidates past dates too (None: every school)."""
+    dashboard_versions.bump(school_id, roster=True)
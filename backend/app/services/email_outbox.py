@@ -0,0 +1,277 @@
+"""
+Durable email outbox.
+
+Request handlers call enqueue_email() inside their own transaction so the
+message is committed together with the change that triggered it, and return
+immediately. dispatch_outbox() runs on the scheduler, delivers due messages
+with retries and exponential backoff, and marks CheckIn.email_sent once the
+parent notification for a check-in has actually been delivered.
+
+Messages are sent concurrently (OUTBOX_CONCURRENCY at a time) and paced per
+recipient domain (OUTBOX_DOMAIN_RATE_PER_SECOND) so a large fan-out such as
+the 9:10 absence run neither trickles out one by one nor trips provider
+throttling. A claimed batch is leased by pushing next_attempt_at forward
+before any mail goes out, so overlapping dispatchers never pick up the same
+row and a crash mid-batch only delays the unsent messages until the lease
+expires. Messages with a dedup_key are enqueued at most once.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.models.models import EmailOutbox, OutboxStatus, CheckIn, Student
+from app.services.email_service import send_email
+from app.services.dashboard_cache import mark_changed
+from app.services.attendance_state import attendance_state
+from app.core.config import get_settings
+import logging
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Delay before retry N is RETRY_BASE_SECONDS * 2**(N-1), capped at RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 30 * 60
+
+
+# How long a claimed message is reserved for the dispatcher that claimed it
+CLAIM_LEASE_SECONDS = 5 * 60
+
+
+def enqueue_email(
+    db: Session,
+    to_email: str,
+    subject: str,
+    body: str,
+    checkin_id: Optional[int] = None,
+    dedup_key: Optional[str] = None
+) -> Optional[EmailOutbox]:
+    """Add a message to the outbox. The caller owns the transaction and must commit."""
+    if not to_email:
+        return None
+
+    message = EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        checkin_id=checkin_id,
+        dedup_key=dedup_key,
+        status=OutboxStatus.pending,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(message)
+    return message
+
+
+def enqueue_unique_emails(db: Session, messages: Iterable[Tuple[str, str, str, str]]) -> Tuple[int, int]:
+    """Enqueue (dedup_key, to_email, subject, body) messages, skipping keys already in the outbox.
+
+    Used by scheduled fan-outs so that re-running a job (e.g. after a restart
+    mid-run) never mails the same recipient twice. The caller must commit.
+    Returns (enqueued, skipped).
+    """
+    unique = {}
+    for key, to_email, subject, body in messages:
+        if to_email and key not in unique:
+            unique[key] = (to_email, subject, body)
+
+    existing = set()
+    keys = list(unique)
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        existing.update(
+            key for (key,) in db.query(EmailOutbox.dedup_key).filter(EmailOutbox.dedup_key.in_(chunk))
+        )
+
+    enqueued = 0
+    for key, (to_email, subject, body) in unique.items():
+        if key not in existing:
+            enqueue_email(db, to_email, subject, body, dedup_key=key)
+            enqueued += 1
+    return enqueued, len(existing)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+class DomainRateLimiter:
+    """Spaces out sends to the same recipient domain to at most `rate_per_second`."""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, to_email: str):
+        if not self.interval:
+            return
+        domain = to_email.rsplit("@", 1)[-1].lower()
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(domain, now))
+        self._next_slot[domain] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def _claim_due(batch_size: int, key_prefix: Optional[str]) -> List[tuple]:
+    """Lease a batch of due messages and return plain (id, to, subject, body, checkin_id, attempts) rows.
+
+    Blocking; the dispatcher runs it in a worker thread with its own session.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        query = db.query(EmailOutbox).filter(
+            EmailOutbox.status == OutboxStatus.pending,
+            EmailOutbox.next_attempt_at <= now
+        )
+        if key_prefix:
+            query = query.filter(EmailOutbox.dedup_key.like(f"{key_prefix}%"))
+        due = query.order_by(EmailOutbox.id).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        claimed = []
+        for message in due:
+            message.next_attempt_at = now + timedelta(seconds=CLAIM_LEASE_SECONDS)
+            claimed.append((
+                message.id, message.to_email, message.subject, message.body,
+                message.checkin_id, message.attempts
+            ))
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def _record_result(message: tuple, delivered: bool) -> bool:
+    """Store the outcome of one delivery. Blocking; runs in a worker thread with its own session."""
+    db = SessionLocal()
+    try:
+        message_id, to_email, _, _, checkin_id, attempts = message
+        attempts += 1
+        now = datetime.utcnow()
+
+        if delivered:
+            values = {
+                EmailOutbox.status: OutboxStatus.sent,
+                EmailOutbox.sent_at: now,
+                EmailOutbox.last_error: None,
+            }
+            if checkin_id:
+                db.query(CheckIn).filter(CheckIn.id == checkin_id).update(
+                    {CheckIn.email_sent: True}, synchronize_session=False
+                )
+        else:
+            values = {EmailOutbox.last_error: "SMTP delivery failed"}
+            if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                values[EmailOutbox.status] = OutboxStatus.failed
+                logger.error(f"❌ Giving up on outbox message {message_id} to {to_email}")
+            else:
+                values[EmailOutbox.next_attempt_at] = now + _retry_delay(attempts)
+
+        values[EmailOutbox.attempts] = attempts
+        db.query(EmailOutbox).filter(EmailOutbox.id == message_id).update(values, synchronize_session=False)
+        # Commit per message so a crash mid-batch never re-sends delivered mail
+        db.commit()
+        if delivered and checkin_id:
+            # email_sent is shown for late students on the dashboard
+            row = db.query(Student.school_id, Student.class_name, CheckIn.student_id, CheckIn.is_late).join(
+                CheckIn, CheckIn.student_id == Student.id
+            ).filter(CheckIn.id == checkin_id).first()
+            if row:
+                attendance_state.mark_email_sent(row.school_id, row.student_id)
+            if row and row.is_late:
+                mark_changed(row.school_id, row.class_name, {
+                    "type": "email_sent", "student_id": row.student_id, "email_sent": True
+                })
+        return delivered
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def dispatch_outbox(batch_size: Optional[int] = None, key_prefix: Optional[str] = None) -> dict:
+    """Deliver one batch of due outbox messages concurrently. Returns counts for logging.
+
+    `key_prefix` restricts the batch to messages whose dedup_key starts with it
+    (e.g. one day's absence run).
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    counts = {"claimed": 0, "sent": 0, "failed": 0}
+
+    try:
+        # Database work runs in worker threads so the event loop keeps serving requests
+        due = await asyncio.to_thread(_claim_due, batch_size, key_prefix)
+        counts["claimed"] = len(due)
+        if not due:
+            return counts
+
+        semaphore = asyncio.Semaphore(settings.OUTBOX_CONCURRENCY)
+        limiter = DomainRateLimiter(settings.OUTBOX_DOMAIN_RATE_PER_SECOND)
+
+        async def deliver(message: tuple):
+            _, to_email, subject, body, _, _ = message
+            async with semaphore:
+                await limiter.wait(to_email)
+                delivered = await send_email(to_email, subject, body)
+            recorded = await asyncio.to_thread(_record_result, message, delivered)
+            counts["sent" if recorded else "failed"] += 1
+
+        await asyncio.gather(*(deliver(message) for message in due))
+
+        logger.info(f"✉️ Outbox dispatch: {counts['sent']} sent, {counts['failed']} failed")
+        return counts
+
+    except Exception as e:
+        logger.error(f"Error dispatching email outbox: {e}")
+        return counts
+
+
+async def drain_outbox(key_prefix: Optional[str] = None) -> dict:
+    """Dispatch batches until no due message is left. Messages waiting on a retry are left for the dispatcher job."""
+    totals = {"sent": 0, "failed": 0}
+    while True:
+        counts = await dispatch_outbox(key_prefix=key_prefix)
+        totals["sent"] += counts["sent"]
+        totals["failed"] += counts["failed"]
+        if not counts["claimed"]:
+            return totals
+
+
+def count_by_status(db: Session, key_prefix: str) -> dict:
+    """Outbox message counts per status for one dedup_key prefix."""
+    counts = dict(
+        db.query(EmailOutbox.status, func.count(EmailOutbox.id))
+        .filter(EmailOutbox.dedup_key.like(f"{key_prefix}%"))
+        .group_by(EmailOutbox.status)
+        .all()
+    )
+    return {status.value: counts.get(status, 0) for status in OutboxStatus}
+
+
+def get_outbox_stats(db: Session) -> dict:
+    """Queue depth and lag of the outbox, for monitoring."""
+    now = datetime.utcnow()
+
+    counts = dict(
+        db.query(EmailOutbox.status, func.count(EmailOutbox.id))
+        .group_by(EmailOutbox.status)
+        .all()
+    )
+    oldest_pending = db.query(func.min(EmailOutbox.created_at)).filter(
+        EmailOutbox.status == OutboxStatus.pending
+    ).scalar()
+    last_sent = db.query(func.max(EmailOutbox.sent_at)).scalar()
+
+    return {
+        "pending": counts.get(OutboxStatus.pending, 0),
+        "sent": counts.get(OutboxStatus.sent, 0),
+        "failed": counts.get(OutboxStatus.failed, 0),
+        "oldest_pending_at": oldest_pending.isoformat() if oldest_pending else None,
+        "lag_seconds": round((now - oldest_pending).total_seconds(), 1) if oldest_pending else 0,
+        "last_sent_at": last_sent.isoformat() if last_sent else None,
+    }
@@ -1,15 +1,15 @@
-import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import List
 from datetime import datetime
 from app.core.config import get_settings
+from app.services.smtp_pool import smtp_pool
 
 settings = get_settings()
 
 
 async def send_email(to_email: str, subject: str, body: str):
-    """Send an email via SMTP."""
+    """Send an email via SMTP over a pooled, already-authenticated session."""
     message = MIMEMultipart()
     message["From"] = f"{settings.FROM_NAME} <{settings.FROM_EMAIL}>"
     message["To"] = to_email
@@ -18,28 +18,20 @@ async def send_email(to_email: str, subject: str, body: str):
     message.attach(MIMEText(body, "plain"))
     
     try:
-        await aiosmtplib.send(
-            message,
-            hostname=settings.SMTP_HOST,
-            port=settings.SMTP_PORT,
-            username=settings.SMTP_USER,
-            password=settings.SMTP_PASSWORD,
-            start_tls=True,
-        )
+        await smtp_pool.send_message(message)
         return True
     except Exception as e:
         print(f"Error sending email: {e}")
         return False
 
 
-async def send_checkin_notification(
-    parent_email: str, 
-    student_name: str, 
-    class_name: str, 
+def build_checkin_notification(
+    student_name: str,
+    class_name: str,
     checkin_time: datetime,
     is_late: bool = False
 ):
-    """Send check-in notification to parent."""
+    """Build the (subject, body) of the check-in notification sent to parents."""
     formatted_time = checkin_time.strftime("%H:%M")
     
     if is_late:
@@ -71,6 +63,72 @@ Gracias por participar en el programa piloto de ArrivApp.
 Este es un mensaje automático. Por favor no responder.
 """
     
+    return subject, body
+
+
+def build_checkout_notification(
+    student_name: str,
+    class_name: str,
+    checkin_time: datetime,
+    checkout_time: datetime,
+    early_dismissal: bool = False
+):
+    """Build the (subject, body) of the check-out notification sent to parents."""
+    checkin_time_str = checkin_time.strftime("%H:%M")
+    checkout_time_str = checkout_time.strftime("%H:%M")
+    minutes = (checkout_time - checkin_time).total_seconds() / 60
+    duration_hours = int(minutes // 60)
+    duration_mins = int(minutes % 60)
+    
+    if early_dismissal:
+        subject = f"⚠️ ArrivApp: {student_name} ha salido TEMPRANO del colegio"
+        body = f"""¡Hola!
+
+⚠️ ALERTA DE SALIDA TEMPRANA
+
+Te informamos que {student_name} ({class_name}) ha registrado su salida del colegio antes del horario habitual.
+
+📍 Resumen de hoy:
+• Hora de entrada: {checkin_time_str}h
+• Hora de salida: {checkout_time_str}h ⚠️ (Salida temprana)
+• Tiempo en el colegio: {duration_hours}h {duration_mins}min
+
+Si esta salida temprana no estaba prevista, por favor contacta con el colegio inmediatamente.
+
+Gracias por participar en el programa piloto de ArrivApp.
+
+---
+Este es un mensaje automático. Por favor no responder.
+"""
+    else:
+        subject = f"✅ ArrivApp: {student_name} ha salido del colegio"
+        body = f"""¡Hola!
+
+Te informamos que {student_name} ({class_name}) ha registrado su salida del colegio.
+
+📍 Resumen de hoy:
+• Hora de entrada: {checkin_time_str}h
+• Hora de salida: {checkout_time_str}h
+• Tiempo en el colegio: {duration_hours}h {duration_mins}min
+
+Gracias por participar en el programa piloto de ArrivApp.
+
+---
+Este es un mensaje automático. Por favor no responder.
+"""
+    
+    return subject, body
+
+
+async def send_checkin_notification(
+    parent_email: str, 
+    student_name: str, 
+    class_name: str, 
+    checkin_time: datetime,
+    is_late: bool = False
+):
+    """Send check-in notification to parent."""
+    subject, body = build_checkin_notification(student_name, class_name, checkin_time, is_late=is_late)
     return await send_email(parent_email, subject, body)
 
 
@@ -0,0 +1,226 @@
+"""
+Background PDF report jobs with a content-addressed artifact cache.
+
+GET /api/reports/export-pdf used to build the whole ReportLab document inside
+the request and re-read every row on each click, so several directors
+exporting the same month each paid for the same PDF. Exports now run as jobs:
+
+- POST /api/reports/jobs submits one and returns its id, GET /jobs/{id} polls
+  it and GET /jobs/{id}/download serves the file. /export-pdf submits a job
+  and waits for it.
+- Jobs run on their own small thread pool (REPORT_WORKERS) with their own
+  sessions, so long builds never hold the request worker threads.
+- Finished PDFs are stored under REPORT_CACHE_DIR as <sha256>.pdf, keyed by
+  the report parameters and the data version of what they cover. A submit
+  whose key already has a file is done at once, and identical submits while
+  a build is running share its job.
+
+The data version is the rollup fingerprint of the report's days (see
+attendance_rollup.fingerprint) plus the roster counter of its school scope
+(dashboard_cache), which moves on student and school edits. That counter
+lives in memory, so keys also carry the process id: artifacts written by an
+earlier process are never served and age out of the store, which is bounded
+by REPORT_CACHE_MAX_MB (least recently used first).
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Optional
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.services.attendance_rollup import fingerprint
+from app.services.dashboard_cache import BOOT_ID, dashboard_versions
+from app.core.config import get_settings
+import logging
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Part of every artifact key; bump when the PDF layout changes so old files are not served
+REPORT_FORMAT_VERSION = 2
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """What a report covers, with the school scope already resolved from the user's role."""
+    report_type: str  # history, statistics, tardiness
+    start_date: Optional[str] = None  # YYYY-MM-DD
+    end_date: Optional[str] = None
+    school_id: Optional[int] = None  # None = all schools
+    class_name: Optional[str] = None
+
+
+# Writes the PDF of a spec to a binary file
+ReportBuilder = Callable[[Session, ReportSpec, BinaryIO], None]
+
+
+@dataclass
+class ReportJob:
+    id: str
+    key: str
+    spec: ReportSpec
+    status: str = "queued"  # queued, running, done, failed
+    cached: bool = False  # Served from an earlier identical export
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    finished: threading.Event = field(default_factory=threading.Event, repr=False)
+
+
+def data_version(db: Session, spec: ReportSpec) -> tuple:
+    """Changes whenever data shown in the report may have changed."""
+    # Check-in times are UTC and rollup days school-local, so take a day either side
+    start_day = date.fromisoformat(spec.start_date) - timedelta(days=1) if spec.start_date else None
+    end_day = date.fromisoformat(spec.end_date) + timedelta(days=1) if spec.end_date else None
+    _, roster = dashboard_versions.current(spec.school_id)
+    return (BOOT_ID, roster, *fingerprint(db, start_day, end_day, spec.school_id, spec.class_name))
+
+
+def artifact_key(db: Session, spec: ReportSpec) -> str:
+    payload = json.dumps(
+        [REPORT_FORMAT_VERSION, asdict(spec), data_version(db, spec)], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ArtifactStore:
+    """<key>.pdf files in one directory, bounded by total size."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+    def get(self, key: str) -> Optional[Path]:
+        path = self.path(key)
+        try:
+            # Touch it so eviction drops the least recently used files first
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def write(self, key: str, write: Callable[[BinaryIO], None]) -> Path:
+        """Store the output of write(file) under key; readers never see a partial file."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        temporary = self.directory / f".{key}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(temporary, "wb") as out:
+                write(out)
+            os.replace(temporary, path)
+        finally:
+            temporary.unlink(missing_ok=True)
+        self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: Path):
+        with self._lock:
+            files = []
+            for path in self.directory.glob("*.pdf"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files, key=lambda entry: entry[0]):
+                if total <= self.max_bytes:
+                    break
+                if path != keep:
+                    path.unlink(missing_ok=True)
+                    total -= size
+
+
+class ReportJobs:
+    """Job registry and worker pool; finished jobs are forgotten after REPORT_JOB_TTL_SECONDS."""
+
+    def __init__(self, store: ArtifactStore, workers: int, ttl_seconds: int):
+        self.store = store
+        self.workers = workers
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._jobs: Dict[str, ReportJob] = {}
+        self._building: Dict[str, ReportJob] = {}  # Artifact key -> unfinished job
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, db: Session, spec: ReportSpec, build: ReportBuilder) -> ReportJob:
+        """Start building a report, or return the job that already covers it."""
+        key = artifact_key(db, spec)
+        with self._lock:
+            self._prune()
+            job = self._building.get(key)
+            if job is not None:
+                return job
+
+            job = ReportJob(id=uuid.uuid4().hex, key=key, spec=spec)
+            self._jobs[job.id] = job
+            if self.store.get(key) is not None:
+                job.status, job.cached, job.finished_at = "done", True, job.created_at
+                job.finished.set()
+                return job
+
+            self._building[key] = job
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report")
+            self._executor.submit(self._run, job, build)
+            return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def wait(self, job: ReportJob, timeout: float) -> bool:
+        """Block until the job has finished; False on timeout."""
+        return job.finished.wait(timeout)
+
+    def artifact(self, job: ReportJob) -> Optional[Path]:
+        """The finished PDF of a job, or None if it is not done or was evicted since."""
+        return self.store.get(job.key) if job.status == "done" else None
+
+    def _run(self, job: ReportJob, build: ReportBuilder):
+        job.status = "running"
+        db = SessionLocal()
+        try:
+            self.store.write(job.key, lambda out: build(db, job.spec, out))
+            job.status = "done"
+        except Exception as e:
+            logger.error(f"Report job {job.id} ({job.spec.report_type}) failed: {e}")
+            job.status, job.error = "failed", "Report generation failed"
+        finally:
+            db.close()
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                self._building.pop(job.key, None)
+            job.finished.set()
+
+    def _prune(self):
+        cutoff = datetime.utcnow() - self.ttl
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+report_jobs = ReportJobs(
+    ArtifactStore(settings.REPORT_CACHE_DIR, settings.REPORT_CACHE_MAX_MB * 1024 * 1024),
+    settings.REPORT_WORKERS,
+    settings.REPORT_JOB_TTL_SECONDS
+)
@@ -0,0 +1,101 @@
+"""
+Process-local cache for the QR scan fast path.
+
+The kiosk scan endpoint needs to know which student a QR code belongs to on
+every request. That changes rarely compared to how often it is read during the
+morning rush, so it is kept in memory here and refreshed on a TTL or
+invalidated explicitly by the student management endpoints. Whether the
+student already checked in today comes from services.attendance_state.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from app.models.models import Student
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class CachedStudent:
+    """Read-only snapshot of the Student columns the scan path needs."""
+    id: int
+    student_id: str
+    name: str
+    class_name: str
+    parent_email: str
+    school_id: int
+
+    @classmethod
+    def from_model(cls, student: Student) -> "CachedStudent":
+        return cls(
+            id=student.id,
+            student_id=student.student_id,
+            name=student.name,
+            class_name=student.class_name,
+            parent_email=student.parent_email,
+            school_id=student.school_id,
+        )
+
+
+class StudentCache:
+    """QR code (Student.student_id) -> active student snapshot, with TTL."""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, code: str) -> Optional[CachedStudent]:
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                return None
+            student, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[code]
+                return None
+            return student
+
+    def put(self, student: CachedStudent):
+        with self._lock:
+            self._entries[student.student_id] = (student, time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, code: str):
+        with self._lock:
+            self._entries.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+student_cache = StudentCache(settings.SCAN_CACHE_TTL_SECONDS)
+
+
+def lookup_student(db: Session, code: str) -> Optional[CachedStudent]:
+    """Resolve an active student by QR code, hitting the database only on a miss."""
+    cached = student_cache.get(code)
+    if cached is not None:
+        return cached
+
+    student = db.query(Student).filter(
+        Student.student_id == code,
+        Student.is_active == True
+    ).first()
+    if not student:
+        return None
+
+    cached = CachedStudent.from_model(student)
+    student_cache.put(cached)
+    return cached
+
+
+def invalidate_student(code: Optional[str] = None):
+    """Drop one cached student (or all of them when no code is given)."""
+    if code is None:
+        student_cache.clear()
+    else:
+        student_cache.invalidate(code)
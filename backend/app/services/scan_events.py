@@ -0,0 +1,110 @@
+"""
+In-process fan-out of committed scan events to live dashboards.
+
+checkin_scan runs in FastAPI's worker threads and publishes one event per
+committed check-in or check-out. Each connected dashboard holds a Subscriber
+with its own asyncio queue on the event loop; publish() hands events over with
+call_soon_threadsafe, filtered by the subscriber's school and class scope.
+
+Dashboards fetch a full snapshot when they connect and apply events on top.
+A subscriber that falls too far behind is marked stale, and its stream asks the
+client to fetch a fresh snapshot instead of silently dropping events.
+
+The broker is per process, which matches the single uvicorn worker we deploy.
+"""
+import asyncio
+import threading
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Optional, Set
+from app.core.config import get_settings
+import logging
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class ScanEvent:
+    """One committed scan, as sent to dashboards."""
+    type: str  # "checkin" or "checkout"
+    student_id: int
+    student_name: str
+    class_name: str
+    school_id: int
+    checkin_time: datetime
+    checkout_time: Optional[datetime] = None
+    is_late: Optional[bool] = None  # not known on check-out
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["checkin_time"] = self.checkin_time.isoformat()
+        data["checkout_time"] = self.checkout_time.isoformat() if self.checkout_time else None
+        return data
+
+
+@dataclass(eq=False)
+class Subscriber:
+    """A connected dashboard and the scope it is allowed to see."""
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue
+    school_id: Optional[int] = None  # None: every school (admins)
+    class_name: Optional[str] = None
+    stale: bool = field(default=False)
+
+    def wants(self, event: ScanEvent) -> bool:
+        if self.school_id is not None and event.school_id != self.school_id:
+            return False
+        if self.class_name and event.class_name != self.class_name:
+            return False
+        return True
+
+    def deliver(self, event: ScanEvent):
+        # Runs on the subscriber's event loop
+        if self.stale:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stale = True
+
+
+class ScanEventBroker:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, school_id: Optional[int] = None, class_name: Optional[str] = None) -> Subscriber:
+        """Register a subscriber. Must be called from the event loop that will read it."""
+        subscriber = Subscriber(
+            loop=asyncio.get_running_loop(),
+            queue=asyncio.Queue(maxsize=self.queue_size),
+            school_id=school_id,
+            class_name=class_name,
+        )
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: ScanEvent):
+        """Hand an event to every matching subscriber. Safe to call from any thread."""
+        with self._lock:
+            targets = [subscriber for subscriber in self._subscribers if subscriber.wants(event)]
+        for subscriber in targets:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, event)
+            except RuntimeError:
+                # Loop already closed (shutdown); the stream is going away anyway
+                self.unsubscribe(subscriber)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+scan_events = ScanEventBroker(settings.SCAN_EVENTS_QUEUE_SIZE)
@@ -0,0 +1,351 @@
+"""
+Set-wise ingestion of scans buffered by kiosks.
+
+Gate tablets that lose the network keep scanning and later send what they
+buffered to POST /api/checkin/scan/batch. Every scan carries the time it was
+taken and an idempotency key, so a kiosk that retries a batch whose response
+it never received gets the stored results back instead of new check-ins.
+
+A batch is applied in one transaction with a fixed number of queries: known
+keys, the scanned students, and their check-ins on the days scanned. Scans are
+then judged in scan-time order with the same rules as the live endpoint
+(services.scan_rules). Parent emails are only queued for scans from the school's
+current day; a notification about a previous day would arrive too late to be
+useful.
+
+Because a batch records scans in the past, it is only accepted from a school
+user and only for that school's students, and only inside the kiosk's offline
+window (offline_window()). The window starts when the kiosk says it lost the
+connection, but never before the device's previous sync, which the server
+witnessed, and never more than SCAN_BATCH_MAX_AGE_DAYS ago.
+"""
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from sqlalchemy.orm import Session
+from app.models.models import Student, CheckIn, KioskScan, KioskDevice
+from app.services import scan_rules, attendance_bitmaps
+from app.services.scan_cache import CachedStudent
+from app.services.scan_events import ScanEvent
+from app.services.attendance_rollup import local_day, record_counts
+from app.services.checkin_store import close_checkins
+from app.services.attendance_state import attendance_state
+from app.services.email_outbox import enqueue_email
+from app.services.email_service import build_checkin_notification, build_checkout_notification
+from app.core.config import get_settings
+from app.core import timeutils
+
+settings = get_settings()
+
+# Results besides the scan_rules outcomes
+NOT_FOUND = "not_found"
+REJECTED = "rejected"
+
+APPLIED = (scan_rules.CHECKIN, scan_rules.CHECKOUT)
+
+
+@dataclass(frozen=True)
+class IncomingScan:
+    idempotency_key: str
+    student_code: str  # QR code (Student.student_id)
+    scanned_at: datetime  # Naive UTC, like CheckIn.checkin_time
+    device_id: str
+
+
+@dataclass
+class _StudentDay:
+    """A student's check-in on one day, as seen while applying a batch."""
+    checkin_time: Optional[datetime] = None
+    checkout_time: Optional[datetime] = None
+    is_late: bool = False
+    checkin_id: Optional[int] = None  # Existing row
+    row: Optional[CheckIn] = None  # Row created by this batch
+
+    @property
+    def id(self) -> Optional[int]:
+        return self.row.id if self.row is not None else self.checkin_id
+
+
+@dataclass
+class IngestOutcome:
+    results: List[dict]  # One per scan, in input order (ScanBatchResult fields)
+    accepted: int
+    replayed: int
+    events: List[ScanEvent]  # Today's committed check-ins and check-outs
+    past_schools: Set[Optional[int]]  # Schools with scans applied to other days
+
+
+class KioskDeviceConflict(Exception):
+    """The device is registered to a different school than the user syncing it."""
+
+
+def offline_window(db: Session, device_id: str, school_id: Optional[int], offline_since: datetime,
+                   now: datetime) -> datetime:
+    """Earliest scan time accepted from a device's batch, and record the sync. The caller commits.
+
+    `offline_since` is the kiosk's claim of when it lost the connection. A claim
+    that reaches back before the device's previous sync is cut at that sync:
+    the device was online then, so anything older would already have been
+    sent. Later batches of the same outage (same claim) keep the first batch's
+    window. Raises KioskDeviceConflict if the device belongs to another school.
+    """
+    skew = timedelta(seconds=settings.SCAN_BATCH_MAX_CLOCK_SKEW_SECONDS)
+    device = db.query(KioskDevice).filter(KioskDevice.device_id == device_id).with_for_update().first()
+    if device is None:
+        start = offline_since
+        device = KioskDevice(device_id=device_id, school_id=school_id)
+        db.add(device)
+    else:
+        if school_id is not None and device.school_id not in (None, school_id):
+            raise KioskDeviceConflict(f"Device {device_id} belongs to another school")
+        if offline_since == device.offline_since:
+            start = device.window_start
+        else:
+            start = max(offline_since, device.last_sync_at - skew)
+        if device.school_id is None:
+            device.school_id = school_id
+    start = max(start, now - timedelta(days=settings.SCAN_BATCH_MAX_AGE_DAYS))
+
+    device.offline_since = offline_since
+    device.window_start = start
+    device.last_sync_at = now
+    return start
+
+
+def to_utc(moment: datetime) -> datetime:
+    """Kiosks may send an offset; check-ins are stored as naive UTC (see app.core.timeutils)."""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _result(scan: IncomingScan, result: str, student: Optional[CachedStudent] = None,
+            day: Optional[_StudentDay] = None, detail: Optional[str] = None) -> dict:
+    return {
+        "idempotency_key": scan.idempotency_key,
+        "result": result,
+        "replayed": False,
+        "student_name": student.name if student else None,
+        "class_name": student.class_name if student else None,
+        "checkin_time": day.checkin_time if day else None,
+        "checkout_time": day.checkout_time if day else None,
+        "is_late": day.is_late if day and day.checkin_time else None,
+        "detail": detail,
+    }
+
+
+def _load_students(db: Session, codes: Set[str], school_id: Optional[int]) -> Dict[str, CachedStudent]:
+    if not codes:
+        return {}
+    rows = db.query(
+        Student.id, Student.student_id, Student.name, Student.class_name, Student.parent_email, Student.school_id
+    ).filter(Student.student_id.in_(codes), Student.is_active == True)
+    if school_id is not None:
+        rows = rows.filter(Student.school_id == school_id)
+    return {
+        row.student_id: CachedStudent(row.id, row.student_id, row.name, row.class_name, row.parent_email, row.school_id)
+        for row in rows
+    }
+
+
+def _load_days(db: Session, student_pks: Set[int], first_day: date, last_day: date) -> Dict[Tuple[int, date], _StudentDay]:
+    """(student, local day) -> check-in of that school-local day, for the given students and days."""
+    days: Dict[Tuple[int, date], _StudentDay] = {}
+    if not student_pks:
+        return days
+    rows = db.query(
+        CheckIn.id, CheckIn.student_id, CheckIn.local_date, CheckIn.checkin_time, CheckIn.checkout_time,
+        CheckIn.is_late
+    ).filter(
+        CheckIn.student_id.in_(student_pks),
+        CheckIn.local_date >= first_day,
+        CheckIn.local_date <= last_day
+    )
+    for row in rows:
+        days.setdefault(
+            (row.student_id, row.local_date),
+            _StudentDay(row.checkin_time, row.checkout_time, bool(row.is_late), checkin_id=row.id)
+        )
+    return days
+
+
+def ingest_scans(db: Session, scans: Sequence[IncomingScan], now: Optional[datetime] = None,
+                 earliest: Optional[datetime] = None, school_id: Optional[int] = None,
+                 check_age: bool = True) -> IngestOutcome:
+    """Apply a batch of kiosk scans and commit it in one transaction.
+
+    Scans before `earliest` (the kiosk's offline window, see offline_window())
+    or older than SCAN_BATCH_MAX_AGE_DAYS are rejected. With `school_id`, codes
+    of other schools' students are answered as not found. check_age=False
+    skips both bounds; the scan journal uses it for scans it has already
+    accepted, however long the database was unreachable.
+
+    Raises IntegrityError if a concurrent request stored one of the same keys
+    or a check-in for the same student and day first, and CheckInConflict if a
+    concurrent scan closed one of the same check-ins. The caller rolls back and
+    the kiosk retries, getting stored results or a judgement on the new rows.
+    """
+    now = now or timeutils.utc_now()
+    if check_age:
+        oldest = now - timedelta(days=settings.SCAN_BATCH_MAX_AGE_DAYS)
+        earliest = max(earliest, oldest) if earliest is not None else oldest
+    else:
+        oldest = earliest = datetime.min
+    latest = now + timedelta(seconds=settings.SCAN_BATCH_MAX_CLOCK_SKEW_SECONDS)
+    results: List[Optional[dict]] = [None] * len(scans)
+
+    # Keys already ingested by an earlier request are answered from storage
+    keys = {scan.idempotency_key for scan in scans}
+    stored = dict(
+        db.query(KioskScan.idempotency_key, KioskScan.response).filter(KioskScan.idempotency_key.in_(keys))
+    ) if keys else {}
+    pending: List[Tuple[int, IncomingScan]] = []
+    first_index: Dict[str, int] = {}
+    for index, scan in enumerate(scans):
+        if scan.idempotency_key in stored:
+            results[index] = dict(json.loads(stored[scan.idempotency_key]), replayed=True)
+        elif scan.idempotency_key not in first_index:
+            first_index[scan.idempotency_key] = index
+            pending.append((index, scan))
+
+    students = _load_students(db, {scan.student_code for _, scan in pending}, school_id)
+    in_window = [
+        scan for _, scan in pending
+        if scan.student_code in students and earliest <= scan.scanned_at <= latest
+    ]
+    # A student's day is the school-local day, like CheckIn.local_date
+    scan_days = {
+        scan.idempotency_key: local_day(db, students[scan.student_code].school_id, scan.scanned_at)
+        for scan in in_window
+    }
+    days = _load_days(
+        db,
+        {students[scan.student_code].id for scan in in_window},
+        min(scan_days.values(), default=None),
+        max(scan_days.values(), default=None)
+    )
+
+    # Judge scans in the order they happened, whatever order they arrived in
+    rollup: Dict[Tuple[int, str, date], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    checkouts: List[Tuple[int, datetime]] = []
+    new_checkins: List[Tuple[int, date, bool]] = []
+    applied: List[Tuple[IncomingScan, CachedStudent, _StudentDay, str]] = []
+    for index, scan in sorted(pending, key=lambda item: item[1].scanned_at):
+        if scan.scanned_at > latest:
+            results[index] = _result(scan, REJECTED, detail="Scan time is ahead of the server clock")
+            continue
+        if scan.scanned_at < oldest:
+            results[index] = _result(
+                scan, REJECTED, detail=f"Scan is older than {settings.SCAN_BATCH_MAX_AGE_DAYS} days"
+            )
+            continue
+        if scan.scanned_at < earliest:
+            results[index] = _result(scan, REJECTED, detail="Scan predates the kiosk's offline window")
+            continue
+        student = students.get(scan.student_code)
+        if student is None:
+            results[index] = _result(scan, NOT_FOUND, detail="Student not found")
+            continue
+
+        scan_day = scan_days[scan.idempotency_key]
+        day = days.setdefault((student.id, scan_day), _StudentDay())
+        decision, _ = scan_rules.decide_scan(day.checkin_time, day.checkout_time, scan.scanned_at)
+        counts = rollup[(student.school_id, student.class_name, scan_day)]
+        if decision == scan_rules.CHECKIN:
+            day.checkin_time = scan.scanned_at
+            day.is_late = scan_rules.is_late(scan.scanned_at, timeutils.school_zone(db, student.school_id))
+            day.row = CheckIn(student_id=student.id, checkin_time=scan.scanned_at, is_late=day.is_late)
+            db.add(day.row)
+            counts["present"] += 1
+            counts["late"] += 1 if day.is_late else 0
+            new_checkins.append((student.id, scan_day, day.is_late))
+        elif decision == scan_rules.CHECKOUT:
+            day.checkout_time = scan.scanned_at
+            if day.row is not None:
+                day.row.checkout_time = scan.scanned_at
+            else:
+                checkouts.append((day.checkin_id, scan.scanned_at))
+            counts["checked_out"] += 1
+        applied.append((scan, student, day, decision))
+        results[index] = _result(scan, decision, student, day)
+
+    # One flush assigns ids to the new check-ins; the rest needs them
+    db.flush()
+    close_checkins(db, checkouts)
+    record_counts(db, rollup)
+    attendance_bitmaps.record_checkins(db, new_checkins)
+
+    checkin_ids: Dict[str, Optional[int]] = {}
+    for scan, student, day, decision in applied:
+        if decision not in APPLIED:
+            continue
+        checkin_ids[scan.idempotency_key] = day.id
+        if scan_days[scan.idempotency_key] != local_day(db, student.school_id, now):
+            continue
+        # Parents read the times on the school's clock
+        tz = timeutils.school_zone(db, student.school_id)
+        if decision == scan_rules.CHECKIN:
+            subject, body = build_checkin_notification(
+                student.name, student.class_name, timeutils.local_time(day.checkin_time, tz), is_late=day.is_late
+            )
+            enqueue_email(db, student.parent_email, subject, body, checkin_id=day.id)
+        else:
+            subject, body = build_checkout_notification(
+                student.name, student.class_name,
+                timeutils.local_time(day.checkin_time, tz), timeutils.local_time(scan.scanned_at, tz),
+                early_dismissal=scan_rules.is_early_dismissal(scan.scanned_at, tz)
+            )
+            enqueue_email(db, student.parent_email, subject, body)
+
+    db.add_all([
+        KioskScan(
+            idempotency_key=scan.idempotency_key,
+            device_id=scan.device_id,
+            student_code=scan.student_code,
+            scanned_at=scan.scanned_at,
+            result=results[index]["result"],
+            checkin_id=checkin_ids.get(scan.idempotency_key),
+            response=json.dumps(results[index], default=lambda value: value.isoformat()),
+        )
+        for index, scan in pending
+    ])
+    db.commit()
+
+    # Repeated keys within the batch get the result of their first occurrence
+    for index, scan in enumerate(scans):
+        if results[index] is None:
+            results[index] = dict(results[first_index[scan.idempotency_key]], replayed=True)
+
+    events: List[ScanEvent] = []
+    past_schools: Set[Optional[int]] = set()
+    for scan, student, day, decision in applied:
+        if decision not in APPLIED:
+            continue
+        today = local_day(db, student.school_id, now)
+        if scan_days[scan.idempotency_key] != today:
+            past_schools.add(student.school_id)
+            continue
+        if decision == scan_rules.CHECKIN:
+            attendance_state.record_checkin(today, student, day.id, day.checkin_time, day.is_late)
+        else:
+            attendance_state.record_checkout(today, student.school_id, student.id, scan.scanned_at)
+        events.append(ScanEvent(
+            type=decision,
+            student_id=student.id,
+            student_name=student.name,
+            class_name=student.class_name,
+            school_id=student.school_id,
+            checkin_time=day.checkin_time,
+            checkout_time=scan.scanned_at if decision == scan_rules.CHECKOUT else None,
+            is_late=day.is_late if decision == scan_rules.CHECKIN else None
+        ))
+
+    return IngestOutcome(
+        results=results,
+        accepted=len(pending),
+        replayed=len(scans) - len(pending),
+        events=events,
+        past_schools=past_schools
+    )
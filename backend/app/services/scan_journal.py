@@ -0,0 +1,255 @@
+"""
+Optional write-behind journal for the scan endpoint.
+
+With SCAN_JOURNAL_ENABLED, POST /api/checkin/scan no longer writes to the main
+database. It judges the scan against the in-process attendance state, appends
+it to a local SQLite file (synchronous=FULL, so it is on disk when the kiosk
+gets its answer), updates the state and responds. A slow or unavailable
+Postgres no longer holds students at the gate.
+
+replay_journal() runs every SCAN_JOURNAL_REPLAY_INTERVAL_SECONDS and commits
+pending entries to the main database through the kiosk batch ingestion
+(services.scan_ingest), up to SCAN_JOURNAL_BATCH_SIZE entries per transaction.
+Entries carry idempotency keys, so an entry replayed twice (a crash between the
+database commit and marking it here) is only recorded once.
+
+Until it is replayed a scan only exists here and in memory, so the attendance
+state re-applies pending entries after every reload. The file must be on a
+persistent disk for scans to survive a restart.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.services import scan_rules
+from app.services.scan_cache import CachedStudent
+from app.services.scan_ingest import IncomingScan, ingest_scans, NOT_FOUND, REJECTED
+from app.services.attendance_state import attendance_state
+from app.services.attendance_rollup import local_day
+from app.services.dashboard_cache import mark_roster_changed
+from app.core.config import get_settings
+from app.core import timeutils
+import logging
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+DEVICE_ID = "scan-endpoint"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scan_journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    action TEXT NOT NULL,
+    scanned_at TEXT NOT NULL,
+    is_late INTEGER NOT NULL,
+    student_pk INTEGER NOT NULL,
+    student_code TEXT NOT NULL,
+    name TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    parent_email TEXT,
+    school_id INTEGER,
+    recorded_at TEXT NOT NULL,
+    replayed_at TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_scan_journal_pending ON scan_journal (replayed_at, seq);
+"""
+
+COLUMNS = "seq, idempotency_key, action, scanned_at, is_late, student_pk, student_code, name, class_name, parent_email, school_id"
+
+
+@dataclass(frozen=True)
+class JournalEntry:
+    seq: int
+    idempotency_key: str
+    action: str  # scan_rules.CHECKIN or scan_rules.CHECKOUT
+    scanned_at: datetime
+    is_late: bool
+    student: CachedStudent
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "JournalEntry":
+        seq, key, action, scanned_at, is_late, student_pk, code, name, class_name, parent_email, school_id = row
+        return cls(
+            seq=seq,
+            idempotency_key=key,
+            action=action,
+            scanned_at=datetime.fromisoformat(scanned_at),
+            is_late=bool(is_late),
+            student=CachedStudent(student_pk, code, name, class_name, parent_email, school_id),
+        )
+
+    def as_scan(self) -> IncomingScan:
+        return IncomingScan(self.idempotency_key, self.student.student_id, self.scanned_at, DEVICE_ID)
+
+    def state_operation(self, db: Session) -> Tuple[str, tuple]:
+        """The attendance_state call that re-applies this entry, on the school-local day it was scanned."""
+        day = local_day(db, self.student.school_id, self.scanned_at)
+        if self.action == scan_rules.CHECKIN:
+            return "record_checkin", (day, self.student, None, self.scanned_at, self.is_late)
+        return "record_checkout", (day, self.student.school_id, self.student.id, self.scanned_at)
+
+
+class ScanJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()  # Guards the connection
+        # Held while a scan is judged, appended and applied to the state, so two
+        # scans of the same student cannot both be taken as the check-in
+        self.scan_lock = threading.Lock()
+        self.replay_lock = threading.Lock()
+        self.last_replay_at: Optional[datetime] = None
+        self.last_replayed = 0
+        self.last_error: Optional[str] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def append(self, action: str, student: CachedStudent, scanned_at: datetime, is_late: bool) -> int:
+        """Durably record one scan; returns its sequence number."""
+        with self._lock:
+            cursor = self._connection().execute(
+                "INSERT INTO scan_journal (idempotency_key, action, scanned_at, is_late, student_pk, student_code, "
+                "name, class_name, parent_email, school_id, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    f"journal:{uuid.uuid4().hex}", action, scanned_at.isoformat(), int(is_late), student.id,
+                    student.student_id, student.name, student.class_name, student.parent_email, student.school_id,
+                    timeutils.utc_now().isoformat(),
+                )
+            )
+            return cursor.lastrowid
+
+    def pending(self, limit: Optional[int] = None) -> List[JournalEntry]:
+        """Entries not yet committed to the main database, oldest first."""
+        sql = f"SELECT {COLUMNS} FROM scan_journal WHERE replayed_at IS NULL ORDER BY seq"
+        with self._lock:
+            if limit is not None:
+                rows = self._connection().execute(sql + " LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = self._connection().execute(sql).fetchall()
+        return [JournalEntry.from_row(row) for row in rows]
+
+    def pending_operations(self, db: Session) -> List[Tuple[str, tuple]]:
+        return [entry.state_operation(db) for entry in self.pending()]
+
+    def mark_replayed(self, results: Dict[int, str]):
+        """Record the ingestion result of replayed entries (seq -> result)."""
+        replayed_at = timeutils.utc_now().isoformat()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE scan_journal SET replayed_at = ?, result = ? WHERE seq = ?",
+                [(replayed_at, result, seq) for seq, result in results.items()]
+            )
+            conn.execute("COMMIT")
+
+    def prune(self, before: datetime) -> int:
+        """Delete entries replayed before `before`."""
+        with self._lock:
+            cursor = self._connection().execute(
+                "DELETE FROM scan_journal WHERE replayed_at IS NOT NULL AND replayed_at < ?", (before.isoformat(),)
+            )
+            return cursor.rowcount
+
+    def exists(self) -> bool:
+        return self._conn is not None or os.path.exists(self.path)
+
+    def stats(self) -> dict:
+        if not self.exists():
+            return {"enabled": settings.SCAN_JOURNAL_ENABLED, "path": self.path, "pending": 0, "lag_seconds": 0}
+        with self._lock:
+            conn = self._connection()
+            pending, oldest = conn.execute(
+                "SELECT count(*), min(recorded_at) FROM scan_journal WHERE replayed_at IS NULL"
+            ).fetchone()
+            replayed, mismatched = conn.execute(
+                "SELECT count(*), coalesce(sum(CASE WHEN result != action THEN 1 ELSE 0 END), 0) "
+                "FROM scan_journal WHERE replayed_at IS NOT NULL"
+            ).fetchone()
+        oldest_pending_at = datetime.fromisoformat(oldest) if oldest else None
+        return {
+            "enabled": settings.SCAN_JOURNAL_ENABLED,
+            "path": self.path,
+            "pending": pending,
+            "oldest_pending_at": oldest_pending_at,
+            "lag_seconds": round((timeutils.utc_now() - oldest_pending_at).total_seconds(), 1) if oldest_pending_at else 0,
+            "replayed": replayed,
+            # Replayed entries the database judged differently from the scan endpoint
+            "mismatched": mismatched,
+            "last_replay_at": self.last_replay_at,
+            "last_replayed": self.last_replayed,
+            "last_error": self.last_error,
+        }
+
+
+scan_journal = ScanJournal(settings.SCAN_JOURNAL_PATH)
+
+if settings.SCAN_JOURNAL_ENABLED:
+    attendance_state.set_pending_source(scan_journal.pending_operations)
+
+
+def replay_journal(batch_size: Optional[int] = None) -> int:
+    """Commit pending journal entries to the main database. Returns the number replayed."""
+    if not settings.SCAN_JOURNAL_ENABLED and not scan_journal.exists():
+        return 0
+    batch_size = batch_size or settings.SCAN_JOURNAL_BATCH_SIZE
+    replayed = 0
+    with scan_journal.replay_lock:
+        db = SessionLocal()
+        try:
+            while True:
+                entries = scan_journal.pending(batch_size)
+                if not entries:
+                    break
+                # The kiosk was already told these scans were recorded, so the
+                # batch age limit does not apply
+                outcome = ingest_scans(db, [entry.as_scan() for entry in entries], check_age=False)
+                for entry, result in zip(entries, outcome.results):
+                    if result["result"] in (NOT_FOUND, REJECTED):
+                        logger.error(
+                            f"❌ Journaled {entry.action} of {entry.student.student_id} at {entry.scanned_at} "
+                            f"(journal seq {entry.seq}) was not recorded: {result['detail']}"
+                        )
+                scan_journal.mark_replayed({
+                    entry.seq: result["result"] for entry, result in zip(entries, outcome.results)
+                })
+                # Already announced when scanned; only past days still need invalidating
+                for school_id in outcome.past_schools:
+                    mark_roster_changed(school_id)
+                replayed += len(entries)
+                if len(entries) < batch_size:
+                    break
+            scan_journal.last_error = None
+        except Exception as e:
+            db.rollback()
+            scan_journal.last_error = str(e)
+            logger.error(f"Error replaying scan journal: {e}")
+        finally:
+            db.close()
+            scan_journal.last_replay_at = timeutils.utc_now()
+            scan_journal.last_replayed = replayed
+    return replayed
+
+
+async def replay_scan_journal():
+    """Scheduled job: replay the journal in a worker thread, then prune old entries."""
+    replayed = await asyncio.to_thread(replay_journal)
+    if replayed:
+        logger.info(f"📒 Replayed {replayed} journaled scans")
+    if scan_journal.exists():
+        scan_journal.prune(timeutils.utc_now() - timedelta(days=settings.SCAN_JOURNAL_RETENTION_DAYS))
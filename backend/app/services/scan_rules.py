@@ -0,0 +1,59 @@
+"""
+Rules that turn a QR scan into a check-in, a check-out or a refusal.
+
+Shared by the live kiosk endpoint (POST /api/checkin/scan) and the offline
+batch sync (POST /api/checkin/scan/batch), so a scan buffered on a kiosk is
+judged exactly like a live one, using the time it was scanned.
+
+Scan times are naive UTC (see app.core.timeutils); the late and early
+dismissal thresholds are wall-clock times at the student's school.
+"""
+from datetime import datetime
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+from app.core import timeutils
+from app.core.config import get_settings
+
+settings = get_settings()
+
+CHECKIN = "checkin"
+CHECKOUT = "checkout"
+DUPLICATE_SCAN = "duplicate_scan"
+TOO_EARLY_CHECKOUT = "too_early_checkout"
+ALREADY_COMPLETED = "already_completed"
+
+# A second scan this soon after check-in is taken as an accidental double scan
+DUPLICATE_WINDOW_MINUTES = 10
+# Minimum stay before a scan counts as check-out
+MIN_STAY_MINUTES = 30
+# Check-outs before this hour are flagged as early dismissal
+EARLY_DISMISSAL_HOUR = 14
+
+
+def is_late(moment: datetime, tz: ZoneInfo) -> bool:
+    local = timeutils.local_time(moment, tz)
+    return (local.hour > settings.LATE_THRESHOLD_HOUR or
+            (local.hour == settings.LATE_THRESHOLD_HOUR and local.minute > settings.LATE_THRESHOLD_MINUTE))
+
+
+def is_early_dismissal(moment: datetime, tz: ZoneInfo) -> bool:
+    return timeutils.local_time(moment, tz).hour < EARLY_DISMISSAL_HOUR
+
+
+def decide_scan(checkin_time: Optional[datetime], checkout_time: Optional[datetime],
+                now: datetime) -> Tuple[str, float]:
+    """What a scan at `now` does, given the student's check-in for that day (if any).
+
+    Returns the outcome and the minutes elapsed since check-in (0 without one).
+    A scan timed before the recorded check-in is treated as a duplicate.
+    """
+    if checkin_time is None:
+        return CHECKIN, 0
+    minutes = (now - checkin_time).total_seconds() / 60
+    if checkout_time is not None:
+        return ALREADY_COMPLETED, minutes
+    if minutes < DUPLICATE_WINDOW_MINUTES:
+        return DUPLICATE_SCAN, minutes
+    if minutes < MIN_STAY_MINUTES:
+        return TOO_EARLY_CHECKOUT, minutes
+    return CHECKOUT, minutes
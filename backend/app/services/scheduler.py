@@ -4,79 +4,62 @@ Handles daily absent student reports and other scheduled operations
 """
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+import asyncio
 from datetime import datetime, date, time
-from sqlalchemy.orm import Session, joinedload
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
 from sqlalchemy import and_, func, Integer
 from app.core.database import SessionLocal
+from app.core import timeutils
 from app.models.models import (
     Student, CheckIn, User, UserRole, 
-    StudentDietaryNeeds, KitchenAttendance, AbsenceNotification, School
+    StudentDietaryNeeds, KitchenAttendance, AbsenceNotification, School,
+    NotificationRun
 )
-from app.services.email_service import send_email
+from app.services.email_outbox import (
+    dispatch_outbox, drain_outbox, enqueue_unique_emails, count_by_status
+)
+from app.services.attendance_rollup import compact_rollup
+from app.services.attendance_bitmaps import close_days
+from app.services.attendance_state import attendance_state, rebuild_attendance_state
+from app.services.scan_journal import replay_scan_journal
 from app.core.config import get_settings
 import logging
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Create scheduler instance
-scheduler = AsyncIOScheduler()
+# Create scheduler instance. Coroutine jobs run on the event loop and must keep
+# blocking database work in asyncio.to_thread; plain functions are run by
+# AsyncIOScheduler in the loop's thread pool executor. Cron triggers are given
+# this timezone, so their times are wall-clock times at the schools (default
+# TIMEZONE) whatever the server's own timezone is.
+scheduler = AsyncIOScheduler(timezone=timeutils.zone(None))
 
 
-async def check_absent_students():
-    """Check for students who haven't checked in and send notifications to parents, schools, and admins."""
-    logger.info("Running absent students check...")
+ABSENT_CHECK_JOB = "check_absent_students"
+
+
+def _absence_key_prefix(day: date) -> str:
+    return f"absence:{day.isoformat()}:"
+
+
+def _build_absence_messages(absent_by_school: dict, admins: list, key_prefix: str) -> list:
+    """Build (dedup_key, to_email, subject, body) tuples for parents, school contacts and admins."""
+    messages = []
     
-    db = SessionLocal()
-    try:
-        # Get today's date range
-        today_start = datetime.combine(date.today(), time.min)
-        today_end = datetime.combine(date.today(), time.max)
-        now = datetime.now()
-        
-        # Get all active students with their schools
-        all_students = db.query(Student).options(
-            joinedload(Student.school)
-        ).filter(Student.is_active == True).all()
+    for school_id, data in absent_by_school.items():
+        school = data['school']
+        absent_students = data['students']
+        now = data['now']
         
-        # Get students who checked in today
-        checked_in_today = db.query(CheckIn).filter(
-            CheckIn.checkin_time >= today_start,
-            CheckIn.checkin_time <= today_end
-        ).all()
+        logger.info(f"📋 School '{school.name}': {len(absent_students)} absent students")
         
-        checked_in_ids = {checkin.student_id for checkin in checked_in_today}
-        
-        # Group absent students by school
-        absent_by_school = {}
-        for student in all_students:
-            if student.id not in checked_in_ids:
-                school_id = student.school_id
-                if school_id not in absent_by_school:
-                    absent_by_school[school_id] = {
-                        'school': student.school,
-                        'students': []
-                    }
-                absent_by_school[school_id]['students'].append(student)
-        
-        if not absent_by_school:
-            logger.info("✅ All students have checked in today!")
-            return
-        
-        # Get all admin users
-        admins = db.query(User).filter(User.role == UserRole.admin).all()
-        
-        # Process each school's absent students
-        for school_id, data in absent_by_school.items():
-            school = data['school']
-            absent_students = data['students']
-            
-            logger.info(f"📋 School '{school.name}': {len(absent_students)} absent students")
-            
-            # 1. Send email to each parent
-            for student in absent_students:
-                subject = f"⚠️ ArrivApp: {student.name} no ha registrado su entrada"
-                body = f"""Hola,
+        # 1. Email to each parent
+        for student in absent_students:
+            subject = f"⚠️ ArrivApp: {student.name} no ha registrado su entrada"
+            body = f"""Hola,
 
 Te informamos que {student.name} ({student.class_name}) NO ha registrado su entrada en el colegio hoy.
 
@@ -92,16 +75,13 @@ Colegio: {school.name}
 ---
 Este es un mensaje automático de ArrivApp.
 """
-                try:
-                    await send_email(student.parent_email, subject, body)
-                    logger.info(f"  ✉️ Parent notification sent: {student.parent_email}")
-                except Exception as e:
-                    logger.error(f"  ❌ Failed to send to parent {student.parent_email}: {e}")
-            
-            # 2. Send email to school contact
-            if school.contact_email:
-                subject = f"📋 ArrivApp - Alumnos Ausentes ({school.name})"
-                body = f"""Hola,
+            key = f"{key_prefix}parent:{student.id}:{(student.parent_email or '').lower()}"
+            messages.append((key, student.parent_email, subject, body))
+        
+        # 2. Email to school contact
+        if school.contact_email:
+            subject = f"📋 ArrivApp - Alumnos Ausentes ({school.name})"
+            body = f"""Hola,
 
 Reporte de ausencias para {school.name}:
 
@@ -111,23 +91,20 @@ Hora del reporte: {now.strftime('%H:%M')}
 Alumnos que NO han registrado entrada:
 
 """
-                for student in absent_students:
-                    body += f"• {student.name} ({student.class_name}) - Email padre: {student.parent_email}\n"
-                
-                body += f"\n\nTotal: {len(absent_students)} alumnos ausentes\n\n"
-                body += "Por favor, verifica estas ausencias y contacta a los padres si es necesario.\n\n"
-                body += "---\nArrivApp Sistema de Control"
-                
-                try:
-                    await send_email(school.contact_email, subject, body)
-                    logger.info(f"  ✉️ School notification sent: {school.contact_email}")
-                except Exception as e:
-                    logger.error(f"  ❌ Failed to send school email: {e}")
+            for student in absent_students:
+                body += f"• {student.name} ({student.class_name}) - Email padre: {student.parent_email}\n"
+            
+            body += f"\n\nTotal: {len(absent_students)} alumnos ausentes\n\n"
+            body += "Por favor, verifica estas ausencias y contacta a los padres si es necesario.\n\n"
+            body += "---\nArrivApp Sistema de Control"
             
-            # 3. Send email to all admins
-            for admin in admins:
-                subject = f"📋 ArrivApp Admin - Ausencias en {school.name}"
-                body = f"""Hola Admin,
+            key = f"{key_prefix}school:{school_id}:{school.contact_email.lower()}"
+            messages.append((key, school.contact_email, subject, body))
+        
+        # 3. Email to all admins (keyed by address, so duplicate admin accounts get one copy)
+        for admin in admins:
+            subject = f"📋 ArrivApp Admin - Ausencias en {school.name}"
+            body = f"""Hola Admin,
 
 Reporte automático de ausencias:
 
@@ -138,41 +115,183 @@ Hora: {now.strftime('%H:%M')}
 Alumnos ausentes ({len(absent_students)}):
 
 """
-                for student in absent_students:
-                    body += f"• {student.name} ({student.class_name})\n"
-                    body += f"  Padre: {student.parent_email}\n"
-                    body += f"  ID Alumno: {student.student_id}\n\n"
-                
-                body += f"\nTotal: {len(absent_students)} ausentes en {school.name}\n"
-                body += "\n---\nArrivApp Admin Panel"
-                
-                try:
-                    await send_email(admin.email, subject, body)
-                    logger.info(f"  ✉️ Admin notification sent: {admin.email}")
-                except Exception as e:
-                    logger.error(f"  ❌ Failed to send admin email: {e}")
+            for student in absent_students:
+                body += f"• {student.name} ({student.class_name})\n"
+                body += f"  Padre: {student.parent_email}\n"
+                body += f"  ID Alumno: {student.student_id}\n\n"
+            
+            body += f"\nTotal: {len(absent_students)} ausentes en {school.name}\n"
+            body += "\n---\nArrivApp Admin Panel"
+            
+            key = f"{key_prefix}admin:{school_id}:{(admin.email or '').lower()}"
+            messages.append((key, admin.email, subject, body))
+    
+    return messages
+
+
+def _plan_absent_run(today: date, key_prefix: str) -> Tuple[int, bool]:
+    """Start (or resume) today's NotificationRun and enqueue the absence emails.
+
+    Blocking; runs in a worker thread. Returns the run id and whether anyone is absent.
+    """
+    db = SessionLocal()
+    run = None
+    try:
+        run = db.query(NotificationRun).filter(
+            NotificationRun.job_name == ABSENT_CHECK_JOB,
+            NotificationRun.run_date == today
+        ).first()
+        if run is None:
+            run = NotificationRun(job_name=ABSENT_CHECK_JOB, run_date=today)
+            db.add(run)
+        else:
+            logger.info(f"Resuming absent check for {today} (previous status: {run.status})")
+        run.status = "running"
+        run.started_at = datetime.utcnow()
+        run.finished_at = None
+        db.commit()
         
-        logger.info("✅ Absent notification process completed")
+        now = timeutils.utc_now()
+        
+        # Absent students grouped by school, from today's in-memory attendance state;
+        # 'now' is the school's wall-clock time for the email bodies
+        absent_by_school = {
+            school_id: {
+                'school': school, 'students': students,
+                'now': timeutils.local_time(now, timeutils.school_zone(db, school_id))
+            }
+            for school_id, (school, students) in attendance_state.absent_by_school(db, today).items()
+            if school_id is not None
+        }
+        
+        run.absent_students = sum(len(data['students']) for data in absent_by_school.values())
+        
+        if absent_by_school:
+            # Get all admin users
+            admins = db.query(User).filter(User.role == UserRole.admin).all()
+            messages = _build_absence_messages(absent_by_school, admins, key_prefix)
+            enqueued, skipped = enqueue_unique_emails(db, messages)
             
+            run.messages_planned = len(messages)
+            run.messages_enqueued = (run.messages_enqueued or 0) + enqueued
+            run.duplicates_skipped = skipped
+            logger.info(f"✉️ Queued {enqueued} absence notifications ({skipped} already queued earlier)")
+        else:
+            logger.info("✅ All students have checked in today!")
+        db.commit()
+        return run.id, bool(absent_by_school)
+    except Exception:
+        db.rollback()
+        if run is not None and run.id is not None:
+            run.status = "failed"
+            run.finished_at = datetime.utcnow()
+            db.commit()
+        raise
+    finally:
+        db.close()
+
+
+def _finish_absent_run(run_id: Optional[int], key_prefix: str, failed: bool = False):
+    """Record the outcome of today's absence fan-out on its NotificationRun. Blocking."""
+    if run_id is None:
+        return
+    db = SessionLocal()
+    try:
+        run = db.query(NotificationRun).filter(NotificationRun.id == run_id).one()
+        if failed:
+            run.status = "failed"
+        else:
+            counts = count_by_status(db, key_prefix)
+            run.sent = counts["sent"]
+            run.failed = counts["failed"]
+            run.pending = counts["pending"]
+            run.status = "completed"
+        run.finished_at = datetime.utcnow()
+        db.commit()
+        if not failed:
+            logger.info(
+                f"✅ Absent notification process completed: {run.sent} sent, "
+                f"{run.failed} failed, {run.pending} pending retry"
+            )
+    finally:
+        db.close()
+
+
+async def check_absent_students():
+    """Check for students who haven't checked in and send notifications to parents, schools, and admins.
+    
+    Every message is enqueued in the email outbox under a per-day, per-recipient
+    dedup key and then delivered concurrently, so the fan-out finishes in
+    seconds and re-running the job after a restart only sends what is missing.
+    Progress is recorded in a NotificationRun row for the day. Database work
+    runs in worker threads so the event loop keeps serving requests.
+    """
+    logger.info("Running absent students check...")
+    
+    # The school-local day, as in CheckIn.local_date (default TIMEZONE, like the cron trigger)
+    today = timeutils.local_calendar(timeutils.utc_now(), timeutils.zone(None)).local_date
+    key_prefix = _absence_key_prefix(today)
+    run_id = None
+    try:
+        run_id, anyone_absent = await asyncio.to_thread(_plan_absent_run, today, key_prefix)
+        if anyone_absent:
+            await drain_outbox(key_prefix=key_prefix)
+        await asyncio.to_thread(_finish_absent_run, run_id, key_prefix)
     except Exception as e:
         logger.error(f"Error checking absent students: {e}")
+        try:
+            await asyncio.to_thread(_finish_absent_run, run_id, key_prefix, True)
+        except Exception as record_error:
+            logger.error(f"Error recording failed absent check: {record_error}")
+
+
+def _absent_run_completed(day: date) -> bool:
+    db = SessionLocal()
+    try:
+        run = db.query(NotificationRun).filter(
+            NotificationRun.job_name == ABSENT_CHECK_JOB,
+            NotificationRun.run_date == day
+        ).first()
+        return run is not None and run.status == "completed"
     finally:
         db.close()
 
 
-async def capture_kitchen_attendance():
-    """Capture kitchen attendance snapshot at 10 AM - for meal planning."""
+async def resume_absent_check_if_needed():
+    """On startup, finish today's absent check if it was due but never completed (e.g. a restart mid-run)."""
+    try:
+        hour, minute = map(int, settings.CHECK_ABSENT_TIME.split(':'))
+    except:
+        hour, minute = 9, 10
+    
+    # Wall-clock time at the schools, the clock the cron triggers follow
+    now = timeutils.local_time(timeutils.utc_now(), timeutils.zone(None))
+    today = now.date()
+    if now < datetime.combine(today, time(hour=hour, minute=minute)):
+        return
+    if now >= datetime.combine(today, time(hour=10, minute=0)):
+        # Past the kitchen snapshot; late absence emails would only confuse parents
+        return
+    
+    if not await asyncio.to_thread(_absent_run_completed, today):
+        logger.info("Absent check for today did not complete; resuming")
+        await check_absent_students()
+
+
+def capture_kitchen_attendance():
+    """Capture kitchen attendance snapshot at 10 AM - for meal planning (runs in the scheduler's thread pool)."""
     logger.info("Capturing kitchen attendance snapshot...")
     
     db = SessionLocal()
     try:
-        today = date.today()
-        snapshot_datetime = datetime.combine(today, time(hour=10, minute=0))
-        
         # Get all schools
         schools = db.query(School).filter(School.is_active == True).all()
         
         for school in schools:
+            # The school's own calendar day, as stored in CheckIn.local_date
+            school_today = timeutils.local_calendar(timeutils.utc_now(), timeutils.zone(school.timezone)).local_date
+            snapshot_datetime = datetime.combine(school_today, time(hour=10, minute=0))
+            
             # Get all active students for this school
             all_students = db.query(Student).filter(
                 and_(
@@ -197,7 +316,7 @@ async def capture_kitchen_attendance():
                 checkins_today = db.query(CheckIn).filter(
                     and_(
                         CheckIn.student_id.in_(student_ids),
-                        func.date(CheckIn.checkin_time) == today
+                        CheckIn.local_date == school_today
                     )
                 ).all()
                 
@@ -207,7 +326,7 @@ async def capture_kitchen_attendance():
                 absences_today = db.query(AbsenceNotification).filter(
                     and_(
                         AbsenceNotification.student_id.in_(student_ids),
-                        func.date(AbsenceNotification.notification_date) == today
+                        AbsenceNotification.local_date == school_today
                     )
                 ).all()
                 
@@ -262,23 +381,118 @@ def start_scheduler():
     # Schedule absent check daily at specified time
     scheduler.add_job(
         check_absent_students,
-        trigger=CronTrigger(hour=hour, minute=minute),
-        id='check_absent_students',
+        trigger=CronTrigger(hour=hour, minute=minute, timezone=scheduler.timezone),
+        id=ABSENT_CHECK_JOB,
         name='Daily absent students check',
+        replace_existing=True,
+        misfire_grace_time=30 * 60,
+        coalesce=True
+    )
+    
+    # Pick up today's absent check if the process restarted while it was due
+    scheduler.add_job(
+        resume_absent_check_if_needed,
+        id='resume_absent_check',
+        name='Resume interrupted absent check',
+        replace_existing=True
+    )
+    
+    # Load today's attendance state now and again right after midnight
+    scheduler.add_job(
+        rebuild_attendance_state,
+        trigger=CronTrigger(hour=0, minute=0, second=30, timezone=scheduler.timezone),
+        id='rebuild_attendance_state',
+        name='Daily attendance state reset',
+        replace_existing=True,
+        coalesce=True
+    )
+    scheduler.add_job(
+        rebuild_attendance_state,
+        id='rebuild_attendance_state_startup',
+        name='Startup attendance state load',
         replace_existing=True
     )
     
     # Schedule kitchen attendance capture at 10 AM every day
     scheduler.add_job(
         capture_kitchen_attendance,
-        trigger=CronTrigger(hour=10, minute=0),
+        trigger=CronTrigger(hour=10, minute=0, timezone=scheduler.timezone),
         id='capture_kitchen_attendance',
         name='Daily kitchen attendance snapshot',
         replace_existing=True
     )
     
+    # Drain the email outbox (check-in/check-out notifications) continuously
+    scheduler.add_job(
+        dispatch_outbox,
+        trigger=IntervalTrigger(seconds=settings.OUTBOX_DISPATCH_INTERVAL_SECONDS),
+        id='dispatch_email_outbox',
+        name='Email outbox dispatcher',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Commit journaled scans to the database (only with the write-behind journal;
+    # otherwise once at startup, for scans left over from before it was disabled)
+    if settings.SCAN_JOURNAL_ENABLED:
+        scheduler.add_job(
+            replay_scan_journal,
+            trigger=IntervalTrigger(seconds=settings.SCAN_JOURNAL_REPLAY_INTERVAL_SECONDS),
+            id='replay_scan_journal',
+            name='Scan journal replayer',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+    else:
+        scheduler.add_job(
+            replay_scan_journal,
+            id='replay_scan_journal_startup',
+            name='Startup scan journal drain',
+            replace_existing=True
+        )
+    
+    # Rebuild recent days of the attendance rollup every night (and once at startup,
+    # which also backfills an empty table)
+    scheduler.add_job(
+        compact_rollup,
+        trigger=CronTrigger(hour=2, minute=30, timezone=scheduler.timezone),
+        id='compact_attendance_rollup',
+        name='Nightly attendance rollup compaction',
+        replace_existing=True,
+        coalesce=True
+    )
+    scheduler.add_job(
+        compact_rollup,
+        id='compact_attendance_rollup_startup',
+        name='Startup attendance rollup compaction',
+        replace_existing=True
+    )
+    
+    # Close the day in the per-student attendance bitmaps (and backfill them at startup)
+    scheduler.add_job(
+        close_days,
+        trigger=CronTrigger(hour=2, minute=45, timezone=scheduler.timezone),
+        id='close_attendance_bitmap_days',
+        name='Nightly attendance bitmap day close',
+        replace_existing=True,
+        coalesce=True
+    )
+    scheduler.add_job(
+        close_days,
+        id='close_attendance_bitmap_days_startup',
+        name='Startup attendance bitmap backfill',
+        replace_existing=True
+    )
+    
     logger.info(f"Scheduler started. Absent check will run daily at {hour:02d}:{minute:02d}")
     logger.info("Kitchen attendance snapshot will run daily at 10:00")
+    logger.info(f"Attendance rollup compaction will run daily at 02:30 (last {settings.ROLLUP_COMPACTION_DAYS} days)")
+    logger.info("Attendance bitmap day close will run daily at 02:45")
+    logger.info(f"Email outbox dispatcher will run every {settings.OUTBOX_DISPATCH_INTERVAL_SECONDS}s")
+    if settings.SCAN_JOURNAL_ENABLED:
+        logger.info(f"Scan journal replayer will run every {settings.SCAN_JOURNAL_REPLAY_INTERVAL_SECONDS}s")
     scheduler.start()
 
 
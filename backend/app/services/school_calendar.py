@@ -0,0 +1,114 @@
+"""
+School days per school.
+
+Attendance rates need the number of days a student was expected at school.
+Reports used to estimate it (days * 5 // 7, or 22 per month), which is wrong
+for any month with a holiday and for ranges that do not start on a Monday.
+
+The school_calendar table only stores the days that differ from the default
+week: holidays, half days, and school days on a weekend (make-up days). Every
+other day is a school day from Monday to Friday. Half days count as expected
+days.
+
+Each school's entries are loaded once per process into a SchoolCalendar, which
+keeps the running correction to the Monday-Friday count at every entry, so the
+expected days of any range are a weekday count plus two bisections. The
+calendar endpoints invalidate a school's entry when they change it.
+"""
+import threading
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Dict, Iterable, List
+from sqlalchemy.orm import Session
+from app.models.models import SchoolCalendarDay, CalendarDayType
+
+
+def weekdays_between(start: date, end: date) -> int:
+    """Monday-Friday days in [start, end]."""
+    if end < start:
+        return 0
+    weeks, rest = divmod((end - start).days + 1, 7)
+    first = start.weekday()
+    return weeks * 5 + sum(1 for offset in range(rest) if (first + offset) % 7 < 5)
+
+
+def _is_default_school_day(day: date) -> bool:
+    return day.weekday() < 5
+
+
+class SchoolCalendar:
+    """Expected school days of one school: Monday to Friday, corrected by its calendar entries."""
+
+    def __init__(self, entries: Dict[date, CalendarDayType]):
+        self.entries = entries
+        # Entries that change whether a day is a school day, sorted, with the
+        # running correction to the Monday-Friday count up to each of them
+        self._days: List[date] = []
+        self._corrections: List[int] = []
+        total = 0
+        for day in sorted(entries):
+            delta = int(entries[day] != CalendarDayType.holiday) - int(_is_default_school_day(day))
+            if delta:
+                total += delta
+                self._days.append(day)
+                self._corrections.append(total)
+
+    def is_school_day(self, day: date) -> bool:
+        day_type = self.entries.get(day)
+        if day_type is None:
+            return _is_default_school_day(day)
+        return day_type != CalendarDayType.holiday
+
+    def _correction_through(self, day: date) -> int:
+        index = bisect_right(self._days, day)
+        return self._corrections[index - 1] if index else 0
+
+    def expected_days(self, start: date, end: date) -> int:
+        """School days in [start, end]."""
+        if end < start:
+            return 0
+        return (weekdays_between(start, end)
+                + self._correction_through(end) - self._correction_through(start - timedelta(days=1)))
+
+    def school_days(self, start: date, end: date) -> List[date]:
+        """The school days in [start, end], in order."""
+        days = []
+        day = start
+        while day <= end:
+            if self.is_school_day(day):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+
+_calendars: Dict[int, SchoolCalendar] = {}
+_lock = threading.Lock()
+
+
+def get_calendars(db: Session, school_ids: Iterable[int]) -> Dict[int, SchoolCalendar]:
+    """Calendars for the given schools, loading the ones not cached yet in one query."""
+    school_ids = set(school_ids)
+    with _lock:
+        found = {school_id: _calendars[school_id] for school_id in school_ids if school_id in _calendars}
+    missing = school_ids - set(found)
+    if missing:
+        entries: Dict[int, Dict[date, CalendarDayType]] = {school_id: {} for school_id in missing}
+        for school_id, day, day_type in db.query(
+            SchoolCalendarDay.school_id, SchoolCalendarDay.date, SchoolCalendarDay.day_type
+        ).filter(SchoolCalendarDay.school_id.in_(missing)):
+            entries[school_id][day] = day_type
+        loaded = {school_id: SchoolCalendar(days) for school_id, days in entries.items()}
+        with _lock:
+            _calendars.update(loaded)
+        found.update(loaded)
+    return found
+
+
+def get_calendar(db: Session, school_id: int) -> SchoolCalendar:
+    return get_calendars(db, [school_id])[school_id]
+
+
+def invalidate_calendar(school_id: int):
+    """Drop a school's cached calendar after its entries change."""
+    with _lock:
+        _calendars.pop(school_id, None)
@@ -0,0 +1,178 @@
+"""
+Pooled SMTP connections for email_service.
+
+Opening an SMTP session costs a TCP connect, a STARTTLS handshake and an AUTH
+round-trip. The pool keeps up to SMTP_POOL_SIZE authenticated sessions open
+and sends many messages over each one, so a burst of notifications (the 9:10
+absence run, the outbox draining after the morning rush) pays for the
+handshake a handful of times instead of once per message.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from email.message import Message
+from typing import List, Optional
+import aiosmtplib
+from app.core.config import get_settings
+import logging
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Errors after which the session is considered dead and is reopened once
+RECONNECT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+)
+
+# The server refused one message (bad recipient, rejected content). aiosmtplib
+# has already sent RSET, so the session goes back to the pool.
+MESSAGE_ERRORS = (
+    aiosmtplib.SMTPRecipientsRefused,
+    aiosmtplib.SMTPRecipientRefused,
+    aiosmtplib.SMTPSenderRefused,
+    aiosmtplib.SMTPDataError,
+    aiosmtplib.SMTPNotSupported,
+    ValueError,  # An address that cannot be sent to
+)
+
+# Reply code of a server that is closing the session (RFC 5321 4.2.2)
+SERVICE_CLOSING = 421
+
+
+@dataclass
+class _PooledConnection:
+    client: aiosmtplib.SMTP
+    messages_sent: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class SMTPConnectionPool:
+    """A bounded pool of authenticated aiosmtplib sessions."""
+
+    def __init__(
+        self,
+        hostname: Optional[str],
+        port: Optional[int],
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: bool = True,
+        size: int = 4,
+        max_messages_per_connection: int = 100,
+        idle_seconds: int = 60,
+        timeout: float = 30,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.size = size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+
+        self._idle: List[_PooledConnection] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.connections_opened = 0
+
+    @classmethod
+    def from_settings(cls) -> "SMTPConnectionPool":
+        return cls(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            username=settings.SMTP_USER,
+            password=settings.SMTP_PASSWORD,
+            start_tls=settings.SMTP_START_TLS,
+            size=settings.SMTP_POOL_SIZE,
+            max_messages_per_connection=settings.SMTP_POOL_MAX_MESSAGES_PER_CONNECTION,
+            idle_seconds=settings.SMTP_POOL_IDLE_SECONDS,
+        )
+
+    def _bind_loop(self):
+        # Sessions and the semaphore belong to the loop that created them; a
+        # different loop (e.g. a one-off asyncio.run in a script) starts afresh.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            for conn in self._idle:
+                conn.client.close()
+            self._idle = []
+            self._semaphore = asyncio.Semaphore(self.size)
+            self._loop = loop
+
+    async def _connect(self) -> _PooledConnection:
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        await client.connect()
+        self.connections_opened += 1
+        return _PooledConnection(client)
+
+    async def _acquire(self) -> _PooledConnection:
+        now = time.monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if conn.client.is_connected and now - conn.last_used < self.idle_seconds:
+                return conn
+            await self._discard(conn)
+        return await self._connect()
+
+    def _release(self, conn: _PooledConnection):
+        conn.last_used = time.monotonic()
+        if conn.messages_sent >= self.max_messages_per_connection:
+            asyncio.ensure_future(self._discard(conn, polite=True))
+        else:
+            self._idle.append(conn)
+
+    async def _discard(self, conn: _PooledConnection, polite: bool = False):
+        try:
+            if polite and conn.client.is_connected:
+                await conn.client.quit()
+            else:
+                conn.client.close()
+        except Exception:
+            conn.client.close()
+
+    async def send_message(self, message: Message):
+        """Send one message over a pooled session, reconnecting once if it went stale."""
+        self._bind_loop()
+        async with self._semaphore:
+            conn = await self._acquire()
+            try:
+                try:
+                    await conn.client.send_message(message)
+                except RECONNECT_ERRORS as e:
+                    logger.info(f"SMTP session dropped ({e}); reconnecting")
+                    await self._discard(conn)
+                    conn = await self._connect()
+                    await conn.client.send_message(message)
+            except MESSAGE_ERRORS as e:
+                # Only this message failed; keep a healthy session for the next one
+                if conn.client.is_connected and getattr(e, "code", None) != SERVICE_CLOSING:
+                    conn.messages_sent += 1
+                    self._release(conn)
+                else:
+                    await self._discard(conn)
+                raise
+            except Exception:
+                await self._discard(conn)
+                raise
+            conn.messages_sent += 1
+            self._release(conn)
+
+    async def close(self):
+        """Close all idle sessions (called on application shutdown)."""
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await self._discard(conn, polite=True)
+
+
+smtp_pool = SMTPConnectionPool.from_settings()
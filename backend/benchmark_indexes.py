@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Benchmark: composite indexes on checkins / students / absence_notifications / justifications
+
+Builds a synthetic multi-year dataset, then runs the hot scan and report
+queries twice: once without the composite indexes and once after creating
+them with migrate_add_composite_indexes.py. Prints the query plan and the
+median latency of each query for both runs.
+
+Usage:
+    python benchmark_indexes.py                       # throwaway SQLite database
+    python benchmark_indexes.py --students 1500 --years 4
+    python benchmark_indexes.py --database-url postgresql://...   # EMPTY scratch database only
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import date, datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--database-url", help="Scratch database to use (default: temporary SQLite file)")
+parser.add_argument("--students", type=int, default=900)
+parser.add_argument("--years", type=int, default=3)
+parser.add_argument("--repeat", type=int, default=15)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark_indexes.db')}"
+
+from sqlalchemy import text
+from app.core.database import engine, SessionLocal
+from app.models.models import (
+    Base, School, Student, CheckIn, AbsenceNotification, Justification, JustificationType, JustificationStatus
+)
+from migrate_add_composite_indexes import COMPOSITE_INDEXES, create_indexes
+
+IS_SQLITE = engine.dialect.name == "sqlite"
+CLASSES = ["1A", "1B", "2A", "2B", "3A", "3B", "4A", "4B", "5A", "5B", "6A", "6B"]
+
+# Representative queries issued by the scan path, dashboard and report endpoints
+QUERIES = {
+    "scan: student's check-in today": (
+        "SELECT id, checkin_time, checkout_time FROM checkins "
+        "WHERE student_id = :student AND checkin_time >= :day_start AND checkin_time < :day_end"
+    ),
+    "dashboard: today's check-ins": (
+        "SELECT student_id, checkin_time, is_late FROM checkins "
+        "WHERE checkin_time >= :day_start AND checkin_time < :day_end"
+    ),
+    "report: class over one month": (
+        "SELECT count(checkins.id), sum(CASE WHEN checkins.is_late THEN 1 ELSE 0 END) FROM checkins "
+        "JOIN students ON students.id = checkins.student_id "
+        "WHERE students.school_id = :school AND students.class_name = :class_name AND students.is_active = :active "
+        "AND checkins.checkin_time >= :month_start AND checkins.checkin_time < :month_end"
+    ),
+    "report: student history, one term": (
+        "SELECT checkin_time, checkout_time, is_late FROM checkins "
+        "WHERE student_id = :student AND checkin_time >= :term_start AND checkin_time < :term_end "
+        "ORDER BY checkin_time"
+    ),
+    "roster: active students of a class": (
+        "SELECT id, name FROM students "
+        "WHERE school_id = :school AND class_name = :class_name AND is_active = :active"
+    ),
+    "absences: student in date range": (
+        "SELECT id FROM absence_notifications "
+        "WHERE student_id = :student AND notification_date >= :term_start AND notification_date < :term_end"
+    ),
+    "justifications: student in date range": (
+        "SELECT id, status FROM justifications "
+        "WHERE student_id = :student AND date >= :term_start AND date < :term_end"
+    ),
+}
+
+
+def school_days(first_day, last_day):
+    day = first_day
+    while day <= last_day:
+        if day.weekday() < 5 and day.month not in (7, 8):
+            yield day
+        day += timedelta(days=1)
+
+
+def build_dataset(student_count, years):
+    """Schools, students and `years` of school-day check-ins, absences and justifications."""
+    Base.metadata.create_all(bind=engine)
+    drop_indexes()
+
+    rng = random.Random(7)
+    db = SessionLocal()
+    try:
+        schools = [School(name=f"Benchmark School {i}") for i in range(3)]
+        db.add_all(schools)
+        db.flush()
+        db.bulk_insert_mappings(Student, [
+            {
+                "student_id": f"BENCH{i:06d}",
+                "name": f"Student {i}",
+                "class_name": CLASSES[i % len(CLASSES)],
+                "parent_email": f"parent{i}@example.test",
+                "school_id": schools[i % len(schools)].id,
+                "is_active": i % 40 != 0,
+            }
+            for i in range(student_count)
+        ])
+        db.commit()
+        student_ids = [row[0] for row in db.query(Student.id).order_by(Student.id)]
+
+        last_day = date.today()
+        first_day = last_day - timedelta(days=365 * years)
+        checkins, absences, justifications = [], [], []
+        total = 0
+        for day in school_days(first_day, last_day):
+            day_start = datetime.combine(day, datetime.min.time())
+            for student_pk in student_ids:
+                if rng.random() < 0.93:
+                    checkin_time = day_start + timedelta(hours=7, minutes=rng.randint(30, 110))
+                    checkins.append({
+                        "student_id": student_pk,
+                        "checkin_time": checkin_time,
+                        "checkout_time": checkin_time + timedelta(hours=7),
+                        "is_late": checkin_time.hour >= 9,
+                    })
+                else:
+                    absences.append({"student_id": student_pk, "notification_date": day_start + timedelta(hours=9, minutes=10)})
+                    if rng.random() < 0.5:
+                        justifications.append({
+                            "student_id": student_pk,
+                            "date": day_start,
+                            "justification_type": JustificationType.absence,
+                            "reason": "Cita médica",
+                            "submitted_by": "parent@example.test",
+                            "status": JustificationStatus.approved,
+                        })
+            if len(checkins) >= 50000:
+                total += flush(db, checkins, absences, justifications)
+        total += flush(db, checkins, absences, justifications)
+        if IS_SQLITE:
+            db.execute(text("ANALYZE"))
+            db.commit()
+        return total, schools[0].id, student_ids
+    finally:
+        db.close()
+
+
+def flush(db, checkins, absences, justifications):
+    count = len(checkins)
+    db.bulk_insert_mappings(CheckIn, checkins)
+    db.bulk_insert_mappings(AbsenceNotification, absences)
+    db.bulk_insert_mappings(Justification, justifications)
+    db.commit()
+    checkins.clear()
+    absences.clear()
+    justifications.clear()
+    return count
+
+
+def drop_indexes():
+    with engine.begin() as conn:
+        for index in COMPOSITE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+
+def query_params(school_id, student_ids):
+    today = datetime.combine(date.today(), datetime.min.time())
+    month_start = (today - timedelta(days=400)).replace(day=1)
+    return {
+        "student": student_ids[len(student_ids) // 2],
+        "school": school_id,
+        "class_name": "3A",
+        "active": True,
+        "day_start": today - timedelta(days=1),
+        "day_end": today,
+        "month_start": month_start,
+        "month_end": (month_start + timedelta(days=32)).replace(day=1),
+        "term_start": today - timedelta(days=500),
+        "term_end": today - timedelta(days=380),
+    }
+
+
+def explain(conn, sql, params):
+    prefix = "EXPLAIN QUERY PLAN " if IS_SQLITE else "EXPLAIN "
+    rows = conn.execute(text(prefix + sql), params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def measure(params, repeat):
+    results = {}
+    with engine.connect() as conn:
+        for label, sql in QUERIES.items():
+            plan = explain(conn, sql, params)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = (plan, statistics.median(timings))
+    return results
+
+
+def main():
+    print(f"\n📊 Building synthetic dataset ({args.students} students, {args.years} years) on {engine.dialect.name}...")
+    started = time.perf_counter()
+    checkin_count, school_id, student_ids = build_dataset(args.students, args.years)
+    print(f"   {checkin_count} check-ins generated in {time.perf_counter() - started:.1f}s")
+
+    params = query_params(school_id, student_ids)
+    before = measure(params, args.repeat)
+
+    print("\n🔧 Creating composite indexes...")
+    create_indexes()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    after = measure(params, args.repeat)
+
+    print("\n" + "=" * 78)
+    print("QUERY PLANS")
+    print("=" * 78)
+    for label in QUERIES:
+        print(f"\n{label}")
+        print("  before: " + "\n          ".join(before[label][0]))
+        print("  after:  " + "\n          ".join(after[label][0]))
+
+    print("\n" + "=" * 78)
+    print(f"{'MEDIAN LATENCY (ms)':40s} {'before':>10s} {'after':>10s} {'speed-up':>10s}")
+    print("=" * 78)
+    for label in QUERIES:
+        before_ms, after_ms = before[label][1], after[label][1]
+        print(f"{label:40s} {before_ms:10.2f} {after_ms:10.2f} {before_ms / after_ms if after_ms else 0:9.1f}x")
+    print()
+
+
+if __name__ == "__main__":
+    main()
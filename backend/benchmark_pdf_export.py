@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark: history PDF export, one materialized table vs streamed table chunks
+
+Builds a synthetic dataset of check-ins, then renders the history PDF for a few
+report sizes in two ways: every row fetched into a list and laid out as one
+ReportLab Table (what lifting the old 100-record cap naively would do), and
+the export's path (rows from a server-side cursor laid out in chunks of
+HISTORY_PDF_TABLE_ROWS while the document is built). Prints render time and
+peak Python memory for each.
+
+Usage:
+    python benchmark_pdf_export.py                     # throwaway SQLite database
+    python benchmark_pdf_export.py --rows 10000
+    python benchmark_pdf_export.py --database-url postgresql://...   # EMPTY scratch database only
+"""
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--database-url", help="Scratch database to use (default: temporary SQLite file)")
+parser.add_argument("--rows", type=int, default=50000, help="Largest report, in check-ins")
+parser.add_argument("--single-table-max-rows", type=int, default=20000,
+                    help="Skip the one-table rendering above this size (it grows quadratically)")
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark_pdf.db')}"
+
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table
+from app.core.database import engine, SessionLocal
+from app.models.models import Base, School, Student, CheckIn
+from app.routers.reports import (
+    _attendance_history_query, _render_pdf, HISTORY_PDF_HEADER, HISTORY_PDF_COLUMN_WIDTHS, HISTORY_TABLE_STYLE
+)
+from app.services.report_jobs import ReportSpec
+
+STUDENTS = 500
+FIRST_DAY = date(2025, 9, 1)
+
+
+def build_dataset(rows):
+    """One school of STUDENTS students, each checking in every day until `rows` check-ins exist."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        school = School(name="Benchmark School")
+        db.add(school)
+        db.flush()
+        db.bulk_insert_mappings(Student, [
+            {
+                "student_id": f"PDF{i:05d}",
+                "name": f"Student {i}",
+                "class_name": "1A",
+                "parent_email": f"parent{i}@example.test",
+                "school_id": school.id,
+            }
+            for i in range(STUDENTS)
+        ])
+        db.commit()
+        student_ids = [row[0] for row in db.query(Student.id).order_by(Student.id)]
+
+        checkins = []
+        for index in range(rows):
+            day_start = datetime.combine(FIRST_DAY + timedelta(days=index // STUDENTS), datetime.min.time())
+            checkin_time = day_start + timedelta(hours=7, minutes=index % 90)
+            checkins.append({
+                "student_id": student_ids[index % STUDENTS],
+                "checkin_time": checkin_time,
+                "checkout_time": checkin_time + timedelta(hours=7),
+                "is_late": index % 90 > 70,
+            })
+            if len(checkins) == 10000:
+                db.bulk_insert_mappings(CheckIn, checkins)
+                checkins.clear()
+        db.bulk_insert_mappings(CheckIn, checkins)
+        db.commit()
+        return school.id
+    finally:
+        db.close()
+
+
+def single_table(db, spec, out):
+    """All rows in memory, laid out as one table"""
+    data = [HISTORY_PDF_HEADER] + [
+        [
+            row.checkin_time.strftime('%Y-%m-%d'),
+            row.student_name,
+            row.school_name or '-',
+            row.checkin_time.strftime('%H:%M'),
+            row.checkout_time.strftime('%H:%M') if row.checkout_time else '-',
+            '⏰ Late' if row.is_late else '✓ On time'
+        ]
+        for row in _attendance_history_query(db, spec.school_id, spec.start_date, spec.end_date).all()
+    ]
+    SimpleDocTemplate(out, pagesize=A4).build([
+        Table(data, colWidths=HISTORY_PDF_COLUMN_WIDTHS, repeatRows=1, style=HISTORY_TABLE_STYLE)
+    ])
+
+
+def measure(render, spec):
+    """Seconds for one rendering, then peak traced memory (MB) of a second one"""
+    timings = []
+    for traced in (False, True):
+        db = SessionLocal()
+        try:
+            with tempfile.TemporaryFile() as out:
+                if traced:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                render(db, spec, out)
+                timings.append(time.perf_counter() - started)
+                if traced:
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                size = out.tell()
+        finally:
+            db.close()
+    return timings[0], peak / 1e6, size / 1e6
+
+
+def main():
+    print(f"\n📄 Building synthetic dataset ({args.rows} check-ins) on {engine.dialect.name}...")
+    school_id = build_dataset(args.rows)
+
+    print("\n" + "=" * 92)
+    print(f"{'ROWS':>8s} {'one table: s / peak MB':>28s} {'streamed chunks: s / peak MB':>32s} {'PDF MB':>10s}")
+    print("=" * 92)
+    for rows in sorted({args.rows // 10, args.rows * 2 // 5, args.rows}):
+        last_day = FIRST_DAY + timedelta(days=(rows - 1) // STUDENTS)
+        spec = ReportSpec("history", FIRST_DAY.isoformat(), last_day.isoformat(), school_id, None)
+        if rows <= args.single_table_max_rows:
+            seconds, peak, _ = measure(single_table, spec)
+            before = f"{seconds:10.1f} / {peak:8.1f}"
+        else:
+            before = "skipped"
+        seconds, peak, size = measure(_render_pdf, spec)
+        print(f"{rows:8d} {before:>28s} {seconds:20.1f} / {peak:8.1f} {size:10.1f}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /statistics and /tardiness-analysis, before and after single-query aggregation
+
+Builds a synthetic dataset (about 1M check-ins with the defaults) and the daily
+rollup, then runs the report functions for a few typical requests with the
+previous implementations (rollup reads plus separate justification and student
+counts; a per-check-in attendance matrix for tardiness) and the current ones
+(one grouped query each with conditional sums). Checks that both return the
+same results and prints database round trips and median latency.
+
+Usage:
+    python benchmark_reports.py                       # throwaway SQLite database
+    python benchmark_reports.py --students 500 --years 1
+    python benchmark_reports.py --database-url postgresql://...   # EMPTY scratch database only
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import date, datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--database-url", help="Scratch database to use (default: temporary SQLite file)")
+parser.add_argument("--students", type=int, default=1900)
+parser.add_argument("--years", type=int, default=3)
+parser.add_argument("--repeat", type=int, default=7)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark_reports.db')}"
+
+import numpy as np
+from sqlalchemy import event, text
+from app.core.database import engine, SessionLocal
+from app.models.models import Base, School, Student, CheckIn, Justification, JustificationType, JustificationStatus
+from app.services.attendance_rollup import rebuild_rollup, daily_counts, justified_count
+from app.services.attendance_analytics import (
+    load_matrix, period_statistics, tardiness_analysis, LATE_PERCENTAGE_BINS
+)
+
+IS_SQLITE = engine.dialect.name == "sqlite"
+CLASSES = ["1A", "1B", "2A", "2B", "3A", "3B", "4A", "4B", "5A", "5B", "6A", "6B"]
+
+
+def school_days(first_day, last_day):
+    day = first_day
+    while day <= last_day:
+        if day.weekday() < 5 and day.month not in (7, 8):
+            yield day
+        day += timedelta(days=1)
+
+
+def build_dataset(student_count, years):
+    """Schools, students, `years` of school-day check-ins and justifications, and the rollup."""
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(23)
+    db = SessionLocal()
+    try:
+        schools = [School(name=f"Benchmark School {i}") for i in range(3)]
+        db.add_all(schools)
+        db.flush()
+        db.bulk_insert_mappings(Student, [
+            {
+                "student_id": f"BENCH{i:06d}",
+                "name": f"Student {i}",
+                "class_name": CLASSES[i % len(CLASSES)],
+                "parent_email": f"parent{i}@example.test",
+                "school_id": schools[i % len(schools)].id,
+                "is_active": i % 40 != 0,
+            }
+            for i in range(student_count)
+        ])
+        db.commit()
+        student_ids = [row[0] for row in db.query(Student.id).order_by(Student.id)]
+
+        last_day = date.today()
+        first_day = last_day - timedelta(days=365 * years)
+        checkins, justifications = [], []
+        total = 0
+        for day in school_days(first_day, last_day):
+            day_start = datetime.combine(day, datetime.min.time())
+            for student_pk in student_ids:
+                if rng.random() < 0.93:
+                    checkin_time = day_start + timedelta(hours=7, minutes=rng.randint(0, 90))
+                    checkins.append({
+                        "student_id": student_pk,
+                        "checkin_time": checkin_time,
+                        "checkout_time": checkin_time + timedelta(hours=7) if rng.random() < 0.9 else None,
+                        "is_late": checkin_time.hour >= 8 and checkin_time.minute > 10,
+                    })
+                elif rng.random() < 0.5:
+                    justifications.append({
+                        "student_id": student_pk,
+                        "date": day_start,
+                        "justification_type": JustificationType.absence,
+                        "reason": "Cita médica",
+                        "submitted_by": "parent@example.test",
+                        "status": JustificationStatus.approved,
+                    })
+            if len(checkins) >= 50000:
+                total += flush(db, checkins, justifications)
+        total += flush(db, checkins, justifications)
+
+        rebuild_rollup(db)
+        db.commit()
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        return total, schools[0].id
+    finally:
+        db.close()
+
+
+def flush(db, checkins, justifications):
+    count = len(checkins)
+    db.bulk_insert_mappings(CheckIn, checkins)
+    db.bulk_insert_mappings(Justification, justifications)
+    db.commit()
+    checkins.clear()
+    justifications.clear()
+    return count
+
+
+def previous_statistics(db, period, start, end, school_id=None, class_name=None):
+    """/statistics before this change: rollup days, then justification and student counts."""
+    days = daily_counts(db, start, end, school_id, class_name)
+    present = sum(counts["present"] for counts in days.values())
+    late = sum(counts["late"] for counts in days.values())
+    checked_out = sum(counts["checked_out"] for counts in days.values())
+    justified = justified_count(db, start.date(), end.date(), school_id, class_name)
+    student_query = db.query(Student).filter(Student.is_active == True)
+    if school_id:
+        student_query = student_query.filter(Student.school_id == school_id)
+    if class_name:
+        student_query = student_query.filter(Student.class_name == class_name)
+    total_students = student_query.count()
+    return {
+        "period": period,
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": end.strftime("%Y-%m-%d"),
+        "total_students": total_students,
+        "total_attendance": present,
+        "present": present,
+        "late": late,
+        "checked_out": checked_out,
+        "justified": justified,
+        "attendance_rate": round((present / total_students * 100) if total_students > 0 else 0, 2),
+        "late_rate": round((late / present * 100) if present > 0 else 0, 2),
+        "daily_breakdown": [
+            {"date": str(day), "total": counts["present"], "late": counts["late"]}
+            for day, counts in days.items()
+        ]
+    }
+
+
+def previous_tardiness(db, start, end, school_id=None, class_name=None):
+    """/tardiness-analysis before this change: every check-in row loaded into the attendance matrix."""
+    matrix = load_matrix(db, start.date(), end.date(), school_id, class_name)
+    present = matrix.present[matrix.class_mask]
+    late = matrix.late[matrix.class_mask]
+    names = [name for name, keep in zip(matrix.names, matrix.class_mask) if keep]
+    student_ids = matrix.student_ids[matrix.class_mask]
+
+    totals = present.sum(axis=1)
+    late_counts = late.sum(axis=1)
+    attending = np.flatnonzero(totals > 0)
+    late_percentages = np.round(late_counts[attending] / totals[attending] * 100, 2)
+    order = np.lexsort((student_ids[attending], -late_percentages))
+    students = [
+        {
+            "student_id": int(student_ids[attending[index]]),
+            "student_name": names[attending[index]],
+            "total_attendance": int(totals[attending[index]]),
+            "late_count": int(late_counts[attending[index]]),
+            "late_percentage": float(late_percentages[index])
+        }
+        for index in order
+    ]
+    counts, _ = np.histogram(late_percentages, bins=LATE_PERCENTAGE_BINS)
+
+    weekly = {}
+    for day, day_total, day_late in zip(matrix.days(), present.sum(axis=0), late.sum(axis=0)):
+        year, week, _ = day.isocalendar()
+        totals_of_week = weekly.setdefault(f"{year:04d}-W{week:02d}", [0, 0])
+        totals_of_week[0] += int(day_total)
+        totals_of_week[1] += int(day_late)
+    return {
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": end.strftime("%Y-%m-%d"),
+        "top_tardy_students": students[:20],
+        "late_distribution": [
+            {"range": f"{low}-{high}%", "students": int(count)}
+            for low, high, count in zip(LATE_PERCENTAGE_BINS, LATE_PERCENTAGE_BINS[1:], counts)
+        ],
+        "weekly_trends": [
+            {
+                "week": week,
+                "total": total,
+                "late": late_total,
+                "late_percentage": round((late_total / total * 100) if total > 0 and late_total else 0, 2)
+            }
+            for week, (total, late_total) in sorted(weekly.items())
+            if total > 0
+        ]
+    }
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def measure(function, params, repeat):
+    """Round trips of one call and median latency over `repeat` calls."""
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    timings = []
+    try:
+        for _ in range(repeat):
+            db = SessionLocal()
+            try:
+                counter.count = 0
+                started = time.perf_counter()
+                result = function(db, *params)
+                timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                db.close()
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+    return result, counter.count, statistics.median(timings)
+
+
+def scenarios(school_id):
+    now = datetime.utcnow().replace(microsecond=0)
+    today = datetime.combine(date.today(), datetime.min.time())
+    month_start = (today - timedelta(days=60)).replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(seconds=1)
+    year_start = today - timedelta(days=365)
+    return {
+        "weekly default, all schools": (now - timedelta(days=7), now, None, None),
+        "monthly default, one school": (now - timedelta(days=30), now, school_id, None),
+        "one class, one month": (month_start, month_end, school_id, "3A"),
+        "one school, one year": (year_start, today.replace(hour=23, minute=59, second=59), school_id, None),
+    }
+
+
+def main():
+    print(f"\n📊 Building synthetic dataset ({args.students} students, {args.years} years) on {engine.dialect.name}...")
+    started = time.perf_counter()
+    checkin_count, school_id = build_dataset(args.students, args.years)
+    print(f"   {checkin_count} check-ins generated in {time.perf_counter() - started:.1f}s")
+
+    endpoints = {
+        "/statistics": (
+            lambda db, *params: previous_statistics(db, "weekly", *params),
+            lambda db, *params: period_statistics(db, "weekly", *params),
+        ),
+        "/tardiness-analysis": (previous_tardiness, tardiness_analysis),
+    }
+
+    print("\n" + "=" * 96)
+    print(f"{'REQUEST':50s} {'round trips':>14s} {'median ms (before → after)':>30s}")
+    print("=" * 96)
+    for endpoint, (before_function, after_function) in endpoints.items():
+        print(endpoint)
+        for label, params in scenarios(school_id).items():
+            before, before_queries, before_ms = measure(before_function, params, args.repeat)
+            after, after_queries, after_ms = measure(after_function, params, args.repeat)
+            assert before == after, f"{endpoint} / {label}: results differ"
+            speed_up = before_ms / after_ms if after_ms else 0
+            print(f"  {label:48s} {before_queries:6d} → {after_queries:<5d} "
+                  f"{before_ms:10.1f} → {after_ms:8.1f}  ({speed_up:.1f}x)")
+    print("\n✓ Before and after return identical results\n")
+
+
+if __name__ == "__main__":
+    main()
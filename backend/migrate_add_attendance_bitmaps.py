@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Migration: Add AttendanceBitmap table (per-student, per-school-year day bitsets)
+This script creates the attendance_bitmaps table if it doesn't exist and fills it
+from existing check-ins and approved absence justifications. Safe to re-run: the
+backfill replaces every row.
+"""
+
+from sqlalchemy import inspect
+from app.core.database import engine, SessionLocal
+from app.models.models import Base, AttendanceBitmap
+from app.services.attendance_bitmaps import rebuild_bitmaps
+
+
+def create_table():
+    """Create the AttendanceBitmap table"""
+    inspector = inspect(engine)
+
+    if "attendance_bitmaps" in inspector.get_table_names():
+        print("✓ attendance_bitmaps table already exists")
+        return
+
+    print("Creating attendance_bitmaps table...")
+    Base.metadata.create_all(engine, tables=[AttendanceBitmap.__table__])
+    print("✓ attendance_bitmaps table created successfully")
+
+
+def backfill():
+    """Build every student's bitmaps from raw data"""
+    db = SessionLocal()
+    try:
+        rows = rebuild_bitmaps(db)
+        db.commit()
+        print(f"✓ Bitmaps built for {rows} student-years")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("\n🔄 Starting migration: Add AttendanceBitmap table...")
+    create_table()
+    backfill()
+    print("\n✓ Migration completed!\n")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Migration: Add DailyAttendanceRollup table used by the report endpoints
+This script creates the daily_attendance_rollup table if it doesn't exist and
+backfills it from the existing check-ins and justifications.
+"""
+
+from sqlalchemy import inspect
+from app.core.database import engine, SessionLocal
+from app.models.models import Base, DailyAttendanceRollup
+from app.services.attendance_rollup import rebuild_rollup
+
+
+def create_table():
+    """Create the DailyAttendanceRollup table"""
+    inspector = inspect(engine)
+    
+    if "daily_attendance_rollup" in inspector.get_table_names():
+        print("✓ daily_attendance_rollup table already exists")
+        return
+    
+    print("Creating daily_attendance_rollup table...")
+    Base.metadata.create_all(engine, tables=[DailyAttendanceRollup.__table__])
+    print("✓ daily_attendance_rollup table created successfully")
+
+
+def backfill():
+    """Rebuild every rollup row from raw data (safe to re-run)"""
+    db = SessionLocal()
+    try:
+        print("Backfilling daily_attendance_rollup...")
+        rows = rebuild_rollup(db)
+        db.commit()
+        print(f"✓ {rows} rollup rows written")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("\n🔄 Starting migration: Add DailyAttendanceRollup table...")
+    create_table()
+    backfill()
+    print("\n✓ Migration completed!\n")
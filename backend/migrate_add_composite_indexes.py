@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Migration: Add composite indexes for the date-range report and scan queries
+Creates (if missing):
+  - checkins (student_id, checkin_time) and checkins (checkin_time)
+  - students (school_id, class_name, is_active)
+  - absence_notifications (student_id, notification_date)
+  - justifications (student_id, date)
+Safe to re-run.
+"""
+
+from sqlalchemy import inspect
+from app.core.database import engine
+from app.models.models import Student, CheckIn, AbsenceNotification, Justification
+
+INDEX_NAMES = [
+    "ix_checkins_student_id_checkin_time",
+    "ix_checkins_checkin_time",
+    "ix_students_school_class_active",
+    "ix_absence_notifications_student_id_date",
+    "ix_justifications_student_id_date",
+]
+
+COMPOSITE_INDEXES = [
+    index
+    for model in (CheckIn, Student, AbsenceNotification, Justification)
+    for index in model.__table__.indexes
+    if index.name in INDEX_NAMES
+]
+
+
+def create_indexes():
+    """Create each composite index that does not exist yet"""
+    inspector = inspect(engine)
+    
+    for index in COMPOSITE_INDEXES:
+        table = index.table.name
+        existing = {ix["name"] for ix in inspector.get_indexes(table)}
+        if index.name in existing:
+            print(f"✓ {index.name} already exists")
+            continue
+        
+        print(f"Creating {index.name} on {table} ({', '.join(c.name for c in index.columns)})...")
+        index.create(engine)
+        print(f"✓ {index.name} created")
+
+
+if __name__ == "__main__":
+    print("\n🔄 Starting migration: Add composite indexes...")
+    create_indexes()
+    print("\n✓ Migration completed!\n")
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Migration: Add EmailOutbox table used to deliver notification emails in the background
+This script creates the email_outbox table if it doesn't exist.
+"""
+
+from sqlalchemy import inspect
+from app.core.database import engine
+from app.models.models import Base, EmailOutbox
+
+
+def create_table():
+    """Create the EmailOutbox table"""
+    inspector = inspect(engine)
+    
+    if "email_outbox" in inspector.get_table_names():
+        print("✓ email_outbox table already exists")
+        return
+    
+    print("Creating email_outbox table...")
+    Base.metadata.create_all(engine, tables=[EmailOutbox.__table__])
+    print("✓ email_outbox table created successfully")
+
+
+if __name__ == "__main__":
+    print("\n🔄 Starting migration: Add EmailOutbox table...")
+    create_table()
+    print("\n✓ Migration completed!\n")
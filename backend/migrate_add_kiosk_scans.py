@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Migration: Add KioskScan table used to make kiosk batch syncs idempotent, and
+KioskDevice, which bounds each batch to the kiosk's offline window
+This script creates the kiosk_scans and kiosk_devices tables if they don't exist.
+"""
+
+from sqlalchemy import inspect
+from app.core.database import engine
+from app.models.models import Base, KioskScan, KioskDevice
+
+
+def create_tables():
+    """Create the KioskScan and KioskDevice tables"""
+    existing = inspect(engine).get_table_names()
+    
+    for model in (KioskScan, KioskDevice):
+        table = model.__tablename__
+        if table in existing:
+            print(f"✓ {table} table already exists")
+            continue
+        print(f"Creating {table} table...")
+        Base.metadata.create_all(engine, tables=[model.__table__])
+        print(f"✓ {table} table created successfully")
+
+
+if __name__ == "__main__":
+    print("\n🔄 Starting migration: Add KioskScan and KioskDevice tables...")
+    create_tables()
+    print("\n✓ Migration completed!\n")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Migration: Add school-local local_date / iso_week / weekday columns to
+checkins and absence_notifications
+Reports group on these plain indexed columns instead of date functions on the
+timestamps (see app/core/timeutils.py).
+
+Steps (safe to re-run):
+  1. Add the columns if missing
+  2. Backfill rows where local_date is NULL from checkin_time / notification_date
+     in the timezone of the student's school
+  3. Create the indexes (and make the columns NOT NULL on PostgreSQL)
+  4. Rebuild the attendance rollup, whose days are now school-local
+
+After changing a school's timezone, run with --recompute to refill every row.
+Run migrate_unique_checkin_local_date.py afterwards for the one-check-in-per-day index.
+
+Usage:
+    python migrate_add_local_calendar_columns.py [--recompute]
+"""
+import sys
+from datetime import datetime
+from sqlalchemy import inspect, text
+from app.core.database import engine, SessionLocal
+from app.core import timeutils
+from app.models.models import CheckIn, AbsenceNotification
+from app.services.attendance_rollup import rebuild_rollup
+
+COLUMNS = (("local_date", "DATE"), ("iso_week", "VARCHAR(8)"), ("weekday", "INTEGER"))
+TABLES = ((CheckIn, "checkin_time"), (AbsenceNotification, "notification_date"))
+CHUNK_ROWS = 5000
+
+
+def add_columns(table):
+    """Add the calendar columns to one table"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table)}
+    with engine.begin() as conn:
+        for name, sql_type in COLUMNS:
+            if name in existing:
+                print(f"✓ {table}.{name} already exists")
+                continue
+            print(f"Adding {table}.{name}...")
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}"))
+
+
+def backfill(model, timestamp_column, recompute=False):
+    """Fill the calendar columns from the timestamp, CHUNK_ROWS rows per transaction"""
+    table = model.__tablename__
+    pending = "" if recompute else "AND local_date IS NULL"
+    last_id = 0
+    updated = 0
+    with engine.connect() as conn:
+        while True:
+            rows = conn.execute(text(
+                f"SELECT id, student_id, {timestamp_column} FROM {table} "
+                f"WHERE id > :last_id {pending} ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": CHUNK_ROWS}).fetchall()
+            if not rows:
+                break
+            params = []
+            for row_id, student_pk, moment in rows:
+                if isinstance(moment, str):  # SQLite without type information
+                    moment = datetime.fromisoformat(moment)
+                fields = timeutils.local_calendar(moment, timeutils.student_zone(conn, student_pk))
+                params.append({
+                    "id": row_id, "local_date": fields.local_date,
+                    "iso_week": fields.iso_week, "weekday": fields.weekday
+                })
+            conn.execute(text(
+                f"UPDATE {table} SET local_date = :local_date, iso_week = :iso_week, weekday = :weekday "
+                f"WHERE id = :id"
+            ), params)
+            conn.commit()
+            updated += len(rows)
+            last_id = rows[-1][0]
+    print(f"✓ {table}: calendar columns filled on {updated} rows")
+
+
+def create_indexes(model):
+    """Create the calendar indexes of one table"""
+    table = model.__tablename__
+    existing = {ix["name"] for ix in inspect(engine).get_indexes(table)}
+    for index in model.__table__.indexes:
+        if not any(column.name in ("local_date", "iso_week") for column in index.columns):
+            continue
+        if index.unique:  # merges duplicates first: migrate_unique_checkin_local_date.py
+            continue
+        if index.name in existing:
+            print(f"✓ {index.name} already exists")
+            continue
+        print(f"Creating {index.name}...")
+        index.create(engine)
+        print(f"✓ {index.name} created")
+
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for name, _ in COLUMNS:
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {name} SET NOT NULL"))
+
+
+def rebuild_days():
+    """Recompute the rollup, now keyed on school-local days"""
+    db = SessionLocal()
+    try:
+        rows = rebuild_rollup(db)
+        db.commit()
+        print(f"✓ Rollup rebuilt ({rows} rows)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    recompute = "--recompute" in sys.argv
+    print("\n🔄 Starting migration: Add school-local calendar columns...")
+    for model, timestamp_column in TABLES:
+        add_columns(model.__tablename__)
+        backfill(model, timestamp_column, recompute=recompute)
+        create_indexes(model)
+    rebuild_days()
+    print("\n✓ Migration completed!\n")
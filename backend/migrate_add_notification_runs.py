@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Migration: Add NotificationRun table and EmailOutbox.dedup_key column
+Used by the 9:10 absence check to record a summary per run and to avoid
+notifying the same recipient twice when the job is resumed.
+"""
+
+from sqlalchemy import inspect, text
+from app.core.database import engine
+from app.models.models import Base, NotificationRun
+
+
+def create_table():
+    """Create the NotificationRun table"""
+    inspector = inspect(engine)
+    
+    if "notification_runs" in inspector.get_table_names():
+        print("✓ notification_runs table already exists")
+        return
+    
+    print("Creating notification_runs table...")
+    Base.metadata.create_all(engine, tables=[NotificationRun.__table__])
+    print("✓ notification_runs table created successfully")
+
+
+def add_dedup_key():
+    """Add the dedup_key column and its unique index to email_outbox"""
+    inspector = inspect(engine)
+    
+    if "email_outbox" not in inspector.get_table_names():
+        print("⚠️  email_outbox table missing; run migrate_add_email_outbox.py first")
+        return
+    
+    columns = [column["name"] for column in inspector.get_columns("email_outbox")]
+    if "dedup_key" in columns:
+        print("✓ email_outbox.dedup_key already exists")
+        return
+    
+    print("Adding email_outbox.dedup_key...")
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE email_outbox ADD COLUMN dedup_key VARCHAR"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_email_outbox_dedup_key ON email_outbox (dedup_key)"
+        ))
+    print("✓ email_outbox.dedup_key added successfully")
+
+
+if __name__ == "__main__":
+    print("\n🔄 Starting migration: Add NotificationRun table and outbox dedup keys...")
+    create_table()
+    add_dedup_key()
+    print("\n✓ Migration completed!\n")
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Migration: Add SchoolCalendarDay table (per-school holidays, half days and make-up days)
+This script creates the school_calendar table if it doesn't exist. Days without an
+entry follow the Monday-Friday default, so no backfill is needed.
+"""
+
+from sqlalchemy import inspect
+from app.core.database import engine
+from app.models.models import Base, SchoolCalendarDay
+
+
+def create_table():
+    """Create the SchoolCalendarDay table"""
+    inspector = inspect(engine)
+    
+    if "school_calendar" in inspector.get_table_names():
+        print("✓ school_calendar table already exists")
+        return
+    
+    print("Creating school_calendar table...")
+    Base.metadata.create_all(engine, tables=[SchoolCalendarDay.__table__])
+    print("✓ school_calendar table created successfully")
+
+
+if __name__ == "__main__":
+    print("\n🔄 Starting migration: Add SchoolCalendarDay table...")
+    create_table()
+    print("\n✓ Migration completed!\n")
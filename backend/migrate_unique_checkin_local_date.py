@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Migration: Unique (student_id, local_date) index on checkins
+The scan endpoint relies on this index to make check-in creation atomic. It
+keys on the school-local day reports count, so run it after
+migrate_add_local_calendar_columns.py.
+
+Steps (safe to re-run):
+  1. Merge duplicate check-ins of the same student on the same local day into
+     the earliest one (keeping the latest checkout and the email_sent flag),
+     re-pointing email_outbox / kiosk_scans rows at it
+  2. Rebuild the attendance rollup and bitmaps for the days that had duplicates
+  3. Drop the earlier UTC-day key (uq_checkins_student_id_checkin_date and the
+     checkins.checkin_date column) if present
+  4. Create uq_checkins_student_id_local_date
+"""
+import sys
+from collections import defaultdict
+from sqlalchemy import inspect, text, func
+from app.core.database import engine, SessionLocal
+from app.models.models import CheckIn, EmailOutbox, KioskScan
+from app.services.attendance_rollup import rebuild_rollup
+from app.services import attendance_bitmaps
+
+INDEX_NAME = "uq_checkins_student_id_local_date"
+OLD_INDEX_NAME = "uq_checkins_student_id_checkin_date"
+
+
+def merge_duplicates():
+    """Keep one check-in per student and local day. Returns the (student, day) pairs that changed."""
+    db = SessionLocal()
+    try:
+        duplicated = db.query(CheckIn.student_id, CheckIn.local_date).group_by(
+            CheckIn.student_id, CheckIn.local_date
+        ).having(func.count(CheckIn.id) > 1).all()
+        if not duplicated:
+            print("✓ No duplicate check-ins")
+            return set()
+
+        print(f"Found {len(duplicated)} student-days with duplicate check-ins")
+        tables = set(inspect(engine).get_table_names())
+        referencing_models = [model for model in (EmailOutbox, KioskScan) if model.__tablename__ in tables]
+        keys = {(student_id, day) for student_id, day in duplicated}
+        student_ids = {student_id for student_id, _ in keys}
+        groups = defaultdict(list)
+        for checkin in db.query(CheckIn).filter(CheckIn.student_id.in_(student_ids)).order_by(
+            CheckIn.checkin_time, CheckIn.id
+        ):
+            if (checkin.student_id, checkin.local_date) in keys:
+                groups[(checkin.student_id, checkin.local_date)].append(checkin)
+
+        removed = 0
+        for checkins in groups.values():
+            keeper, extras = checkins[0], checkins[1:]
+            checkouts = [checkin.checkout_time for checkin in checkins if checkin.checkout_time]
+            keeper.checkout_time = max(checkouts) if checkouts else None
+            keeper.email_sent = any(checkin.email_sent for checkin in checkins)
+            extra_ids = [checkin.id for checkin in extras]
+            for model in referencing_models:
+                db.query(model).filter(model.checkin_id.in_(extra_ids)).update(
+                    {model.checkin_id: keeper.id}, synchronize_session=False
+                )
+            for checkin in extras:
+                db.delete(checkin)
+            removed += len(extras)
+
+        db.commit()
+        print(f"✓ Removed {removed} duplicate check-ins")
+        return set(groups)
+    finally:
+        db.close()
+
+
+def rebuild_days(student_days):
+    """Recompute rollup rows and bitmaps for the days whose check-ins were merged"""
+    if not student_days:
+        return
+    days = sorted({day for _, day in student_days})
+    by_student = defaultdict(set)
+    for student_pk, day in student_days:
+        by_student[student_pk].add(day)
+    db = SessionLocal()
+    try:
+        rows = sum(rebuild_rollup(db, day, day) for day in days)
+        if "attendance_bitmaps" in inspect(engine).get_table_names():
+            for student_pk, student_dates in by_student.items():
+                attendance_bitmaps.refresh(db, student_pk, student_dates)
+        db.commit()
+        print(f"✓ Rollup rebuilt for {len(days)} days ({rows} rows)")
+    finally:
+        db.close()
+
+
+def drop_utc_day_key():
+    """Drop the unique index and column of the earlier UTC-day key"""
+    existing = {ix["name"] for ix in inspect(engine).get_indexes("checkins")}
+    columns = {column["name"] for column in inspect(engine).get_columns("checkins")}
+    with engine.begin() as conn:
+        if OLD_INDEX_NAME in existing:
+            print(f"Dropping {OLD_INDEX_NAME}...")
+            conn.execute(text(f"DROP INDEX {OLD_INDEX_NAME}"))
+        if "checkin_date" in columns:
+            print("Dropping checkins.checkin_date...")
+            conn.execute(text("ALTER TABLE checkins DROP COLUMN checkin_date"))
+    print("✓ No UTC-day key left")
+
+
+def create_index():
+    """Create the unique index once duplicates are gone"""
+    existing = {ix["name"] for ix in inspect(engine).get_indexes("checkins")}
+    if INDEX_NAME in existing:
+        print(f"✓ {INDEX_NAME} already exists")
+        return
+    print(f"Creating {INDEX_NAME}...")
+    index = next(index for index in CheckIn.__table__.indexes if index.name == INDEX_NAME)
+    index.create(engine)
+    print(f"✓ {INDEX_NAME} created")
+
+
+if __name__ == "__main__":
+    print("\n🔄 Starting migration: Unique check-in per school-local day...")
+    columns = {column["name"] for column in inspect(engine).get_columns("checkins")}
+    if "local_date" not in columns:
+        print("✗ checkins.local_date is missing; run migrate_add_local_calendar_columns.py first")
+        sys.exit(1)
+    rebuild_days(merge_duplicates())
+    drop_utc_day_key()
+    create_index()
+    print("\n✓ Migration completed!\n")
@@ -200,6 +200,7 @@ async function fetchDashboardData() {
         }
         
         dashboardData = await apiRequest(url);
+        dashboardVersion = null;  // unknown for a plain snapshot; the next delta poll resyncs
         
         // Fetch justifications for the selected date
         try {
@@ -224,6 +225,179 @@ async function fetchDashboardData() {
     }
 }
 
+// Live updates: the dashboard keeps a local copy of the snapshot and applies
+// scan events pushed by /api/checkin/stream. Polling is only used when the
+// stream is unavailable.
+const FALLBACK_POLL_INTERVAL_MS = 5000;
+const SNAPSHOT_REFRESH_INTERVAL_MS = 5 * 60 * 1000;
+let liveSource = null;
+let dashboardVersion = null;  // version of dashboardData for /dashboard/changes
+let fallbackPollTimer = null;
+
+function isViewingToday() {
+    return document.getElementById('date-picker').value === formatDate(new Date());
+}
+
+// "2025-11-22T08:59:12.123456" -> "22/11/2025 08:59:12" (same format as /dashboard)
+function formatScanTime(isoString) {
+    const [datePart, timePart] = isoString.split('T');
+    const [year, month, day] = datePart.split('-');
+    return `${day}/${month}/${year} ${timePart.substring(0, 8)}`;
+}
+
+// Apply one change in the /api/checkin/dashboard/changes format (times already
+// formatted like the snapshot). Applying the same change twice is harmless.
+function applyDashboardChange(change) {
+    if (change.type === 'checkin') {
+        if (dashboardData.checkins.some(c => c.student_id === change.student_id)) return;
+        
+        const absentIndex = dashboardData.absent_students.findIndex(s => s.id === change.student_id);
+        const absent = absentIndex >= 0 ? dashboardData.absent_students.splice(absentIndex, 1)[0] : null;
+        const schoolName = absent ? absent.school_name : '';
+        
+        dashboardData.checkins.push({
+            student_id: change.student_id,
+            checkin_time: change.checkin_time,
+            student_name: change.student_name,
+            school_name: schoolName,
+            checkout_time: null
+        });
+        dashboardData.stats.total_present += 1;
+        if (absent) {
+            dashboardData.stats.total_absent -= 1;
+        }
+        if (change.is_late) {
+            dashboardData.late_students.push({
+                student_id: change.student_id,
+                name: change.student_name,
+                time: change.checkin_time,
+                school_name: schoolName,
+                email_sent: false
+            });
+            dashboardData.stats.total_late += 1;
+        }
+    } else if (change.type === 'checkout') {
+        const checkin = dashboardData.checkins.find(c => c.student_id === change.student_id);
+        if (checkin) {
+            checkin.checkout_time = change.checkout_time;
+        }
+    } else if (change.type === 'email_sent') {
+        const late = dashboardData.late_students.find(s => s.student_id === change.student_id);
+        if (late) {
+            late.email_sent = change.email_sent;
+        }
+    }
+}
+
+function showUpdatedNow() {
+    const now = new Date();
+    document.getElementById('lastUpdated').textContent = 
+        `Última actualización: ${now.toLocaleTimeString('es-ES', { hour: '2-digit', minute: '2-digit' })}`;
+}
+
+function applyScanEvent(event) {
+    if (!dashboardData || !isViewingToday()) return;
+    
+    applyDashboardChange({
+        ...event,
+        checkin_time: formatScanTime(event.checkin_time),
+        checkout_time: event.checkout_time ? formatScanTime(event.checkout_time) : null
+    });
+    renderDashboard();
+    showUpdatedNow();
+}
+
+// Fallback polling: only ask for what changed since the last applied version
+async function pollDashboardChanges() {
+    if (!isViewingToday()) {
+        return fetchDashboardData();
+    }
+    
+    const classFilter = document.getElementById('class-filter')?.value || '';
+    const schoolFilter = document.getElementById('school-filter')?.value || '';
+    const since = dashboardData && dashboardVersion !== null ? dashboardVersion : 0;
+    let url = `/api/checkin/dashboard/changes?since=${since}`;
+    if (classFilter) {
+        url += `&class_filter=${encodeURIComponent(classFilter)}`;
+    }
+    if (schoolFilter) {
+        url += `&school_id=${schoolFilter}`;
+    }
+    
+    try {
+        const result = await apiRequest(url);
+        if (result.full) {
+            dashboardData = result.snapshot;
+        } else {
+            result.changes.forEach(applyDashboardChange);
+            dashboardData.absent_students.forEach(s => { s.email_sent = result.absent_email_sent; });
+        }
+        dashboardVersion = result.version;
+        renderDashboard();
+        showUpdatedNow();
+    } catch (error) {
+        console.error('Error fetching dashboard changes:', error);
+    }
+}
+
+function startFallbackPolling() {
+    if (!fallbackPollTimer) {
+        fallbackPollTimer = setInterval(pollDashboardChanges, FALLBACK_POLL_INTERVAL_MS);
+    }
+}
+
+function stopFallbackPolling() {
+    if (fallbackPollTimer) {
+        clearInterval(fallbackPollTimer);
+        fallbackPollTimer = null;
+    }
+}
+
+// (Re)connect the stream for the current class/school filters.
+// The snapshot is fetched once the stream is ready so no scan is missed in between.
+function connectLiveUpdates() {
+    if (liveSource) {
+        liveSource.close();
+        liveSource = null;
+    }
+    
+    if (typeof EventSource === 'undefined') {
+        fetchDashboardData();
+        startFallbackPolling();
+        return;
+    }
+    
+    const classFilter = document.getElementById('class-filter')?.value || '';
+    const schoolFilter = document.getElementById('school-filter')?.value || '';
+    let url = `${API_BASE_URL}/api/checkin/stream?token=${encodeURIComponent(token)}`;
+    if (classFilter) {
+        url += `&class_filter=${encodeURIComponent(classFilter)}`;
+    }
+    if (schoolFilter) {
+        url += `&school_id=${schoolFilter}`;
+    }
+    
+    const source = new EventSource(url);
+    liveSource = source;
+    
+    const resync = () => {
+        stopFallbackPolling();
+        fetchDashboardData();
+    };
+    source.addEventListener('ready', resync);
+    source.addEventListener('resync', resync);
+    source.addEventListener('checkin', (e) => applyScanEvent(JSON.parse(e.data)));
+    source.addEventListener('checkout', (e) => applyScanEvent(JSON.parse(e.data)));
+    source.onerror = () => {
+        // The browser reconnects on its own (and gets a new `ready`);
+        // keep the screen fresh by polling until it does
+        startFallbackPolling();
+        if (source.readyState === EventSource.CLOSED && liveSource === source) {
+            liveSource = null;
+        }
+    };
+}
+
 // Render dashboard
 function renderDashboard() {
     if (!dashboardData) return;
@@ -491,12 +665,13 @@ document.addEventListener('DOMContentLoaded', () => {
     // Load classes dropdown
     loadClasses();
     
-    // Initial load
-    fetchDashboardData();
+    // Initial load: the stream fetches the snapshot once connected
+    connectLiveUpdates();
     updateClock();
     
-    // Auto-refresh every 5 seconds for faster updates
-    setInterval(fetchDashboardData, 5000);
+    // Scan events arrive over the stream; a periodic snapshot picks up
+    // anything that is not a scan (new students, 9:10 email status, justifications)
+    setInterval(fetchDashboardData, SNAPSHOT_REFRESH_INTERVAL_MS);
     setInterval(updateClock, 1000);
     
     // Check for date change at midnight
@@ -537,14 +712,14 @@ document.addEventListener('DOMContentLoaded', () => {
     });
     
     classFilter.addEventListener('change', () => {
-        fetchDashboardData();
+        connectLiveUpdates();
     });
     
     // School filter event listener (for admin)
     const schoolFilter = document.getElementById('school-filter');
     if (schoolFilter) {
         schoolFilter.addEventListener('change', () => {
-            fetchDashboardData();
+            connectLiveUpdates();
         });
     }
     
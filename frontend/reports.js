@@ -283,9 +283,12 @@ async function generateStatistics(startDate, endDate, schoolId, className) {
     createAttendanceDistChart(data);
 }
 
+// Keyset pagination state for the history table
+let historyBaseUrl = null;
+let historyNextCursor = null;
+
 async function generateHistory(startDate, endDate, schoolId, className) {
     try {
-        const token = localStorage.getItem('arrivapp_token');
         let url = `${API_URL}/reports/attendance-history?start_date=${startDate}&end_date=${endDate}`;
         if (schoolId) {
             url += `&school_id=${schoolId}`;
@@ -294,51 +297,21 @@ async function generateHistory(startDate, endDate, schoolId, className) {
             url += `&class_name=${encodeURIComponent(className)}`;
         }
 
-        const response = await fetch(url, {
-            headers: {
-                'Authorization': `Bearer ${token}`
-            }
-        });
+        historyBaseUrl = url;
+        historyNextCursor = null;
+        document.getElementById('historyTable').innerHTML = '';
 
-        if (!response.ok) {
-            const errorText = await response.text();
-            console.error('API error:', errorText);
-            throw new Error(`Failed to fetch history: ${response.status}`);
-        }
-
-        const data = await response.json();
+        const data = await fetchHistoryPage(`${url}&include_total=true`);
         console.log('Received data:', { total: data.total, recordCount: data.records.length });
 
         // Update total
         document.getElementById('historyTotal').textContent = data.total;
 
-        // Update table
-        const tbody = document.getElementById('historyTable');
-        tbody.innerHTML = '';
-
         if (data.records.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="6" class="px-6 py-4 text-center text-gray-500">No hay registros para este período</td></tr>';
+            document.getElementById('historyTable').innerHTML = '<tr><td colspan="6" class="px-6 py-4 text-center text-gray-500">No hay registros para este período</td></tr>';
         } else {
-            data.records.forEach(record => {
-                const checkInTime = new Date(record.checkin_time); // Fixed: checkin_time not check_in_time
-                const checkOutTime = record.checkout_time ? new Date(record.checkout_time) : null; // Fixed: checkout_time not check_out_time
-                const status = record.is_late ?  // Fixed: is_late not late
-                    '<span class="px-2 py-1 text-xs font-semibold rounded-full bg-orange-100 text-orange-800"> Tarde</span>' :
-                    '<span class="px-2 py-1 text-xs font-semibold rounded-full bg-green-100 text-green-800">✓ Puntual</span>';
-
-                const row = `
-                    <tr class="hover:bg-gray-50">
-                        <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${checkInTime.toLocaleDateString()}</td>
-                        <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${record.student_name}</td>
-                        <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-600">${record.school_name || '-'}</td>
-                        <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${checkInTime.toLocaleTimeString('es-ES', {hour: '2-digit', minute: '2-digit'})}</td>
-                        <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${checkOutTime ? checkOutTime.toLocaleTimeString('es-ES', {hour: '2-digit', minute: '2-digit'}) : '-'}</td>
-                        <td class="px-6 py-4 whitespace-nowrap text-sm">${status}</td>
-                </tr>
-            `;
-            tbody.innerHTML += row;
-        });
-    }
+            appendHistoryRows(data.records);
+        }
         console.log('History generation complete!');
     } catch (error) {
         console.error('Error in generateHistory:', error);
@@ -346,6 +319,66 @@ async function generateHistory(startDate, endDate, schoolId, className) {
     }
 }
 
+async function loadMoreHistory() {
+    if (!historyBaseUrl || !historyNextCursor) return;
+
+    const button = document.getElementById('historyLoadMoreButton');
+    button.disabled = true;
+    try {
+        const data = await fetchHistoryPage(`${historyBaseUrl}&include_total=false&cursor=${encodeURIComponent(historyNextCursor)}`);
+        appendHistoryRows(data.records);
+    } catch (error) {
+        console.error('Error loading more history:', error);
+        alert('Error al cargar más registros. Por favor intenta de nuevo.');
+    } finally {
+        button.disabled = false;
+    }
+}
+
+async function fetchHistoryPage(url) {
+    const token = localStorage.getItem('arrivapp_token');
+    const response = await fetch(url, {
+        headers: {
+            'Authorization': `Bearer ${token}`
+        }
+    });
+
+    if (!response.ok) {
+        const errorText = await response.text();
+        console.error('API error:', errorText);
+        throw new Error(`Failed to fetch history: ${response.status}`);
+    }
+
+    const data = await response.json();
+    historyNextCursor = data.next_cursor;
+    document.getElementById('historyLoadMore').classList.toggle('hidden', !historyNextCursor);
+    return data;
+}
+
+function appendHistoryRows(records) {
+    const tbody = document.getElementById('historyTable');
+    let rows = '';
+    records.forEach(record => {
+        const checkInTime = new Date(record.checkin_time); // Fixed: checkin_time not check_in_time
+        const checkOutTime = record.checkout_time ? new Date(record.checkout_time) : null; // Fixed: checkout_time not check_out_time
+        const status = record.is_late ?  // Fixed: is_late not late
+            '<span class="px-2 py-1 text-xs font-semibold rounded-full bg-orange-100 text-orange-800"> Tarde</span>' :
+            '<span class="px-2 py-1 text-xs font-semibold rounded-full bg-green-100 text-green-800">✓ Puntual</span>';
+
+        rows += `
+            <tr class="hover:bg-gray-50">
+                <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${checkInTime.toLocaleDateString()}</td>
+                <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${record.student_name}</td>
+                <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-600">${record.school_name || '-'}</td>
+                <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${checkInTime.toLocaleTimeString('es-ES', {hour: '2-digit', minute: '2-digit'})}</td>
+                <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${checkOutTime ? checkOutTime.toLocaleTimeString('es-ES', {hour: '2-digit', minute: '2-digit'}) : '-'}</td>
+                <td class="px-6 py-4 whitespace-nowrap text-sm">${status}</td>
+            </tr>
+        `;
+    });
+    tbody.insertAdjacentHTML('beforeend', rows);
+}
+
 async function generateTardinessAnalysis(startDate, endDate, schoolId, className) {
     const token = localStorage.getItem('arrivapp_token');
     let url = `${API_URL}/reports/tardiness-analysis?start_date=${startDate}&end_date=${endDate}`;
@@ -939,20 +972,48 @@ async function exportPDF() {
     }
 
     const token = localStorage.getItem('arrivapp_token');
-    let url = `${API_URL}/reports/export-pdf?report_type=${reportType}&start_date=${startDate}&end_date=${endDate}`;
-    
-    if (schoolId && schoolId > 0) {
-        url += `&school_id=${schoolId}`;
-    }
-    
-    if (className) {
-        url += `&class_name=${encodeURIComponent(className)}`;
-    }
+    const jobRequest = {
+        report_type: reportType,
+        start_date: startDate,
+        end_date: endDate,
+        school_id: schoolId && schoolId > 0 ? schoolId : null,
+        class_name: className
+    };
 
     try {
         document.getElementById('loadingSpinner').classList.remove('hidden');
         
-        const response = await fetch(url, {
+        // The PDF is built in the background: submit a job, poll it, then download
+        const submitResponse = await fetch(`${API_URL}/reports/jobs`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify(jobRequest)
+        });
+        if (!submitResponse.ok) {
+            throw new Error(`PDF export failed with status ${submitResponse.status}`);
+        }
+        let job = await submitResponse.json();
+        
+        while (job.status === 'queued' || job.status === 'running') {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const statusResponse = await fetch(`${API_URL}/reports/jobs/${job.job_id}`, {
+                headers: {
+                    'Authorization': `Bearer ${token}`
+                }
+            });
+            if (!statusResponse.ok) {
+                throw new Error(`PDF export failed with status ${statusResponse.status}`);
+            }
+            job = await statusResponse.json();
+        }
+        if (job.status !== 'done') {
+            throw new Error(job.error || 'PDF export failed');
+        }
+        
+        const response = await fetch(`${API_URL}/reports/jobs/${job.job_id}/download`, {
             headers: {
                 'Authorization': `Bearer ${token}`
             }
@@ -0,0 +1,66 @@
+"""
+Throwaway databases for the standalone backend tests.
+
+The app binds SessionLocal to one engine when app.core.database is imported
+and keeps per-process caches: students by QR code, school timezones and
+calendars, today's attendance state and dashboard bodies. isolated_database()
+binds SessionLocal to a fresh SQLite file for one test and empties those caches
+before and after it, so the test modules can also run in one pytest process
+without seeing each other's rows.
+
+Usage (in a test module):
+    from isolated_db import isolated_database
+
+    @pytest.fixture(autouse=True)
+    def database():
+        with isolated_database("my_test.db") as test_engine:
+            yield test_engine
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+# Settings require a URL; tests never use the engine built from it
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from app.core import database, timeutils
+from app.core.auth_cache import token_cache
+from app.models.models import Base, School
+from app.services.attendance_state import attendance_state
+from app.services.dashboard_cache import dashboard_cache
+from app.services.scan_cache import invalidate_student
+from app.services.school_calendar import invalidate_calendar
+
+
+def reset_caches(school_ids=()):
+    invalidate_student()
+    attendance_state.clear()
+    dashboard_cache.clear()
+    token_cache.clear()
+    timeutils.forget_zones()
+    for school_id in school_ids:
+        invalidate_calendar(school_id)
+
+
+@contextmanager
+def isolated_database(file_name: str):
+    """Bind SessionLocal to a new SQLite database with the schema created; yields its engine."""
+    path = os.path.join(tempfile.mkdtemp(), file_name)
+    test_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=test_engine)
+    reset_caches()
+    database.SessionLocal.configure(bind=test_engine)
+    try:
+        yield test_engine
+    finally:
+        database.SessionLocal.configure(bind=database.engine)
+        with test_engine.connect() as connection:
+            school_ids = [row[0] for row in connection.execute(School.__table__.select().with_only_columns(School.id))]
+        reset_caches(school_ids)
+        test_engine.dispose()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Test the per-student attendance bitmaps (services.attendance_bitmaps)
+Runs against a throwaway SQLite database spanning two school years and checks
+that bits set on check-in match a rebuild from raw data, that range rebuilds
+repair drift, and that summaries match counts computed day by day.
+
+Usage:
+    python test_attendance_bitmaps.py
+"""
+import os
+import sys
+import random
+from datetime import date, datetime, timedelta
+import pytest
+from dotenv import load_dotenv
+
+# Change to backend directory; each test gets its own throwaway database (see isolated_db.py)
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+os.chdir(backend_dir)
+sys.path.insert(0, backend_dir)
+load_dotenv(os.path.join(backend_dir, '.env'))
+
+from isolated_db import isolated_database
+from app.core.database import SessionLocal
+from app.models.models import (
+    School, Student, CheckIn, Justification, JustificationType, JustificationStatus,
+    AttendanceBitmap, SchoolCalendarDay, CalendarDayType
+)
+from app.services import attendance_bitmaps
+from app.services.school_calendar import get_calendar
+
+FIRST_DAY = date(2025, 6, 2)
+LAST_DAY = date(2025, 10, 31)
+
+
+@pytest.fixture(autouse=True)
+def database():
+    with isolated_database("attendance_bitmaps.db") as test_engine:
+        yield test_engine
+
+
+def snapshot(db, school_id):
+    return {
+        (row.student_id, row.school_year): (row.present, row.late, row.justified)
+        for row in db.query(AttendanceBitmap).join(Student).filter(Student.school_id == school_id)
+    }
+
+
+def setup_database(student_count=20):
+    random.seed(22)
+    db = SessionLocal()
+    school = School(name="Bitmap Test School")
+    db.add(school)
+    db.flush()
+    db.add_all([
+        SchoolCalendarDay(school_id=school.id, date=date(2025, 10, 13), day_type=CalendarDayType.holiday),
+        SchoolCalendarDay(school_id=school.id, date=date(2025, 9, 20), day_type=CalendarDayType.school_day),
+    ])
+    students = [
+        Student(student_id=f"BITS{i}", name=f"Alumno {i}", class_name="1A",
+                parent_email=f"parent{i}@example.test", school_id=school.id)
+        for i in range(student_count)
+    ]
+    db.add_all(students)
+    db.commit()
+
+    checkins, justifications = [], []
+    day = FIRST_DAY
+    while day <= LAST_DAY:
+        if day.weekday() < 5 or day == date(2025, 9, 20):
+            for student in students:
+                roll = random.random()
+                if roll < 0.75:
+                    checkins.append({
+                        "student_id": student.id,
+                        "checkin_time": datetime.combine(day, datetime.min.time()).replace(hour=7, minute=random.randint(0, 59)),
+                        "is_late": random.random() < 0.2,
+                    })
+                elif roll < 0.85:
+                    justifications.append(Justification(
+                        student_id=student.id, justification_type=JustificationType.absence,
+                        date=datetime.combine(day, datetime.min.time()), reason="Cita médica",
+                        submitted_by=student.parent_email,
+                        status=random.choice([JustificationStatus.approved, JustificationStatus.pending])
+                    ))
+        day += timedelta(days=1)
+    db.bulk_insert_mappings(CheckIn, checkins)
+    db.add_all(justifications)
+    db.commit()
+    return db, school, students
+
+
+def reference_summary(db, student, calendar, first_day, last_day):
+    """Day-by-day counts straight from checkins and justifications."""
+    rows = db.query(CheckIn.local_date, CheckIn.is_late).filter(
+        CheckIn.student_id == student.id, CheckIn.local_date >= first_day, CheckIn.local_date <= last_day
+    ).all()
+    present = {day for day, _ in rows}
+    late = {day for day, is_late in rows if is_late}
+    justified = {
+        moment.date() for (moment,) in db.query(Justification.date).filter(
+            Justification.student_id == student.id,
+            Justification.status == JustificationStatus.approved,
+            Justification.justification_type == JustificationType.absence
+        ) if first_day <= moment.date() <= last_day
+    }
+    school_days = calendar.school_days(first_day, last_day)
+    absent = [day not in present and day not in justified for day in school_days]
+    streak = longest = 0
+    for missed in absent:
+        streak = streak + 1 if missed else 0
+        longest = max(longest, streak)
+    return {
+        "expected_days": len(school_days),
+        "present_days": len(present),
+        "late_days": len(late),
+        "justified_days": len(justified),
+        "absent_days": sum(absent),
+        "attendance_rate": round(len(present) / len(school_days) * 100, 2) if school_days else 0,
+        "late_percentage": round(len(late) / len(present) * 100, 2) if present else 0,
+        "longest_absence_streak": longest,
+        "current_absence_streak": streak,
+    }
+
+
+def test_bitmaps_match_raw_data():
+    db, school, students = setup_database()
+    try:
+        # Bits set check-in by check-in equal a rebuild from raw data
+        attendance_bitmaps.record_checkins(db, [
+            (row.student_id, row.local_date, row.is_late)
+            for row in db.query(CheckIn).join(Student).filter(Student.school_id == school.id).order_by(CheckIn.id)
+        ])
+        db.commit()
+        incremental = snapshot(db, school.id)
+        attendance_bitmaps.rebuild_bitmaps(db)
+        db.commit()
+        rebuilt = snapshot(db, school.id)
+        assert set(incremental) == set(rebuilt) and {year for _, year in rebuilt} == {2024, 2025}
+        assert all(incremental[key][:2] == rebuilt[key][:2] for key in rebuilt)
+        assert all(len(bits) == attendance_bitmaps.YEAR_BYTES for row in rebuilt.values() for bits in row)
+
+        # A reviewed justification refreshes its day
+        pending = db.query(Justification).join(Student).filter(
+            Student.school_id == school.id, Justification.status == JustificationStatus.pending
+        ).first()
+        pending.status = JustificationStatus.approved
+        db.flush()
+        attendance_bitmaps.refresh(db, pending.student_id, [pending.date])
+        db.commit()
+        refreshed = snapshot(db, school.id)
+        attendance_bitmaps.rebuild_bitmaps(db)
+        db.commit()
+        assert refreshed == snapshot(db, school.id)
+
+        # A range rebuild across the school-year boundary repairs drift inside the range
+        window = (date(2025, 8, 25), date(2025, 9, 5))
+        removed = db.query(CheckIn).filter(
+            CheckIn.student_id == students[1].id, CheckIn.local_date == date(2025, 9, 1)
+        ).delete(synchronize_session=False)
+        assert removed == 1
+        db.query(Justification).filter(
+            Justification.student_id == students[2].id,
+            Justification.date >= datetime.combine(window[0], datetime.min.time()),
+            Justification.date <= datetime.combine(window[1], datetime.min.time())
+        ).update({Justification.status: JustificationStatus.approved}, synchronize_session=False)
+        written = attendance_bitmaps.rebuild_bitmaps(db, *window)
+        db.commit()
+        assert written == 2 * len(students)
+        ranged = snapshot(db, school.id)
+        attendance_bitmaps.rebuild_bitmaps(db)
+        db.commit()
+        assert ranged == snapshot(db, school.id)
+
+        # Summaries equal day-by-day counts
+        calendar = get_calendar(db, school.id)
+        ranges = [
+            (date(2024, 9, 1), date(2025, 8, 31)),
+            (date(2025, 9, 1), date(2025, 10, 31)),
+            (date(2025, 9, 15), date(2025, 10, 20)),
+            (date(2025, 6, 30), date(2025, 6, 30)),
+            (date(2025, 10, 5), date(2025, 10, 1)),
+        ]
+        for student in students:
+            for first_day, last_day in ranges:
+                bits = attendance_bitmaps.load_year(db, student.id, attendance_bitmaps.school_year(first_day))
+                summary = attendance_bitmaps.summarize(bits, calendar, first_day, last_day)
+                reference = reference_summary(db, student, calendar, first_day, last_day)
+                assert summary == reference, (student.name, first_day, last_day, summary, reference)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    with isolated_database("attendance_bitmaps.db"):
+        test_bitmaps_match_raw_data()
+    print("\n✓ Attendance bitmap tests passed")
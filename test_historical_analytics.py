@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Regression test for /api/reports/historical-analytics
+Generates a synthetic multi-school dataset in a throwaway SQLite database and
+checks that the grouped-query implementation returns exactly what the original
+per-student / per-month implementation returned, for several scopes and ranges.
+Expected school days in the reference come from walking each school's calendar
+day by day (holidays, half days and a make-up Saturday are in the dataset).
+
+Usage:
+    python test_historical_analytics.py [number_of_students]
+"""
+import os
+import sys
+import random
+import time
+from datetime import date, datetime, timedelta
+import pytest
+from dotenv import load_dotenv
+
+# Change to backend directory; each test gets its own throwaway database (see isolated_db.py)
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+os.chdir(backend_dir)
+sys.path.insert(0, backend_dir)
+load_dotenv(os.path.join(backend_dir, '.env'))
+
+from isolated_db import isolated_database
+from fastapi import HTTPException
+from sqlalchemy import event, extract
+from app.core.database import SessionLocal
+from app.models.models import School, Student, CheckIn, User, UserRole, SchoolCalendarDay, CalendarDayType
+from app.routers.reports import get_historical_analytics
+
+
+@pytest.fixture(autouse=True)
+def database():
+    with isolated_database("historical_analytics.db") as test_engine:
+        yield test_engine
+
+
+def reference_school_days(db, school_id, first_day, last_day):
+    """School days of one school in [first_day, last_day], checking every day against its calendar."""
+    entries = dict(db.query(SchoolCalendarDay.date, SchoolCalendarDay.day_type).filter(
+        SchoolCalendarDay.school_id == school_id
+    ))
+    days = []
+    day = first_day
+    while day <= last_day:
+        day_type = entries.get(day)
+        if (day.weekday() < 5) if day_type is None else day_type != CalendarDayType.holiday:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def legacy_historical_analytics(db, current_user, start_date=None, end_date=None, school_id=None, class_name=None):
+    """The original implementation, kept as the reference.
+
+    Changes: extract('isodow') is PostgreSQL-only, so the weekday filter uses
+    extract('dow'), which has the same value (1-5) for Monday-Friday. The
+    business-day estimates (days * 5 // 7, 22 per month, total_days // 7) are
+    replaced by school days from reference_school_days(). Chronic absentees
+    carry longest_absence_streak, the most consecutive school days missed.
+    """
+    if not end_date:
+        end = datetime.now()
+    else:
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+        end = end.replace(hour=23, minute=59, second=59)
+
+    if not start_date:
+        start = end - timedelta(days=90)
+    else:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        start = start.replace(hour=0, minute=0, second=0)
+
+    base_query = db.query(CheckIn).join(Student)
+
+    if current_user.role in [UserRole.director, UserRole.teacher]:
+        if not current_user.school_id:
+            raise HTTPException(status_code=403, detail="User has no assigned school")
+        base_query = base_query.filter(Student.school_id == current_user.school_id)
+    elif current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+
+    if school_id and current_user.role == UserRole.admin:
+        base_query = base_query.filter(Student.school_id == school_id)
+
+    if class_name:
+        base_query = base_query.filter(Student.class_name == class_name)
+
+    base_query = base_query.filter(
+        CheckIn.checkin_time >= start,
+        CheckIn.checkin_time <= end
+    )
+
+    monthly_trends = []
+    current_date = start
+
+    while current_date <= end:
+        month_start = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if current_date.month == 12:
+            month_end = current_date.replace(year=current_date.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(seconds=1)
+        else:
+            month_end = current_date.replace(month=current_date.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(seconds=1)
+
+        month_checkins = db.query(CheckIn).join(Student).filter(
+            CheckIn.checkin_time >= month_start,
+            CheckIn.checkin_time <= month_end
+        )
+
+        if current_user.role in [UserRole.director, UserRole.teacher]:
+            month_checkins = month_checkins.filter(Student.school_id == current_user.school_id)
+        elif school_id and current_user.role == UserRole.admin:
+            month_checkins = month_checkins.filter(Student.school_id == school_id)
+
+        if class_name:
+            month_checkins = month_checkins.filter(Student.class_name == class_name)
+
+        total = month_checkins.count()
+        late = month_checkins.filter(CheckIn.is_late == True).count()
+
+        attending = [
+            student_pk for (student_pk,) in month_checkins.with_entities(CheckIn.student_id).distinct()
+        ]
+        expected = 0
+        for student_pk in attending:
+            student = db.query(Student).filter(Student.id == student_pk).first()
+            expected += len(reference_school_days(db, student.school_id, month_start.date(), month_end.date()))
+
+        attendance_rate = (total / expected) * 100 if expected > 0 else 0
+
+        monthly_trends.append({
+            "month": month_start.strftime("%Y-%m"),
+            "total_attendance": total,
+            "late_count": late,
+            "attendance_rate": min(attendance_rate, 100)
+        })
+
+        if current_date.month == 12:
+            current_date = current_date.replace(year=current_date.year + 1, month=1, day=1)
+        else:
+            current_date = current_date.replace(month=current_date.month + 1, day=1)
+
+    monthly_comparison = []
+    for trend in monthly_trends:
+        month_data = trend
+        students_query = db.query(Student)
+        if current_user.role in [UserRole.director, UserRole.teacher]:
+            students_query = students_query.filter(Student.school_id == current_user.school_id)
+        elif school_id and current_user.role == UserRole.admin:
+            students_query = students_query.filter(Student.school_id == school_id)
+
+        month_start = datetime.strptime(month_data["month"], "%Y-%m").date()
+        month_end = ((month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1))
+        expected_attendance = 0
+        for student in students_query.all():
+            expected_attendance += len(reference_school_days(db, student.school_id, month_start, month_end))
+
+        present = month_data["total_attendance"]
+        late = month_data["late_count"]
+        absent = max(0, expected_attendance - present)
+
+        monthly_comparison.append({
+            "month": month_data["month"],
+            "present": present,
+            "late": late,
+            "absent": absent
+        })
+
+    students_query = db.query(Student.id, Student.name, Student.school_id)
+    if current_user.role in [UserRole.director, UserRole.teacher]:
+        students_query = students_query.filter(Student.school_id == current_user.school_id)
+    elif school_id and current_user.role == UserRole.admin:
+        students_query = students_query.filter(Student.school_id == school_id)
+
+    if class_name:
+        students_query = students_query.filter(Student.class_name == class_name)
+
+    chronic_absentees = []
+
+    for student in students_query.all():
+        expected_attendance_days = len(reference_school_days(db, student.school_id, start.date(), end.date()))
+        attended = db.query(CheckIn).filter(
+            CheckIn.student_id == student.id,
+            CheckIn.checkin_time >= start,
+            CheckIn.checkin_time <= end
+        ).count()
+
+        attendance_rate = (attended / expected_attendance_days) * 100 if expected_attendance_days > 0 else 0
+
+        if attendance_rate < 80:
+            school = db.query(School).filter(School.id == student.school_id).first()
+            attended_dates = {row[0] for row in db.query(CheckIn.local_date).filter(
+                CheckIn.student_id == student.id,
+                CheckIn.checkin_time >= start,
+                CheckIn.checkin_time <= end
+            )}
+            streak = longest_streak = 0
+            for day in reference_school_days(db, student.school_id, start.date(), end.date()):
+                streak = 0 if day in attended_dates else streak + 1
+                longest_streak = max(longest_streak, streak)
+            chronic_absentees.append({
+                "student_name": student.name,
+                "school_name": school.name if school else None,
+                "expected_days": expected_attendance_days,
+                "attended_days": attended,
+                "attendance_rate": attendance_rate,
+                "longest_absence_streak": longest_streak
+            })
+
+    chronic_absentees.sort(key=lambda x: x["attendance_rate"])
+
+    weekday_patterns = []
+    for weekday in range(5):
+        dow_value = weekday + 1
+
+        day_checkins = base_query.filter(
+            extract('dow', CheckIn.checkin_time) == dow_value
+        )
+
+        total = day_checkins.count()
+        on_time = day_checkins.filter(CheckIn.is_late == False).count()
+        expected = sum(
+            1
+            for student in students_query.all()
+            for day in reference_school_days(db, student.school_id, start.date(), end.date())
+            if day.weekday() == weekday
+        )
+
+        weekday_patterns.append({
+            "weekday": weekday,
+            "attendance_rate": min(100, total / expected * 100) if expected > 0 else 0,
+            "punctuality_rate": (on_time / total * 100) if total > 0 else 0
+        })
+
+    if len(monthly_trends) >= 2:
+        first_month = monthly_trends[0]
+        last_month = monthly_trends[-1]
+
+        first_month_start = datetime.strptime(first_month["month"], "%Y-%m").replace(day=1)
+        first_month_end = (first_month_start + timedelta(days=32)).replace(day=1) - timedelta(seconds=1)
+
+        last_month_start = datetime.strptime(last_month["month"], "%Y-%m").replace(day=1)
+        last_month_end = (last_month_start + timedelta(days=32)).replace(day=1) - timedelta(seconds=1)
+
+        improved_students = []
+
+        for student in students_query.all():
+            first_attended = db.query(CheckIn).filter(
+                CheckIn.student_id == student.id,
+                CheckIn.checkin_time >= first_month_start,
+                CheckIn.checkin_time <= first_month_end
+            ).count()
+
+            last_attended = db.query(CheckIn).filter(
+                CheckIn.student_id == student.id,
+                CheckIn.checkin_time >= last_month_start,
+                CheckIn.checkin_time <= last_month_end
+            ).count()
+
+            first_days = len(reference_school_days(db, student.school_id, first_month_start.date(), first_month_end.date()))
+            last_days = len(reference_school_days(db, student.school_id, last_month_start.date(), last_month_end.date()))
+            first_rate = (first_attended / first_days) * 100 if first_days > 0 else 0
+            last_rate = (last_attended / last_days) * 100 if last_days > 0 else 0
+            improvement = last_rate - first_rate
+
+            if improvement > 5:
+                improved_students.append({
+                    "student_name": student.name,
+                    "first_month_rate": first_rate,
+                    "last_month_rate": last_rate,
+                    "improvement": improvement
+                })
+
+        improved_students.sort(key=lambda x: x["improvement"], reverse=True)
+        top_improved = improved_students[:10]
+    else:
+        top_improved = []
+
+    avg_monthly_attendance = sum(t["total_attendance"] for t in monthly_trends) / len(monthly_trends) if monthly_trends else 0
+
+    overall_trend = 0
+    if len(monthly_trends) >= 2:
+        overall_trend = monthly_trends[-1]["attendance_rate"] - monthly_trends[0]["attendance_rate"]
+
+    punctuality_improvement = 0
+    if len(monthly_trends) >= 2:
+        first_late_rate = (monthly_trends[0]["late_count"] / monthly_trends[0]["total_attendance"] * 100) if monthly_trends[0]["total_attendance"] > 0 else 0
+        last_late_rate = (monthly_trends[-1]["late_count"] / monthly_trends[-1]["total_attendance"] * 100) if monthly_trends[-1]["total_attendance"] > 0 else 0
+        punctuality_improvement = first_late_rate - last_late_rate
+
+    return {
+        "monthly_trends": monthly_trends,
+        "monthly_comparison": monthly_comparison,
+        "chronic_absentees": chronic_absentees[:20],
+        "chronic_absentee_count": len(chronic_absentees),
+        "weekday_patterns": weekday_patterns,
+        "top_improved_students": top_improved,
+        "avg_monthly_attendance": avg_monthly_attendance,
+        "overall_trend": overall_trend,
+        "punctuality_improvement": punctuality_improvement
+    }
+
+
+def generate_dataset(db, student_count, first_day, last_day):
+    """Schools, classes and a noisy check-in history (weekends, lates, NULL is_late, inactive students)."""
+    rng = random.Random(42)
+    schools = [School(name=f"Colegio {i}", contact_email=f"colegio{i}@example.test") for i in range(3)]
+    db.add_all(schools)
+    db.flush()
+
+    students = []
+    for i in range(student_count):
+        school = schools[i % len(schools)]
+        students.append(Student(
+            student_id=f"HA{i:05d}",
+            name=f"Alumno {i % 97}",  # Repeated names exercise sort stability
+            class_name=f"{1 + i % 4}{'AB'[i % 2]}",
+            parent_email=f"parent{i}@example.test",
+            school_id=school.id,
+            is_active=i % 23 != 0
+        ))
+    db.add_all(students)
+    db.flush()
+
+    # Christmas holidays for everyone, plus per-school holidays, half days and a make-up Saturday
+    calendar = []
+    for school in schools:
+        day = date(2024, 12, 23)
+        while day <= date(2025, 1, 7):
+            calendar.append(SchoolCalendarDay(school_id=school.id, date=day, day_type=CalendarDayType.holiday))
+            day += timedelta(days=1)
+    calendar += [
+        SchoolCalendarDay(school_id=schools[0].id, date=date(2024, 11, 1), day_type=CalendarDayType.holiday),
+        SchoolCalendarDay(school_id=schools[0].id, date=date(2025, 2, 14), day_type=CalendarDayType.half_day),
+        SchoolCalendarDay(school_id=schools[1].id, date=date(2025, 2, 1), day_type=CalendarDayType.school_day),
+        SchoolCalendarDay(school_id=schools[2].id, date=date(2024, 12, 6), day_type=CalendarDayType.holiday),
+    ]
+    db.add_all(calendar)
+    db.flush()
+
+    checkins = []
+    day = first_day
+    while day <= last_day:
+        for index, student in enumerate(students):
+            # Each student has their own attendance propensity, drifting over time
+            propensity = 0.35 + 0.6 * ((index * 37) % 100) / 100
+            if day.weekday() >= 5:
+                propensity *= 0.05
+            if rng.random() < propensity:
+                checkin_time = datetime.combine(day, datetime.min.time()) + timedelta(
+                    hours=7, minutes=rng.randint(30, 150), seconds=rng.randint(0, 59)
+                )
+                is_late = rng.choice([False, False, False, True, None])
+                checkins.append({"student_id": student.id, "checkin_time": checkin_time, "is_late": is_late})
+        day += timedelta(days=1)
+
+    db.bulk_insert_mappings(CheckIn, checkins)
+    db.commit()
+    return schools, len(checkins)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def run_both(db, user, **params):
+    counter = QueryCounter()
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        started = time.perf_counter()
+        legacy = legacy_historical_analytics(db, user, **params)
+        legacy_seconds = time.perf_counter() - started
+        legacy_queries, counter.count = counter.count, 0
+
+        started = time.perf_counter()
+        current = get_historical_analytics(db=db, current_user=user, **params)
+        current_seconds = time.perf_counter() - started
+        current_queries = counter.count
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+    return legacy, current, (legacy_queries, legacy_seconds), (current_queries, current_seconds)
+
+
+def test_historical_analytics_matches_legacy(student_count=150):
+    db = SessionLocal()
+    try:
+        schools, checkin_count = generate_dataset(db, student_count, datetime(2024, 10, 20).date(), datetime(2025, 3, 10).date())
+        print(f"Dataset: {student_count} students, {checkin_count} check-ins")
+
+        admin = User(username="ha_admin", email="ha_admin@example.test", hashed_password="x", role=UserRole.admin, is_admin=True)
+        director = User(username="ha_director", email="ha_director@example.test", hashed_password="x", role=UserRole.director, school_id=schools[1].id)
+        teacher = User(username="ha_teacher", email="ha_teacher@example.test", hashed_password="x", role=UserRole.teacher, school_id=schools[2].id)
+        db.add_all([admin, director, teacher])
+        db.commit()
+
+        cases = [
+            ("admin, all schools", admin, dict(start_date="2024-11-01", end_date="2025-02-28")),
+            ("admin, one school", admin, dict(start_date="2024-11-15", end_date="2025-01-31", school_id=schools[0].id)),
+            ("admin, one class", admin, dict(start_date="2024-12-01", end_date="2025-03-10", school_id=schools[2].id, class_name="3A")),
+            ("director (school_id ignored)", director, dict(start_date="2024-10-20", end_date="2025-03-10", school_id=schools[0].id)),
+            ("teacher, class", teacher, dict(start_date="2024-12-20", end_date="2025-01-10", class_name="2B")),
+            ("single month", admin, dict(start_date="2025-02-03", end_date="2025-02-21")),
+            ("no data in range", admin, dict(start_date="2023-01-01", end_date="2023-03-31")),
+            ("end before start", admin, dict(start_date="2025-02-10", end_date="2025-02-01")),
+        ]
+        for label, user, params in cases:
+            params = {"start_date": None, "end_date": None, "school_id": None, "class_name": None, **params}
+            legacy, current, (lq, ls), (cq, cs) = run_both(db, user, **params)
+            assert current == legacy, f"{label}: results differ\nlegacy:  {legacy}\ncurrent: {current}"
+            print(f"  ✓ {label:30s} legacy {lq:5d} queries {ls:6.2f}s | grouped {cq:2d} queries {cs:6.2f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    student_count = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+    with isolated_database("historical_analytics.db"):
+        test_historical_analytics_matches_legacy(student_count)
+    print("\n✓ Historical analytics regression test passed")
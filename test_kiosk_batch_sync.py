@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Test kiosk batch sync (POST /api/checkin/scan/batch ingestion)
+Runs against a throwaway SQLite database and checks that buffered scans follow
+the live scan rules at their scan time, and that retrying a batch returns the
+stored results without recording anything twice.
+
+Usage:
+    python test_kiosk_batch_sync.py
+"""
+import os
+import sys
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+import pytest
+from dotenv import load_dotenv
+
+# Change to backend directory; each test gets its own throwaway database (see isolated_db.py)
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+os.chdir(backend_dir)
+sys.path.insert(0, backend_dir)
+load_dotenv(os.path.join(backend_dir, '.env'))
+
+from isolated_db import isolated_database
+from app.core.database import SessionLocal
+from app.models.models import School, Student, CheckIn, KioskScan, EmailOutbox, DailyAttendanceRollup
+from app.services.scan_ingest import IncomingScan, ingest_scans, offline_window, KioskDeviceConflict
+from app.core import timeutils
+
+# Schools default to Europe/Madrid; scan times are stored as naive UTC
+SCHOOL_TZ = ZoneInfo(timeutils.DEFAULT_TIMEZONE)
+
+
+def school_time(day, hour, minute=0):
+    """Naive UTC of a wall-clock time at the school on `day`."""
+    return datetime.combine(day, time(hour, minute), SCHOOL_TZ).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def school_today():
+    return timeutils.local_calendar(timeutils.utc_now(), SCHOOL_TZ).local_date
+
+
+@pytest.fixture(autouse=True)
+def database():
+    with isolated_database("kiosk_batch_sync.db") as test_engine:
+        yield test_engine
+
+
+def setup_database():
+    db = SessionLocal()
+    school = School(name="Kiosk Test School")
+    db.add(school)
+    db.flush()
+    for i in range(3):
+        db.add(Student(
+            student_id=f"KIOSK{i}", name=f"Alumno {i}", class_name="1A",
+            parent_email=f"parent{i}@example.test", school_id=school.id
+        ))
+    db.commit()
+    return db, school.id
+
+
+def school_checkins(db, school_id):
+    return db.query(CheckIn).join(Student).filter(Student.school_id == school_id)
+
+
+def school_emails(db, school_id):
+    parents = db.query(Student.parent_email).filter(Student.school_id == school_id)
+    return db.query(EmailOutbox).filter(EmailOutbox.to_email.in_(parents))
+
+
+def scan(key, code, scanned_at):
+    return IncomingScan(idempotency_key=key, student_code=code, scanned_at=scanned_at, device_id="gate-1")
+
+
+def test_batch_follows_scan_rules_and_is_idempotent():
+    db, school_id = setup_database()
+    today = school_today()
+    yesterday = today - timedelta(days=1)
+    now = school_time(today, 16)
+    scans = [
+        # Sent out of order: the check-out is judged after the check-in
+        scan("a-out", "KIOSK0", school_time(today, 15)),
+        scan("a-in", "KIOSK0", school_time(today, 8, 50)),
+        scan("a-dup", "KIOSK0", school_time(today, 8, 55)),
+        scan("b-in", "KIOSK1", school_time(today, 9, 30)),
+        scan("b-early", "KIOSK1", school_time(today, 9, 45)),
+        scan("c-yesterday", "KIOSK2", school_time(yesterday, 8, 30)),
+        scan("unknown", "NOPE", school_time(today, 9)),
+        scan("future", "KIOSK2", now + timedelta(hours=1)),
+        scan("old", "KIOSK2", now - timedelta(days=30)),
+        scan("a-in", "KIOSK0", school_time(today, 8, 50)),
+    ]
+
+    outcome = ingest_scans(db, scans, now=now)
+    results = {(result["idempotency_key"], result["replayed"]): result for result in outcome.results}
+    assert [result["idempotency_key"] for result in outcome.results] == [s.idempotency_key for s in scans]
+    assert results[("a-in", False)]["result"] == "checkin" and not results[("a-in", False)]["is_late"]
+    assert results[("a-in", True)]["result"] == "checkin"
+    assert results[("a-dup", False)]["result"] == "duplicate_scan"
+    assert results[("a-out", False)]["result"] == "checkout"
+    assert results[("b-in", False)]["result"] == "checkin" and results[("b-in", False)]["is_late"]
+    assert results[("b-early", False)]["result"] == "too_early_checkout"
+    assert results[("c-yesterday", False)]["result"] == "checkin"
+    assert results[("unknown", False)]["result"] == "not_found"
+    assert results[("future", False)]["result"] == "rejected"
+    assert results[("old", False)]["result"] == "rejected"
+    assert (outcome.accepted, outcome.replayed) == (9, 1)
+    assert [event.type for event in outcome.events] == ["checkin", "checkin", "checkout"]
+
+    assert school_checkins(db, school_id).count() == 3
+    assert db.query(KioskScan).filter(KioskScan.idempotency_key.in_([s.idempotency_key for s in scans])).count() == 9
+    # Emails only for today's check-ins and check-out, not for yesterday's scan
+    assert school_emails(db, school_id).count() == 3
+    rollup = {
+        row.date: (row.present, row.late, row.checked_out)
+        for row in db.query(DailyAttendanceRollup).filter(DailyAttendanceRollup.school_id == school_id)
+    }
+    assert rollup == {today: (2, 1, 1), yesterday: (1, 0, 0)}
+
+    # A retried batch is answered from storage and changes nothing
+    retry = ingest_scans(db, scans, now=now)
+    assert (retry.accepted, retry.replayed) == (0, len(scans))
+    assert [r["result"] for r in retry.results] == [r["result"] for r in outcome.results]
+    assert all(r["replayed"] for r in retry.results)
+    assert school_checkins(db, school_id).count() == 3
+    assert school_emails(db, school_id).count() == 3
+
+    # New scans in a later batch see the check-ins recorded earlier
+    later = ingest_scans(db, [scan("b-out", "KIOSK1", school_time(today, 15, 30))], now=now)
+    assert later.results[0]["result"] == "checkout"
+    db.close()
+
+
+def test_batch_is_bounded_to_offline_window_and_school():
+    db = SessionLocal()
+    school, other = School(name="Window Test School"), School(name="Other Kiosk School")
+    db.add_all([school, other])
+    db.flush()
+    school_id = school.id
+    db.add_all([
+        Student(student_id="WIN0", name="Ventana 0", class_name="1A", parent_email="w0@example.test", school_id=school_id),
+        Student(student_id="WIN1", name="Ventana 1", class_name="1A", parent_email="w1@example.test", school_id=school_id),
+        Student(student_id="OTHER0", name="Ajeno", class_name="2B", parent_email="p@example.test", school_id=other.id),
+    ])
+    db.commit()
+    today = school_today()
+    now = school_time(today, 16)
+
+    # First sync of the device, yesterday: the claimed outage start bounds the batch
+    yesterday = now - timedelta(days=1)
+    earliest = offline_window(db, "gate-2", school_id, school_time(today - timedelta(days=1), 8), yesterday)
+    assert earliest == school_time(today - timedelta(days=1), 8)
+    outcome = ingest_scans(db, [
+        scan("w-before", "WIN0", school_time(today - timedelta(days=1), 7)),
+        scan("w-in", "WIN0", school_time(today - timedelta(days=1), 8, 30)),
+        scan("w-other", "OTHER0", school_time(today - timedelta(days=1), 9)),
+    ], now=yesterday, earliest=earliest, school_id=school_id)
+    assert [r["result"] for r in outcome.results] == ["rejected", "checkin", "not_found"]
+
+    # A later outage cannot reach back before the sync the server witnessed
+    earliest = offline_window(db, "gate-2", school_id, now - timedelta(days=3), now)
+    assert earliest == yesterday - timedelta(seconds=300)
+    # ...while the next batch of the same outage keeps its window
+    assert offline_window(db, "gate-2", school_id, now - timedelta(days=3), now) == earliest
+    outcome = ingest_scans(db, [
+        scan("w-forged", "WIN1", now - timedelta(days=2)),
+        scan("w-today", "WIN1", school_time(today, 8, 45)),
+    ], now=now, earliest=earliest, school_id=school_id)
+    assert [r["result"] for r in outcome.results] == ["rejected", "checkin"]
+    assert outcome.results[0]["detail"] == "Scan predates the kiosk's offline window"
+
+    # The device stays with its school
+    try:
+        offline_window(db, "gate-2", other.id, now, now)
+    except KioskDeviceConflict:
+        pass
+    else:
+        raise AssertionError("device synced by another school")
+    db.close()
+
+
+def test_journal_replay_skips_age_limit():
+    """Journaled scans were already accepted live; a long outage must not drop them"""
+    db = SessionLocal()
+    school = School(name="Journal Test School")
+    db.add(school)
+    db.flush()
+    db.add(Student(student_id="JOURNAL0", name="Diario", class_name="3C", parent_email="j@example.test", school_id=school.id))
+    db.commit()
+    scanned_at = school_time(school_today() - timedelta(days=10), 8, 30)
+
+    outcome = ingest_scans(db, [scan("j-old", "JOURNAL0", scanned_at)])
+    assert outcome.results[0]["result"] == "rejected"
+    outcome = ingest_scans(db, [scan("j-replayed", "JOURNAL0", scanned_at)], check_age=False)
+    assert outcome.results[0]["result"] == "checkin"
+    db.close()
+
+
+if __name__ == "__main__":
+    for test in (
+        test_batch_follows_scan_rules_and_is_idempotent,
+        test_batch_is_bounded_to_offline_window_and_school,
+        test_journal_replay_skips_age_limit,
+    ):
+        with isolated_database("kiosk_batch_sync.db"):
+            test()
+    print("\n✓ Kiosk batch sync tests passed")
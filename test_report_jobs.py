@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test background report jobs and the PDF artifact cache (services.report_jobs)
+Runs against a throwaway SQLite database and cache directory and checks that
+identical exports share one build, that new check-ins and roster edits change
+the artifact key, and that the store stays within its size limit.
+
+Usage:
+    python test_report_jobs.py
+"""
+import os
+import sys
+import tempfile
+import threading
+from datetime import date, datetime
+import pytest
+from dotenv import load_dotenv
+
+# Change to backend directory; each test gets its own throwaway database (see isolated_db.py)
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+os.chdir(backend_dir)
+sys.path.insert(0, backend_dir)
+load_dotenv(os.path.join(backend_dir, '.env'))
+
+from isolated_db import isolated_database
+from app.core.database import SessionLocal
+from app.models.models import School, Student, CheckIn
+from app.services import attendance_rollup
+from app.services.dashboard_cache import mark_roster_changed
+from app.services.report_jobs import ArtifactStore, ReportJobs, ReportSpec, artifact_key
+
+TODAY = date.today().isoformat()
+
+
+@pytest.fixture(autouse=True)
+def database():
+    with isolated_database("report_jobs.db") as test_engine:
+        yield test_engine
+
+
+def setup_database():
+    db = SessionLocal()
+    school = School(name="Report Test School")
+    db.add(school)
+    db.flush()
+    students = [
+        Student(student_id=f"REP{i}", name=f"Alumno {i}", class_name="1A",
+                parent_email=f"parent{i}@example.test", school_id=school.id)
+        for i in range(3)
+    ]
+    db.add_all(students)
+    db.commit()
+    return db, school, students
+
+
+def check_in(db, student):
+    now = datetime.utcnow()
+    db.add(CheckIn(student_id=student.id, checkin_time=now, is_late=False))
+    attendance_rollup.record_checkin(db, student.school_id, student.class_name, now, False)
+    db.commit()
+
+
+def test_jobs_and_cache():
+    db, school, students = setup_database()
+    builds = []
+    release = threading.Event()
+
+    def build(session, spec, out):
+        builds.append(spec)
+        release.wait(5)
+        out.write(f"%PDF {spec.report_type} {len(builds)}".encode())
+
+    jobs = ReportJobs(ArtifactStore(os.path.join(tempfile.mkdtemp(), "report_cache"), 10 * 1024 * 1024), 2, 3600)
+    try:
+        spec = ReportSpec("statistics", TODAY, TODAY, school.id, None)
+
+        # Identical submits while building share one job
+        first = jobs.submit(db, spec, build)
+        second = jobs.submit(db, spec, build)
+        assert first is second
+        release.set()
+        assert jobs.wait(first, 5) and first.status == "done" and not first.cached
+        assert len(builds) == 1
+
+        # A finished export is served from the cache
+        again = jobs.submit(db, spec, build)
+        assert again.id != first.id and again.status == "done" and again.cached
+        assert jobs.artifact(again).read_bytes() == b"%PDF statistics 1"
+        assert len(builds) == 1
+
+        # New check-ins and roster edits change the key; other scopes never share it
+        key = artifact_key(db, spec)
+        check_in(db, students[0])
+        assert artifact_key(db, spec) != key
+        key = artifact_key(db, spec)
+        mark_roster_changed(school.id)
+        assert artifact_key(db, spec) != key
+        assert artifact_key(db, ReportSpec("statistics", TODAY, TODAY, None, None)) != artifact_key(db, spec)
+        fresh = jobs.submit(db, spec, build)
+        assert jobs.wait(fresh, 5) and not fresh.cached and len(builds) == 2
+
+        # A failing build marks the job failed without storing anything
+        def broken(session, spec, out):
+            raise ValueError("boom")
+        failed = jobs.submit(db, ReportSpec("tardiness", TODAY, TODAY, school.id, None), broken)
+        assert jobs.wait(failed, 5) and failed.status == "failed" and jobs.artifact(failed) is None
+        assert jobs.get(failed.id) is failed and jobs.get("missing") is None
+    finally:
+        jobs.shutdown()
+        db.close()
+
+
+def test_store_eviction():
+    store = ArtifactStore(os.path.join(tempfile.mkdtemp(), "small_cache"), 2500)
+    store.write("key0", lambda out: out.write(b"x" * 1000))
+    os.utime(store.path("key0"), (100, 100))
+    store.write("key1", lambda out: out.write(b"x" * 1000))
+    os.utime(store.path("key1"), (200, 200))
+    # Reading key0 makes it the most recently used, so key1 goes first
+    assert store.get("key0") is not None
+    store.write("key2", lambda out: out.write(b"x" * 1000))
+    assert sorted(path.stem for path in store.directory.glob("*.pdf")) == ["key0", "key2"]
+    assert store.get("key1") is None
+    assert not list(store.directory.glob(".*.tmp"))
+
+
+if __name__ == "__main__":
+    for test in (test_jobs_and_cache, test_store_eviction):
+        with isolated_database("report_jobs.db"):
+            test()
+    print("\n✓ Report job tests passed")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Test the pooled SMTP connection manager against a local fake SMTP server
+Measures throughput offline (no real mail is sent) and compares it with
+opening one SMTP session per message.
+
+Usage:
+    python test_smtp_pool.py [number_of_messages]
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+from email.mime.text import MIMEText
+from dotenv import load_dotenv
+
+# Change to backend directory and load environment
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+os.chdir(backend_dir)
+sys.path.insert(0, backend_dir)
+
+load_dotenv(os.path.join(backend_dir, '.env'))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./arrivapp.db")
+
+import aiosmtplib
+from aiosmtpd.controller import Controller
+from app.services.smtp_pool import SMTPConnectionPool
+
+
+class CountingHandler:
+    """Fake SMTP handler that accepts every message and counts sessions."""
+
+    def __init__(self):
+        self.messages = 0
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bounce"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        self.sessions.add(id(session))
+        return "250 Message accepted for delivery"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_server(port=None):
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port or free_port())
+    controller.start()
+    return controller, handler
+
+
+def make_message(i, to=None):
+    message = MIMEText(f"Mensaje de prueba {i}")
+    message["From"] = "ArrivApp <noreply@arrivapp.test>"
+    message["To"] = to or f"parent{i}@example.test"
+    message["Subject"] = f"ArrivApp test {i}"
+    return message
+
+
+def make_pool(port, size=4):
+    return SMTPConnectionPool(hostname="127.0.0.1", port=port, start_tls=False, size=size)
+
+
+async def send_pooled(pool, count):
+    await asyncio.gather(*(pool.send_message(make_message(i)) for i in range(count)))
+
+
+async def send_unpooled(port, count):
+    for i in range(count):
+        await aiosmtplib.send(make_message(i), hostname="127.0.0.1", port=port, start_tls=False)
+
+
+def test_pool_reuses_sessions(count=200):
+    """All messages are delivered over at most pool-size sessions"""
+    controller, handler = start_fake_server()
+    try:
+        pool = make_pool(controller.port, size=4)
+
+        async def run():
+            await send_pooled(pool, count)
+            await pool.close()
+
+        asyncio.run(run())
+
+        print(f"Delivered: {handler.messages}/{count} over {len(handler.sessions)} SMTP sessions")
+        assert handler.messages == count
+        assert pool.connections_opened <= 4
+        assert len(handler.sessions) <= 4
+    finally:
+        controller.stop()
+
+
+def test_pool_reconnects_after_server_restart():
+    """A session dropped by the server is reopened transparently"""
+    controller, handler = start_fake_server()
+    port = controller.port
+    pool = make_pool(port, size=1)
+
+    async def run():
+        await pool.send_message(make_message(0))
+        # Restart the server underneath the pooled session
+        controller.stop()
+        restarted, restarted_handler = start_fake_server(port)
+        try:
+            await pool.send_message(make_message(1))
+            return restarted_handler.messages
+        finally:
+            await pool.close()
+            restarted.stop()
+
+    delivered_after_restart = asyncio.run(run())
+    print(f"Delivered after restart: {delivered_after_restart}, sessions opened: {pool.connections_opened}")
+    assert handler.messages == 1
+    assert delivered_after_restart == 1
+    assert pool.connections_opened == 2
+
+
+def test_pool_keeps_session_after_refused_recipient():
+    """A recipient the server refuses fails that message only; the session is reused"""
+    controller, handler = start_fake_server()
+    pool = make_pool(controller.port, size=1)
+
+    async def run():
+        await pool.send_message(make_message(0))
+        try:
+            await pool.send_message(make_message(1, to="bounce@example.test"))
+        except aiosmtplib.SMTPRecipientsRefused:
+            pass
+        else:
+            raise AssertionError("refused recipient did not raise")
+        await pool.send_message(make_message(2))
+        await pool.close()
+
+    try:
+        asyncio.run(run())
+        print(f"Delivered around a refused recipient: {handler.messages}, sessions opened: {pool.connections_opened}")
+        assert handler.messages == 2
+        assert pool.connections_opened == 1
+    finally:
+        controller.stop()
+
+
+def measure_throughput(count):
+    """Print messages/second for pooled vs one-session-per-message sending"""
+    controller, handler = start_fake_server()
+    try:
+        pool = make_pool(controller.port)
+
+        async def pooled():
+            await send_pooled(pool, count)
+            await pool.close()
+
+        started = time.perf_counter()
+        asyncio.run(pooled())
+        pooled_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        asyncio.run(send_unpooled(controller.port, count))
+        unpooled_seconds = time.perf_counter() - started
+    finally:
+        controller.stop()
+
+    print("\n" + "=" * 60)
+    print(f"SMTP throughput ({count} messages, fake local server)")
+    print("=" * 60)
+    print(f"  Pooled ({pool.size} sessions):    {count / pooled_seconds:8.1f} msg/s  ({pooled_seconds:.2f}s)")
+    print(f"  One session per message: {count / unpooled_seconds:8.1f} msg/s  ({unpooled_seconds:.2f}s)")
+    print(f"  Sessions opened by pool: {pool.connections_opened}")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    test_pool_reuses_sessions()
+    test_pool_reconnects_after_server_restart()
+    test_pool_keeps_session_after_refused_recipient()
+    measure_throughput(count)
+    print("\n✓ SMTP pool tests passed")